@@ -1,11 +1,22 @@
+import atexit
 import logging
 import os
 from flask import Flask
 from flask_cors import CORS
 import google.generativeai as genai
 from config.settings import Config
-from app.services.elasticsearch_manager import ElasticsearchManager
-from app.services.intent_classifier import get_intent_classifier_model
+from app.services.elasticsearch_manager import ElasticsearchManager, READ_BREAKER, WRITE_BREAKER
+from app.services.model_registry import ModelRegistry
+from app.services.classification_cache import ClassificationCache
+from app.services.rule_classifier import RuleBasedClassifier
+from app.services.contact_index import ContactIndex, load_contacts_from_elasticsearch
+from app.services.biller_catalog import BillerCatalog, load_generic_bills, generic_bills_signature
+from app.services.bulk_indexer import BulkIndexer
+from app.services.model_refresh import RefreshScheduler
+from app.services.intent_classifier import gemini_client, prompt_budget
+from app.services.vector_store import configure_history_search
+from app.utils.deadline import DeadlineStats, bounded
+from app.utils.singleflight import SingleFlight
 
 # Configure logging
 logging.basicConfig(
@@ -16,7 +27,42 @@ logger = logging.getLogger(__name__)
 
 # Initialize global variables
 es_manager = None
-classifier_model = None
+model_registry = None
+classification_cache = None
+classification_flights = None
+rule_classifier = None
+contact_index = None
+biller_catalog = None
+bulk_indexer = None
+model_refresher = None
+deadline_stats = None
+
+def init_worker(app):
+    """
+    Prepare a worker forked from a preloaded master (see gunicorn.conf.py)
+    
+    Everything built by create_app is inherited copy-on-write; only network
+    clients are recreated and background threads, which do not survive a
+    fork, are started here.
+    
+    Args:
+        app: The Flask app created in the master
+    """
+    if es_manager:
+        es_manager.reconnect()
+    try:
+        # Drops gRPC clients created before the fork
+        genai.configure(api_key=app.config['GEMINI_API_KEY'])
+    except Exception as e:
+        logger.error(f"Gemini API initialization error: {str(e)}")
+    if bulk_indexer:
+        bulk_indexer.start()
+    logger.info(f"Worker {os.getpid()} initialized from preloaded app")
+
+def shutdown_worker():
+    """Flush background work before a worker exits"""
+    if bulk_indexer:
+        bulk_indexer.stop()
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -25,6 +71,49 @@ def create_app(config_class=Config):
     # Enable CORS
     CORS(app)
     
+    # Initialize classification result cache
+    global classification_cache
+    classification_cache = ClassificationCache(
+        maxsize=app.config.get('CLASSIFICATION_CACHE_SIZE', 10000),
+        ttl=app.config.get('CLASSIFICATION_CACHE_TTL', 600)
+    )
+    # Identical cache misses in flight at the same time share one Gemini call
+    global classification_flights
+    classification_flights = SingleFlight()
+    
+    # Per-request deadlines and the fallbacks served when they pass
+    global deadline_stats
+    deadline_stats = DeadlineStats(default_timeout=app.config.get('CLASSIFY_TIMEOUT', 8.0))
+    # Shared limits on Gemini calls; requests classify locally while its circuit is open
+    gemini_client.configure(
+        max_in_flight=app.config.get('GEMINI_MAX_IN_FLIGHT', 16),
+        max_queue=app.config.get('GEMINI_MAX_QUEUE', 64),
+        queue_timeout=app.config.get('GEMINI_QUEUE_TIMEOUT', 2.0),
+        call_timeout=app.config.get('GEMINI_CALL_TIMEOUT', 15.0),
+        failure_threshold=app.config.get('GEMINI_BREAKER_THRESHOLD', 5),
+        recovery_timeout=app.config.get('GEMINI_BREAKER_RECOVERY', 30.0)
+    )
+    # Prompts are trimmed to this size; sizes are reported in the metrics
+    prompt_budget.configure(
+        max_tokens=app.config.get('PROMPT_TOKEN_BUDGET', 1500),
+        min_examples=app.config.get('PROMPT_MIN_EXAMPLES', 2)
+    )
+    # Past answers are reused only for near-duplicates or strong fuzzy matches of a query
+    configure_history_search(
+        min_similarity=app.config.get('HISTORY_MATCH_SCORE', 0.9),
+        min_fuzzy_score=app.config.get('HISTORY_FUZZY_MIN_SCORE', 8.0)
+    )
+    
+    # Shared circuit breakers: during an ES brownout calls fail fast and requests answer from caches
+    READ_BREAKER.configure(
+        failure_threshold=app.config.get('ES_READ_BREAKER_THRESHOLD', 5),
+        recovery_timeout=app.config.get('ES_READ_BREAKER_RECOVERY', 5.0)
+    )
+    WRITE_BREAKER.configure(
+        failure_threshold=app.config.get('ES_WRITE_BREAKER_THRESHOLD', 10),
+        recovery_timeout=app.config.get('ES_WRITE_BREAKER_RECOVERY', 15.0)
+    )
+    
     # Initialize Elasticsearch Manager
     global es_manager
     try:
@@ -32,6 +121,11 @@ def create_app(config_class=Config):
         es_port = app.config.get('ELASTICSEARCH_PORT', 9200)
         es_global_index = app.config.get('ES_GLOBAL_INDEX', 'global_intent_training')
         es_user_prefix = app.config.get('ES_USER_PREFIX', 'user_intent_training')
+        es_user_storage = {
+            'user_storage_mode': app.config.get('ES_USER_STORAGE_MODE', 'per_user'),
+            'shared_user_index': app.config.get('ES_USER_SHARED_INDEX'),
+            'user_aliases': app.config.get('ES_USER_ALIASES', False)
+        }
         es_user = app.config.get('ELASTICSEARCH_USER')
         es_password = app.config.get('ELASTICSEARCH_PASSWORD')
         # Handle authentication if provided
@@ -47,20 +141,55 @@ def create_app(config_class=Config):
                 es_port=es_port,
                 global_index=es_global_index,
                 user_index_prefix=es_user_prefix,
-                es_auth=connection_params
+                es_auth=connection_params,
+                prompt_cache_size=app.config.get('PROMPT_CACHE_SIZE', 1000),
+                version_index=app.config.get('PROMPT_VERSION_INDEX', 'prompt_versions'),
+                version_check_interval=app.config.get('PROMPT_VERSION_CHECK_INTERVAL', 5.0),
+                **es_user_storage
             )
         else:
             es_manager = ElasticsearchManager(
                 es_host=es_host,
                 es_port=es_port,
                 global_index=es_global_index,
-                user_index_prefix=es_user_prefix
+                user_index_prefix=es_user_prefix,
+                prompt_cache_size=app.config.get('PROMPT_CACHE_SIZE', 1000),
+                version_index=app.config.get('PROMPT_VERSION_INDEX', 'prompt_versions'),
+                version_check_interval=app.config.get('PROMPT_VERSION_CHECK_INTERVAL', 5.0),
+                **es_user_storage
             )
         logger.info("Connected to Elasticsearch")
+        # Background writer that batches auto-stored training examples
+        global bulk_indexer
+        bulk_indexer = BulkIndexer(
+            es_manager,
+            max_queue_size=app.config.get('BULK_INDEXER_QUEUE_SIZE', 10000),
+            batch_size=app.config.get('BULK_INDEXER_BATCH_SIZE', 500),
+            flush_interval=app.config.get('BULK_INDEXER_FLUSH_INTERVAL', 1.0),
+            enqueue_timeout=app.config.get('BULK_INDEXER_ENQUEUE_TIMEOUT', 0.0)
+        )
+        if not app.config.get('PRELOAD_APP'):
+            bulk_indexer.start()
+            atexit.register(bulk_indexer.stop)
+        # In-memory contact index used for payee resolution
+        global contact_index
+        contact_index = ContactIndex(
+            # Loads run inside classify requests, so they are bounded by the request deadline
+            loader=lambda user_id: READ_BREAKER.call(
+                load_contacts_from_elasticsearch, bounded(es_manager.es_client), user_id
+            ),
+            max_users=app.config.get('CONTACT_INDEX_MAX_USERS', 10000),
+            ttl=app.config.get('CONTACT_INDEX_TTL', 3600)
+        )
         # Import contacts from .vcf files on startup
         from app.utils.vcf_importer import import_all_user_contacts
         contacts_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../contacts')
-        import_all_user_contacts(contacts_dir, es_manager)
+        import_all_user_contacts(
+            contacts_dir, es_manager,
+            contact_index=contact_index,
+            workers=app.config.get('CONTACT_IMPORT_WORKERS', 0) or None,
+            chunk_size=app.config.get('CONTACT_IMPORT_CHUNK_SIZE', 1000)
+        )
         logger.info("Imported contacts from .vcf files into Elasticsearch")
 
         # --- Index generic bill data and user credit card data on startup ---
@@ -94,24 +223,56 @@ def create_app(config_class=Config):
     except Exception as e:
         logger.error(f"Elasticsearch initialization error: {str(e)}")
     
+    # Load the biller catalog once; it falls back to the seed data without Elasticsearch
+    global biller_catalog
+    from app.services.bill_seed_data import GENERIC_BILL_DATA
+    biller_catalog = BillerCatalog(
+        loader=(lambda: READ_BREAKER.call(load_generic_bills, bounded(es_manager.es_client))) if es_manager else None,
+        signature=(
+            lambda: READ_BREAKER.call(generic_bills_signature, bounded(es_manager.es_client))
+        ) if es_manager else None,
+        fallback_bills=GENERIC_BILL_DATA,
+        refresh_interval=app.config.get('BILLER_CATALOG_REFRESH_INTERVAL', 300)
+    )
+    
+    # Initialize rule-based fast path for obvious queries
+    global rule_classifier
+    if app.config.get('RULE_CLASSIFIER_ENABLED', True):
+        rule_classifier = RuleBasedClassifier(
+            biller_catalog=biller_catalog,
+            confidence_threshold=app.config.get('RULE_CLASSIFIER_THRESHOLD', 0.9)
+        )
+    
     # Initialize Gemini API with system prompt from Elasticsearch examples
-    global classifier_model
+    global model_registry
+    model_registry = ModelRegistry(
+        es_manager,
+        max_personal_models=app.config.get('PERSONAL_MODEL_CACHE_SIZE', 1000),
+        few_shot_examples=app.config.get('FEW_SHOT_EXAMPLES', 6),
+        example_pool_size=app.config.get('FEW_SHOT_POOL_SIZE', 20)
+    )
     try:
         # Configure Gemini API
         genai.configure(api_key=app.config['GEMINI_API_KEY'])
         
-        # Generate system prompt from global training data
+        # Build the global model from global training data (default prompt without Elasticsearch)
+        model_registry.refresh_global()
         if es_manager:
-            system_prompt = es_manager.generate_system_prompt()
-            classifier_model = get_intent_classifier_model(system_prompt)
             logger.info("Gemini API initialized with system prompt from training data")
         else:
-            # Fallback to default model if Elasticsearch isn't available
-            classifier_model = get_intent_classifier_model()
             logger.warning("Gemini API initialized with default system prompt (no training data)")
     except Exception as e:
         logger.error(f"Gemini API initialization error: {str(e)}")
     
+    # Feedback and manual refreshes are coalesced into debounced rebuilds
+    global model_refresher
+    model_refresher = RefreshScheduler(
+        model_registry.refresh_global,
+        debounce=app.config.get('MODEL_REFRESH_DEBOUNCE', 5.0)
+    )
+    # Workers that did not save a change rebuild once they read its newer prompt version
+    model_registry.on_global_stale = model_refresher.request
+    
     # Register blueprints
     from app.api.routes import api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
-from app import es_manager
+from app import es_manager, biller_catalog
+from app.services.biller_catalog import CREDIT_CARD_CATEGORY_ID
 
 bills_bp = Blueprint('bills', __name__)
 
@@ -14,16 +15,8 @@ def get_bills():
     ai_biller_name = data.get('ai_biller_name')
     category_name = data.get('category_name')
 
-    # 1. Fetch all generic bill data
-    generic_bills = []
-    try:
-        resp = es_manager.es_client.search(
-            index="generic_bills",
-            body={"size": 1000, "query": {"match_all": {}}}
-        )
-        generic_bills = [hit["_source"] for hit in resp["hits"]["hits"]]
-    except Exception as e:
-        return jsonify({"error": f"Failed to fetch generic bills: {str(e)}"}), 500
+    # 1. Generic bill data comes from the preloaded biller catalog
+    biller_catalog.refresh_if_changed()
 
     # 2. If AI biller_name is present, try to match with user credit cards
     matched_cards = []
@@ -63,7 +56,6 @@ def get_bills():
         return jsonify(response)
     else:
         # Optionally filter generic bills by category_name if provided
-        if category_name:
-            filtered_bills = [b for b in generic_bills if any(r.get("category_id") == 22 for r in b.get("request", []))] if category_name.upper() == "CREDIT CARD" else generic_bills
-            return jsonify({"generic_bills": filtered_bills})
-        return jsonify({"generic_bills": generic_bills})
+        if category_name and category_name.upper() == "CREDIT CARD":
+            return jsonify({"generic_bills": biller_catalog.by_category(CREDIT_CARD_CATEGORY_ID)})
+        return jsonify({"generic_bills": biller_catalog.all()})
@@ -1,36 +1,22 @@
 from flask import Blueprint, request, jsonify, current_app
-from app import es_manager, classifier_model
-from app.services.intent_classifier import classify_intent_with_feedback, get_intent_classifier_model
-import json
+from app import (
+    es_manager, model_registry, classification_cache, classification_flights, rule_classifier,
+    contact_index, biller_catalog, bulk_indexer, model_refresher, deadline_stats
+)
+from app.services.elasticsearch_manager import READ_BREAKER, breaker_stats
+from app.services.enrichment import (
+    USER_CREDIT_CARDS_INDEX, select_contact_candidates, build_ai_context, credit_card_query,
+    enrich_pay_bill, enrich_pay_to_person, wants_contacts, local_fallback
+)
+from app.services.gemini_client import GeminiUnavailableError
+from app.services.intent_classifier import classify_intent_direct, gemini_client, prompt_budget
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.deadline import DeadlineExceeded, bounded, deadline_scope, resolve_timeout
 import logging
-import threading
 
 logger = logging.getLogger(__name__)
 api_bp = Blueprint('api', __name__)
 
-# Thread-safe lock for model updates
-model_update_lock = threading.Lock()
-
-def refresh_model_async():
-    """Refresh the model with the latest training data in a background thread"""
-    from app import classifier_model
-    
-    try:
-        with model_update_lock:
-            # Generate new system prompt from Elasticsearch data
-            system_prompt = es_manager.generate_system_prompt()
-            
-            # Create a new model with the updated prompt
-            new_model = get_intent_classifier_model(system_prompt)
-            
-            # Replace the global model - need to use a different approach since it's imported
-            import app
-            app.classifier_model = new_model
-            
-        logger.info("Model refreshed with latest training data")
-    except Exception as e:
-        logger.error(f"Error refreshing model: {str(e)}")
-
 @api_bp.route('/classify-intent', methods=['POST'])
 def classify_intent_route():
     """
@@ -40,8 +26,12 @@ def classify_intent_route():
     {
         "user_id": "string" (optional),
         "query": "string",
-        "context": {} (optional)
+        "context": {} (optional),
+        "timeout_ms": int (optional, defaults to CLASSIFY_TIMEOUT)
     }
+    
+    When the deadline passes, the response is built from the steps that finished
+    and lists the fallbacks used in "fallbacks".
     """
     try:
         data = request.get_json()
@@ -53,176 +43,124 @@ def classify_intent_route():
         if not query:
             return jsonify({"error": "Missing required field: query"}), 400
 
-        if not classifier_model:
+        try:
+            timeout = resolve_timeout(
+                data.get('timeout_ms'),
+                current_app.config.get('CLASSIFY_TIMEOUT'),
+                current_app.config.get('CLASSIFY_MAX_TIMEOUT')
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if not model_registry.global_handle:
             return jsonify({"error": "Classifier model not initialized"}), 500
 
-        # Personalized model logic (unchanged)
-        model_to_use = classifier_model
+        with deadline_scope(timeout) as deadline:
+            fallbacks = []
+            intent_data = _classify_with_deadline(data, user_id, query, deadline, fallbacks)
+        deadline_stats.record(fallbacks)
+        if fallbacks:
+            logger.warning(f"Classification degraded (deadline {timeout}s), used fallbacks: {fallbacks}")
+            intent_data["fallbacks"] = fallbacks
 
-        # --- Custom: Collect contact names for user_id ---
-        contact_names = []
-        if user_id and es_manager:
-            contact_index = f"user_contacts_{user_id}"
-            try:
-                if es_manager.es_client.indices.exists(index=contact_index):
-                    # Get all contact names for the user
-                    resp = es_manager.es_client.search(
-                        index=contact_index,
-                        body={
-                            "size": 1000,
-                            "_source": ["name"],
-                            "query": {"match_all": {}}
-                        }
-                    )
-                    hits = resp.get("hits", {}).get("hits", [])
-                    contact_names = [hit["_source"]["name"] for hit in hits if "name" in hit["_source"]]
-            except Exception as e:
-                logger.warning(f"Failed to fetch contact names: {str(e)}")
-        if user_id and es_manager:
-            user_prompt = es_manager.generate_system_prompt(user_id=user_id)
-            if "Examples:" in user_prompt and len(user_prompt) > 1000:
-                model_to_use = get_intent_classifier_model(user_prompt)
-                logger.info(f"Using personalized model for user {user_id}")
+        return jsonify(intent_data)
+    
+    except Exception as e:
+        logger.error(f"Error in classify_intent_route: {str(e)}")
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+def _classify_with_deadline(data, user_id, query, deadline, fallbacks):
+    """Classify and enrich a query, appending to fallbacks each step cut short by the deadline"""
+    # --- Custom: Collect contact names for user_id ---
+    contact_store = contact_index.get(user_id) if user_id and contact_index else None
+    if user_id and contact_index and contact_store is None and deadline and deadline.expired:
+        fallbacks.append("contacts_skipped")
+    contact_names, candidate_names = select_contact_candidates(
+        contact_store, query, k=current_app.config.get('CONTACT_CANDIDATES_K', 20)
+    )
 
-        from app.services.intent_classifier import classify_intent_direct
+    # --- Custom: For PAY_TO_PERSON, pass contact names to AI ---
+    ai_context = build_ai_context(data.get("context", {}), candidate_names)
+    logger.debug(f"AI context: {ai_context}")
 
-        # --- Custom: For PAY_TO_PERSON, pass contact names to AI ---
-        ai_context = data.get("context", {})
-        if contact_names:
-            ai_context = dict(ai_context)  # copy
-            ai_context["contact_names"] = contact_names
-        logger.debug(f"AI context: {ai_context}")
-        intent_data = classify_intent_direct(model_to_use, query, context=ai_context)
-        logger.info(f"Intent classified: {intent_data}")
+    # Obvious queries are answered by deterministic rules without calling Gemini
+    intent_data = None
+    if rule_classifier:
+        intent_data = rule_classifier.classify(query, contact_names)
+        if intent_data is not None:
+            intent_data["model_version"] = "rules"
+            logger.info(f"Intent classified by rules: {intent_data}")
+
+    if intent_data is None:
+        # Personalized models are reused until the user's training data changes
+        try:
+            model_handle = model_registry.for_user(user_id)
+        except DeadlineExceeded:
+            model_handle = model_registry.global_handle
+            fallbacks.append("global_model")
+        # Results are cached per model version, so a refreshed model never serves stale answers
+        cache_key = classification_cache.make_key(query, model_handle.version, ai_context)
+        intent_data = classification_cache.get(cache_key)
+        if intent_data is not None:
+            logger.info(f"Intent served from classification cache: {intent_data}")
+        else:
+            def classify():
+                result = classify_intent_direct(model_handle.model, query, context=ai_context)
+                result["model_version"] = model_handle.version
+                classification_cache.set(cache_key, result)
+                return result
 
-        # --- PAY_BILL: Add user-specific bill data in extracted_data.additional_data ---
-        if intent_data.get("intent") == "PAY_BILL" and user_id and es_manager:
-            biller_name = intent_data.get("extracted_data", {}).get("biller_name")
-            category_name = intent_data.get("extracted_data", {}).get("category_name")
-            matched_cards = []
-            if biller_name:
-                # Remove common terms like 'bank' (case-insensitive, word boundary)
-                import re
-                normalized_biller = re.sub(r"\\bbank\\b", "", biller_name, flags=re.IGNORECASE).strip()
-                try:
-                    resp = es_manager.es_client.search(
-                        index="user_credit_cards",
-                        body={
-                            "size": 100,
-                            "query": {
-                                "bool": {
-                                    "must": [
-                                        {"term": {"customer_id": user_id}},
-                                        {"match": {"biller_name": normalized_biller}}
-                                    ]
-                                }
-                            }
-                        }
-                    )
-                    matched_cards = [hit["_source"] for hit in resp["hits"]["hits"]]
-                except Exception as e:
-                    logger.warning(f"Failed to fetch user credit cards: {str(e)}")
-            logger.info(f"Matched cards for user {user_id}: {matched_cards}")
-            # Always fetch generic bills for fallback
-            generic_bills = []
             try:
-                resp = es_manager.es_client.search(
-                    index="generic_bills",
-                    body={"size": 1000, "query": {"match_all": {}}}
+                # Concurrent identical misses wait on one Gemini call; each gets its own copy
+                intent_data, shared = classification_flights.do(cache_key, classify)
+                logger.info(f"Intent classified{' (shared in-flight call)' if shared else ''}: {intent_data}")
+            except (DeadlineExceeded, GeminiUnavailableError) as e:
+                if isinstance(e, GeminiUnavailableError):
+                    logger.warning(f"Classifying locally: {str(e)}")
+                    fallbacks.append("gemini_unavailable")
+                intent_data = local_fallback(
+                    query, contact_names, ai_context, model_registry, classification_cache,
+                    rule_classifier, fallbacks
                 )
-                generic_bills = [hit["_source"] for hit in resp["hits"]["hits"]]
-            except Exception as e:
-                logger.warning(f"Failed to fetch generic bills: {str(e)}")
-            if matched_cards:
-                # Only deduplicate by unique_bill_id if present, otherwise include all
-                seen = set()
-                deduped_cards = []
-                for card in matched_cards:
-                    unique_id = None
-                    # Try to get unique_bill_id from card['request'] if present
-                    if isinstance(card.get("request"), dict):
-                        unique_id = card["request"].get("unique_bill_id")
-                    if unique_id:
-                        if unique_id not in seen:
-                            seen.add(unique_id)
-                            deduped_cards.append(card)
-                    else:
-                        deduped_cards.append(card)
-                intent_data["extracted_data"]["additional_data"] = deduped_cards
-            else:
-                # If no matched card, filter generic bills by biller_name (ignoring 'bank')
-                filtered_bills = generic_bills
-                if biller_name:
-                    import re
-                    normalized_biller = re.sub(r"\\bbank\\b", "", biller_name, flags=re.IGNORECASE).strip().lower()
-                    filtered_bills = []
-                    for b in generic_bills:
-                        title_match = b.get("title") and normalized_biller in re.sub(r"\\bbank\\b", "", b["title"], flags=re.IGNORECASE).strip().lower()
-                        biller_name_match = b.get("biller_name") and normalized_biller in re.sub(r"\\bbank\\b", "", b["biller_name"], flags=re.IGNORECASE).strip().lower()
-                        if title_match or biller_name_match:
-                            filtered_bills = [b]
-                            break
-                # Optionally filter by category_name as well
-                if category_name:
-                    filtered_bills = [b for b in filtered_bills if any(r.get("category_id") == 22 for r in b.get("request", []))] if category_name.upper() == "CREDIT CARD" else filtered_bills
-                intent_data["extracted_data"]["additional_data"] = filtered_bills
 
-        # --- PAY_TO_PERSON: Add contacts as before ---
-        if (
-            intent_data.get("intent") == "PAY_TO_PERSON"
-            and user_id and es_manager
-            and "payee_name" in intent_data.get("extracted_data", {})
-        ):
-            payee_name = intent_data["extracted_data"]["payee_name"]
-            # Only search if payee_name is in contact_names
-            if payee_name in contact_names:
-                try:
-                    contact_index = f"user_contacts_{user_id}"
-                    if es_manager.es_client.indices.exists(index=contact_index):
-                        search_body = {
-                            "size": 10,  # Get multiple matches
-                            "query": {"match": {"name": payee_name}}
-                        }
-                        resp = es_manager.es_client.search(index=contact_index, body=search_body)
-                        hits = resp.get("hits", {}).get("hits", [])
-                        # Handle multiple contacts with same name
-                        if len(hits) > 0:
-                            contact_list = []
-                            for hit in hits:
-                                contact_list.append({
-                                    "name": hit["_source"].get("name"),
-                                    "number": hit["_source"].get("number")
-                                })
-                            # Keep contacts list only within extracted_data
-                            intent_data["extracted_data"]["contacts"] = contact_list
-                            if "payee_name" in intent_data["extracted_data"]:
-                                del intent_data["extracted_data"]["payee_name"]
-                except Exception as e:
-                    logger.warning(f"Contact lookup failed: {str(e)}")
-            else:
-                # If payee_name not in contact_names, show nothing
-                intent_data["extracted_data"].pop("payee_name", None)
-                intent_data["extracted_data"]["contacts"] = []
-
-        # Store high-confidence results if ES is available (no feedback flow)
-        if es_manager and intent_data.get("confidence", 0) > 0.8 and user_id:
+    # --- PAY_BILL: Add user-specific bill data in extracted_data.additional_data ---
+    if intent_data.get("intent") == "PAY_BILL" and user_id and es_manager:
+        biller_name = intent_data.get("extracted_data", {}).get("biller_name")
+        matched_cards = []
+        if biller_name:
             try:
-                def store_result():
-                    es_manager.save_example(
-                        query=query,
-                        classification=intent_data,
-                        user_id=user_id,
-                        is_global=False
-                    )
-                threading.Thread(target=store_result, daemon=True).start()
+                resp = READ_BREAKER.call(
+                    bounded(es_manager.es_client).search,
+                    index=USER_CREDIT_CARDS_INDEX,
+                    body=credit_card_query(user_id, biller_name)
+                )
+                matched_cards = [hit["_source"] for hit in resp["hits"]["hits"]]
             except Exception as e:
-                logger.warning(f"Failed to store result: {str(e)}")
+                logger.warning(f"Failed to fetch user credit cards: {str(e)}")
+                if deadline and deadline.expired:
+                    fallbacks.append("cards_skipped")
+        logger.info(f"Matched cards for user {user_id}: {matched_cards}")
+        enrich_pay_bill(intent_data, matched_cards, biller_catalog)
 
-        return jsonify(intent_data)
-    
-    except Exception as e:
-        logger.error(f"Error in classify_intent_route: {str(e)}")
-        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+    # --- PAY_TO_PERSON: Add contacts as before ---
+    if user_id and contact_store is not None and wants_contacts(intent_data):
+        enrich_pay_to_person(intent_data, contact_store)
+
+    # Store high-confidence results if ES is available (no feedback flow); degraded results are not
+    if bulk_indexer and intent_data.get("confidence", 0) > 0.8 and user_id and not fallbacks:
+        try:
+            # Replays the model's own answer, so the prompt version is not bumped
+            index, document, routing = es_manager.prepare_example(
+                query=query,
+                classification=intent_data,
+                user_id=user_id,
+                is_global=False
+            )
+            bulk_indexer.submit(index, document, routing=routing)
+        except Exception as e:
+            logger.warning(f"Failed to store result: {str(e)}")
+
+    return intent_data
 
 @api_bp.route('/feedback', methods=['POST'])
 def intent_feedback():
@@ -277,13 +215,16 @@ def intent_feedback():
             data_quality=data_quality
         )
         
-        # Trigger model refresh in background
-        background_thread = threading.Thread(target=refresh_model_async)
-        background_thread.daemon = True
-        background_thread.start()
+        # Schedule a model refresh; bursts of feedback share a single rebuild
+        model_refresher.request()
         
         return jsonify({"status": "feedback recorded successfully"})
     
+    except CircuitOpenError as e:
+        logger.warning(f"Feedback rejected while Elasticsearch writes fail fast: {str(e)}")
+        response = jsonify({"error": "Training data store unavailable, retry later"})
+        response.headers["Retry-After"] = str(max(1, int(e.retry_after + 0.5)))
+        return response, 503
     except Exception as e:
         logger.error(f"Error in intent_feedback: {str(e)}")
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
@@ -292,11 +233,32 @@ def intent_feedback():
 def refresh_model():
     """Force a model refresh with the latest training data"""
     try:
-        background_thread = threading.Thread(target=refresh_model_async)
-        background_thread.daemon = True
-        background_thread.start()
+        # Training data may have been written by another process (e.g. the setup job)
+        if es_manager:
+            es_manager.bump_prompt_version()
+        
+        model_refresher.request()
         
         return jsonify({"status": "model refresh initiated"})
     except Exception as e:
         logger.error(f"Error initiating model refresh: {str(e)}")
-        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+@api_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose in-process cache and performance counters"""
+    return jsonify({
+        "classification_cache": classification_cache.stats() if classification_cache else None,
+        "rule_classifier": rule_classifier.stats() if rule_classifier else None,
+        "prompt_cache": es_manager.prompt_cache_stats() if es_manager else None,
+        "contact_index": contact_index.stats() if contact_index else None,
+        "biller_catalog": biller_catalog.stats() if biller_catalog else None,
+        "bulk_indexer": bulk_indexer.stats() if bulk_indexer else None,
+        "model_refresh": model_refresher.stats() if model_refresher else None,
+        "model_registry": model_registry.stats() if model_registry else None,
+        "deadlines": deadline_stats.stats() if deadline_stats else None,
+        "elasticsearch_breakers": breaker_stats(),
+        "gemini": gemini_client.stats(),
+        "classification_flights": classification_flights.stats() if classification_flights else None,
+        "prompts": prompt_budget.stats()
+    })
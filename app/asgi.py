@@ -0,0 +1,130 @@
+"""
+ASGI entry point
+
+POST /api/classify-intent is served by the asyncio pipeline, so a worker keeps
+many requests in flight while they wait on Gemini and Elasticsearch. Every other
+route is delegated to the Flask app.
+
+Usage:
+    uvicorn app.asgi:application --host 0.0.0.0 --port 5000 --workers 4
+"""
+import json
+import logging
+from asgiref.wsgi import WsgiToAsgi
+import app as services
+from app import create_app
+from app.services.async_pipeline import AsyncClassificationPipeline
+from app.utils.deadline import resolve_timeout
+
+logger = logging.getLogger(__name__)
+
+CLASSIFY_PATH = "/api/classify-intent"
+
+flask_app = create_app()
+wsgi_application = WsgiToAsgi(flask_app)
+pipeline = None
+
+async def _startup():
+    global pipeline
+    es_client = None
+    if services.es_manager:
+        # The async client binds to the running loop, so it is created at startup
+        es_client = services.es_manager.create_async_client()
+    pipeline = AsyncClassificationPipeline(
+        es_client,
+        services.model_registry,
+        services.classification_cache,
+        es_manager=services.es_manager,
+        rule_classifier=services.rule_classifier,
+        contact_index=services.contact_index,
+        biller_catalog=services.biller_catalog,
+        bulk_indexer=services.bulk_indexer,
+        deadline_stats=services.deadline_stats,
+        classification_flights=services.classification_flights,
+        contact_candidates_k=flask_app.config.get('CONTACT_CANDIDATES_K', 20)
+    )
+    logger.info("Async classification pipeline started")
+
+async def _shutdown():
+    if pipeline:
+        await pipeline.close()
+    services.shutdown_worker()
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await _startup()
+            except Exception as e:
+                logger.error(f"Async pipeline startup error: {str(e)}")
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await _shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+async def _send_json(send, payload, status: int = 200):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            # Same policy as flask-cors' default for the Flask routes
+            (b"access-control-allow-origin", b"*")
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def _classify(receive, send):
+    """Async counterpart of routes.classify_intent_route, with the same responses"""
+    try:
+        try:
+            data = json.loads(await _read_body(receive) or b"null")
+        except ValueError:
+            data = None
+        if not data:
+            return await _send_json(send, {"error": "No data provided"}, 400)
+
+        query = data.get('query')
+        if not query:
+            return await _send_json(send, {"error": "Missing required field: query"}, 400)
+
+        try:
+            timeout = resolve_timeout(
+                data.get('timeout_ms'),
+                flask_app.config.get('CLASSIFY_TIMEOUT'),
+                flask_app.config.get('CLASSIFY_MAX_TIMEOUT')
+            )
+        except ValueError as e:
+            return await _send_json(send, {"error": str(e)}, 400)
+
+        if pipeline is None or not services.model_registry.global_handle:
+            return await _send_json(send, {"error": "Classifier model not initialized"}, 500)
+
+        intent_data = await pipeline.classify(
+            query, user_id=data.get('user_id'), context=data.get("context", {}), timeout=timeout
+        )
+        return await _send_json(send, intent_data)
+    except Exception as e:
+        logger.error(f"Error in async classify: {str(e)}")
+        return await _send_json(send, {"error": f"Internal server error: {str(e)}"}, 500)
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == CLASSIFY_PATH:
+        return await _classify(receive, send)
+    return await wsgi_application(scope, receive, send)
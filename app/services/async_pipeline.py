@@ -0,0 +1,210 @@
+import asyncio
+import logging
+from typing import Dict, Any, Optional, List
+from app.services.biller_catalog import BillerCatalog
+from app.services.bulk_indexer import BulkIndexer
+from app.services.classification_cache import ClassificationCache
+from app.services.contact_index import ContactIndex
+from app.services.elasticsearch_manager import ElasticsearchManager, READ_BREAKER
+from app.services.enrichment import (
+    USER_CREDIT_CARDS_INDEX, select_contact_candidates, build_ai_context, credit_card_query,
+    filter_cards_by_biller, enrich_pay_bill, enrich_pay_to_person, wants_contacts, local_fallback
+)
+from app.services.gemini_client import GeminiUnavailableError
+from app.services.intent_classifier import classify_intent_async
+from app.services.model_registry import ModelRegistry
+from app.services.rule_classifier import RuleBasedClassifier
+from app.utils.deadline import DeadlineExceeded, DeadlineStats, bounded, current_deadline, deadline_scope
+from app.utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+class AsyncClassificationPipeline:
+    """
+    Classification pipeline for the ASGI entry point
+
+    Produces the same results as the Flask classify route, but the user's cards are
+    fetched while Gemini is classifying instead of after it, and requests wait on
+    I/O without holding a thread.
+    """
+
+    def __init__(self, es_client, model_registry: ModelRegistry,
+                 classification_cache: ClassificationCache,
+                 es_manager: Optional[ElasticsearchManager] = None,
+                 rule_classifier: Optional[RuleBasedClassifier] = None,
+                 contact_index: Optional[ContactIndex] = None,
+                 biller_catalog: Optional[BillerCatalog] = None,
+                 bulk_indexer: Optional[BulkIndexer] = None,
+                 deadline_stats: Optional[DeadlineStats] = None,
+                 classification_flights: Optional[SingleFlight] = None,
+                 contact_candidates_k: int = 20):
+        """
+        Initialize the pipeline
+
+        Args:
+            es_client: AsyncElasticsearch client (see ElasticsearchManager.create_async_client)
+            model_registry: Source of the global and personalized models
+            classification_cache: Cache of Gemini results
+            es_manager: Manager used to build auto-stored training examples
+            rule_classifier: Optional fast path for obvious queries
+            contact_index: In-memory contacts used for payee resolution
+            biller_catalog: Catalog used when no user card matches
+            bulk_indexer: Writer for auto-stored training examples
+            deadline_stats: Counters of requests that ran out of time
+            classification_flights: Deduplicator of identical in-flight Gemini calls
+            contact_candidates_k: Number of best-matching contacts sent to Gemini
+        """
+        self.es_client = es_client
+        self.model_registry = model_registry
+        self.classification_cache = classification_cache
+        self.es_manager = es_manager
+        self.rule_classifier = rule_classifier
+        self.contact_index = contact_index
+        self.biller_catalog = biller_catalog
+        self.bulk_indexer = bulk_indexer
+        self.deadline_stats = deadline_stats
+        self.classification_flights = classification_flights or SingleFlight()
+        self.contact_candidates_k = contact_candidates_k
+
+    async def classify(self, query: str, user_id: Optional[str] = None,
+                       context: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Classify a query and enrich the result
+
+        Args:
+            query: User query text
+            user_id: Optional user identifier
+            context: Optional context sent to Gemini
+            timeout: Deadline in seconds for every Elasticsearch and Gemini call
+
+        Returns:
+            Enriched classification result, listing in "fallbacks" the steps cut
+            short by the deadline
+        """
+        with deadline_scope(timeout):
+            fallbacks = []
+            intent_data = await self._classify_and_enrich(query, user_id, context, fallbacks)
+        if self.deadline_stats:
+            self.deadline_stats.record(fallbacks)
+        if fallbacks:
+            logger.warning(f"Classification degraded (deadline {timeout}s), used fallbacks: {fallbacks}")
+            intent_data["fallbacks"] = fallbacks
+        return intent_data
+
+    async def _classify_and_enrich(self, query: str, user_id: Optional[str],
+                                   context: Optional[Dict[str, Any]], fallbacks: List[str]) -> Dict[str, Any]:
+        deadline = current_deadline()
+        contact_store = None
+        if user_id and self.contact_index:
+            # In-memory after the first request; the first load reads Elasticsearch
+            contact_store = await asyncio.to_thread(self.contact_index.get, user_id)
+            if contact_store is None and deadline and deadline.expired:
+                fallbacks.append("contacts_skipped")
+        contact_names, candidate_names = select_contact_candidates(
+            contact_store, query, k=self.contact_candidates_k
+        )
+        ai_context = build_ai_context(context, candidate_names)
+
+        # Cards are fetched speculatively so PAY_BILL enrichment does not wait on a second round trip
+        cards_task = None
+        if user_id and self.es_manager:
+            cards_task = asyncio.create_task(self._fetch_cards(user_id))
+
+        try:
+            intent_data = await self._classify(query, user_id, contact_names, ai_context, fallbacks)
+
+            if intent_data.get("intent") == "PAY_BILL" and cards_task is not None:
+                biller_name = intent_data.get("extracted_data", {}).get("biller_name")
+                cards = await cards_task
+                if cards is None:
+                    cards = []
+                    if deadline and deadline.expired:
+                        fallbacks.append("cards_skipped")
+                matched_cards = filter_cards_by_biller(cards, biller_name) if biller_name else []
+                logger.info(f"Matched cards for user {user_id}: {matched_cards}")
+                enrich_pay_bill(intent_data, matched_cards, self.biller_catalog)
+        finally:
+            if cards_task is not None and not cards_task.done():
+                cards_task.cancel()
+
+        if user_id and contact_store is not None and wants_contacts(intent_data):
+            enrich_pay_to_person(intent_data, contact_store)
+
+        # Degraded results are not stored as training examples
+        if not fallbacks:
+            self._store_example(query, user_id, intent_data)
+        return intent_data
+
+    async def _classify(self, query: str, user_id: Optional[str], contact_names: List[str],
+                        ai_context: Dict[str, Any], fallbacks: List[str]) -> Dict[str, Any]:
+        # Obvious queries are answered by deterministic rules without calling Gemini
+        if self.rule_classifier:
+            intent_data = self.rule_classifier.classify(query, contact_names)
+            if intent_data is not None:
+                intent_data["model_version"] = "rules"
+                logger.info(f"Intent classified by rules: {intent_data}")
+                return intent_data
+
+        # Building a personalized model may read the user's examples from Elasticsearch
+        try:
+            model_handle = await asyncio.to_thread(self.model_registry.for_user, user_id)
+        except DeadlineExceeded:
+            model_handle = self.model_registry.global_handle
+            fallbacks.append("global_model")
+        cache_key = self.classification_cache.make_key(query, model_handle.version, ai_context)
+        intent_data = self.classification_cache.get(cache_key)
+        if intent_data is not None:
+            logger.info(f"Intent served from classification cache: {intent_data}")
+            return intent_data
+
+        async def classify():
+            result = await classify_intent_async(model_handle.model, query, context=ai_context)
+            result["model_version"] = model_handle.version
+            self.classification_cache.set(cache_key, result)
+            return result
+
+        try:
+            # Concurrent identical misses wait on one Gemini call; each gets its own copy
+            intent_data, shared = await self.classification_flights.do_async(cache_key, classify)
+        except (DeadlineExceeded, GeminiUnavailableError) as e:
+            if isinstance(e, GeminiUnavailableError):
+                logger.warning(f"Classifying locally: {str(e)}")
+                fallbacks.append("gemini_unavailable")
+            return local_fallback(
+                query, contact_names, ai_context, self.model_registry, self.classification_cache,
+                self.rule_classifier, fallbacks
+            )
+        logger.info(f"Intent classified{' (shared in-flight call)' if shared else ''}: {intent_data}")
+        return intent_data
+
+    async def _fetch_cards(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            resp = await READ_BREAKER.call_async(
+                bounded(self.es_client).search, index=USER_CREDIT_CARDS_INDEX, body=credit_card_query(user_id)
+            )
+            return [hit["_source"] for hit in resp["hits"]["hits"]]
+        except Exception as e:
+            logger.warning(f"Failed to fetch user credit cards: {str(e)}")
+            return None
+
+    def _store_example(self, query: str, user_id: Optional[str], intent_data: Dict[str, Any]) -> None:
+        # Store high-confidence results (no feedback flow)
+        if not self.bulk_indexer or not user_id or intent_data.get("confidence", 0) <= 0.8:
+            return
+        try:
+            # Replays the model's own answer, so the prompt version is not bumped
+            index, document, routing = self.es_manager.prepare_example(
+                query=query,
+                classification=intent_data,
+                user_id=user_id,
+                is_global=False
+            )
+            self.bulk_indexer.submit(index, document, routing=routing)
+        except Exception as e:
+            logger.warning(f"Failed to store result: {str(e)}")
+
+    async def close(self) -> None:
+        """Close the async Elasticsearch client"""
+        if self.es_client is not None:
+            await self.es_client.close()
@@ -0,0 +1,293 @@
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from app.utils.helpers import normalize_query
+
+logger = logging.getLogger(__name__)
+
+CREDIT_CARD_CATEGORY_ID = 22
+
+# Bill category ids used in the biller catalog
+CATEGORY_NAMES = {
+    CREDIT_CARD_CATEGORY_ID: "CREDIT CARD",
+    4: "ELECTRICITY"
+}
+
+def normalize_biller_name(name: str) -> str:
+    """
+    Normalize a biller name for matching
+
+    Args:
+        name: Biller title or name as returned by the model
+
+    Returns:
+        Lower-cased name without the word 'bank' and with collapsed whitespace
+    """
+    return " ".join(re.sub(r"\bbank\b", " ", name.lower()).split())
+
+def biller_display_name(name: str) -> str:
+    """Strip parentheticals, card suffixes and a trailing 'Bank' from a biller title"""
+    display = re.sub(r"\(.*?\)", "", name)
+    display = re.sub(r"\s+(credit\s+card|card)\s*$", "", display.strip(), flags=re.IGNORECASE)
+    display = re.sub(r"\s+bank\s*$", "", display.strip(), flags=re.IGNORECASE)
+    return display.strip()
+
+def build_biller_aliases(bills: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Build a map of normalized biller aliases to the bills they identify
+
+    Args:
+        bills: Generic bill records (with 'title' or 'biller_name')
+
+    Returns:
+        Dict of alias -> list of matching bill descriptors
+    """
+    aliases = defaultdict(list)
+    for bill in bills:
+        name = bill.get("title") or bill.get("biller_name")
+        if not name:
+            continue
+        requests = bill.get("request") or []
+        category_id = requests[0].get("category_id") if requests else None
+        descriptor = {
+            "biller_name": biller_display_name(name),
+            "category_name": CATEGORY_NAMES.get(category_id),
+            "id": bill.get("id")
+        }
+        keys = {
+            normalize_query(name),
+            normalize_query(biller_display_name(name)),
+            normalize_query(re.sub(r"\(.*?\)", "", name))
+        }
+        # Acronyms such as BESCOM or TNEB are how users usually refer to utilities
+        keys.update(a.lower() for a in re.findall(r"\(([A-Za-z]{2,})\)", name))
+        for key in keys:
+            if key and descriptor not in aliases[key]:
+                aliases[key].append(descriptor)
+    return dict(aliases)
+
+def load_generic_bills(es_client, index_name: str = "generic_bills") -> List[Dict[str, Any]]:
+    """
+    Load generic bill records from Elasticsearch
+
+    Args:
+        es_client: Elasticsearch client
+        index_name: Index holding generic bills
+
+    Returns:
+        List of bill records
+    """
+    resp = es_client.search(index=index_name, body={"size": 1000, "query": {"match_all": {}}})
+    return [hit["_source"] for hit in resp["hits"]["hits"]]
+
+def generic_bills_signature(es_client, index_name: str = "generic_bills") -> Tuple:
+    """
+    Get a cheap signature that changes whenever the generic bills index is written
+
+    Args:
+        es_client: Elasticsearch client
+        index_name: Index holding generic bills
+
+    Returns:
+        Tuple of document count, deleted count and indexing operations
+    """
+    stats = es_client.indices.stats(index=index_name, metric="docs,indexing")
+    primaries = stats["_all"]["primaries"]
+    return (
+        primaries["docs"]["count"],
+        primaries["docs"]["deleted"],
+        primaries["indexing"]["index_total"]
+    )
+
+class _CatalogSnapshot:
+    """Immutable lookup structures built from one version of the bill list"""
+
+    def __init__(self, bills: List[Dict[str, Any]]):
+        self.bills: List[Dict[str, Any]] = []
+        self.keys: List[str] = []
+        self.by_key: Dict[str, int] = {}
+        self.by_category: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        seen_ids = set()
+        for bill in bills:
+            name = bill.get("title") or bill.get("biller_name")
+            # Repeated seeding may have stored the same bill more than once
+            bill_id = bill.get("id")
+            if bill_id is not None:
+                if bill_id in seen_ids:
+                    continue
+                seen_ids.add(bill_id)
+            position = len(self.bills)
+            self.bills.append(bill)
+            key = normalize_biller_name(name) if name else ""
+            self.keys.append(key)
+            self.by_key.setdefault(key, position)
+            for category_id in {r.get("category_id") for r in bill.get("request", []) or []}:
+                self.by_category[category_id].append(bill)
+        self.sorted_keys: List[Tuple[str, int]] = sorted((key, i) for i, key in enumerate(self.keys))
+        self.aliases = build_biller_aliases(self.bills)
+        # Longest aliases first so "hdfc bank pixel" wins over "hdfc"
+        self.alias_patterns = [
+            (alias, re.compile(rf"(?<!\w){re.escape(alias)}(?!\w)"))
+            for alias in sorted(self.aliases, key=len, reverse=True)
+        ]
+
+class BillerCatalog:
+    """Generic biller catalog loaded once and kept in memory with precomputed lookup keys"""
+
+    def __init__(self, loader: Optional[Callable[[], List[Dict[str, Any]]]] = None,
+                 signature: Optional[Callable[[], Any]] = None,
+                 fallback_bills: Optional[List[Dict[str, Any]]] = None,
+                 refresh_interval: float = 300):
+        """
+        Initialize and load the catalog
+
+        Args:
+            loader: Function returning the bill records (e.g. from Elasticsearch)
+            signature: Function returning a value that changes when the source changes
+            fallback_bills: Bills used when the loader is missing or fails
+            refresh_interval: Minimum seconds between source change checks
+        """
+        self.loader = loader
+        self.signature = signature
+        self.fallback_bills = fallback_bills or []
+        self.refresh_interval = refresh_interval
+        self._refresh_lock = threading.Lock()
+        self._last_check = 0.0
+        self._signature_value = None
+        self._snapshot = _CatalogSnapshot([])
+        self.refreshes = 0
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Rebuild the catalog from its source and swap it in atomically
+
+        Args:
+            force: Rebuild even if the source signature did not change
+
+        Returns:
+            True if a new snapshot was installed
+        """
+        with self._refresh_lock:
+            return self._refresh(force)
+
+    def _refresh(self, force: bool) -> bool:
+        # Called with the refresh lock held
+        self._last_check = time.monotonic()
+        signature_value = None
+        if self.signature:
+            try:
+                signature_value = self.signature()
+            except Exception as e:
+                logger.warning(f"Failed to check biller catalog source: {str(e)}")
+                if not force:
+                    return False
+            if not force and signature_value == self._signature_value:
+                return False
+
+        bills = None
+        if self.loader:
+            try:
+                bills = self.loader()
+            except Exception as e:
+                logger.warning(f"Failed to load biller catalog: {str(e)}")
+                if self._snapshot.bills:
+                    # Keep serving the previous snapshot until the source recovers
+                    return False
+        if not bills:
+            bills = self.fallback_bills
+
+        # Readers keep using the old snapshot until this single reference assignment
+        self._snapshot = _CatalogSnapshot(bills)
+        self._signature_value = signature_value
+        self.refreshes += 1
+        logger.info(f"Biller catalog loaded with {len(self._snapshot.bills)} billers")
+        return True
+
+    def refresh_if_changed(self) -> bool:
+        """Refresh from the source if it changed, checking at most once per refresh interval"""
+        if time.monotonic() - self._last_check < self.refresh_interval:
+            return False
+        with self._refresh_lock:
+            # Threads that passed the check together wait here; only the first checks the source
+            if time.monotonic() - self._last_check < self.refresh_interval:
+                return False
+            return self._refresh(force=False)
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Get every bill in the catalog"""
+        return list(self._snapshot.bills)
+
+    def by_category(self, category_id: int) -> List[Dict[str, Any]]:
+        """Get the bills of one category"""
+        return list(self._snapshot.by_category.get(category_id, []))
+
+    def match(self, biller_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the bill for a biller name returned by the model
+
+        Exact keys and aliases are dictionary lookups, then the sorted keys are
+        searched for a prefix, and only then for a substring.
+
+        Args:
+            biller_name: Biller name such as 'Axis' or 'HDFC Bank'
+
+        Returns:
+            Matching bill record or None
+        """
+        snapshot = self._snapshot
+        key = normalize_biller_name(biller_name)
+        if not key:
+            return None
+
+        position = snapshot.by_key.get(key)
+        if position is not None:
+            return snapshot.bills[position]
+
+        descriptors = snapshot.aliases.get(normalize_query(biller_name)) or snapshot.aliases.get(key, [])
+        if len(descriptors) == 1:
+            for bill in snapshot.bills:
+                if bill.get("id") == descriptors[0]["id"]:
+                    return bill
+
+        start = bisect.bisect_left(snapshot.sorted_keys, (key, -1))
+        prefixed = []
+        for candidate_key, candidate_position in snapshot.sorted_keys[start:]:
+            if not candidate_key.startswith(key):
+                break
+            prefixed.append(candidate_position)
+        if prefixed:
+            return snapshot.bills[min(prefixed)]
+
+        for position, candidate_key in enumerate(snapshot.keys):
+            if key in candidate_key:
+                return snapshot.bills[position]
+        return None
+
+    def find_in_text(self, text: str) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """
+        Find the longest biller alias mentioned in a normalized query
+
+        Args:
+            text: Normalized query text
+
+        Returns:
+            Tuple of the matched alias and the bill descriptors it identifies
+        """
+        snapshot = self._snapshot
+        for alias, pattern in snapshot.alias_patterns:
+            if pattern.search(text):
+                return alias, snapshot.aliases[alias]
+        return None, []
+
+    def stats(self) -> Dict[str, Any]:
+        """Get catalog size and refresh counters"""
+        return {
+            "billers": len(self._snapshot.bills),
+            "aliases": len(self._snapshot.aliases),
+            "refreshes": self.refreshes
+        }
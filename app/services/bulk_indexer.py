@@ -0,0 +1,203 @@
+import logging
+import queue
+import threading
+import time
+from typing import Dict, Any, Optional, List, Tuple
+from app.services.elasticsearch_manager import ElasticsearchManager, WRITE_BREAKER, retry_elasticsearch_operation
+from app.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+class BulkIndexer:
+    """Write-behind indexer that groups documents into _bulk requests on a background thread"""
+
+    def __init__(self, es_manager: ElasticsearchManager,
+                 max_queue_size: int = 10000,
+                 batch_size: int = 500,
+                 flush_interval: float = 1.0,
+                 enqueue_timeout: float = 0.0,
+                 max_known_indices: int = 10000):
+        """
+        Initialize the indexer (call start() to launch the writer thread)
+
+        Args:
+            es_manager: ElasticsearchManager used for index creation and bulk writes
+            max_queue_size: Maximum number of documents waiting to be written
+            batch_size: Maximum number of documents per _bulk request
+            flush_interval: Maximum seconds a document waits before its batch is sent
+            enqueue_timeout: Seconds submit() waits for queue space before dropping a document
+            max_known_indices: Maximum number of indices remembered as existing (with one
+                index per user, an evicted index is only checked again)
+        """
+        self.es_manager = es_manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: "queue.Queue[Tuple[str, Dict[str, Any], Optional[str]]]" = queue.Queue(max_queue_size)
+        self._known_indices = LRUCache(maxsize=max_known_indices)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._idle = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.indexed = 0
+        self.failed = 0
+        self.bulk_requests = 0
+
+    def start(self) -> None:
+        """Start the background writer thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="bulk-indexer", daemon=True)
+        self._thread.start()
+
+    def submit(self, index: str, document: Dict[str, Any], routing: Optional[str] = None) -> bool:
+        """
+        Queue a document for indexing
+
+        When the queue is full the caller waits up to enqueue_timeout for space
+        (backpressure), after which the new document is dropped.
+
+        Args:
+            index: Target index
+            document: Document body
+            routing: Optional routing value
+
+        Returns:
+            True if queued, False if dropped
+        """
+        try:
+            if self.enqueue_timeout > 0:
+                self._queue.put((index, document, routing), timeout=self.enqueue_timeout)
+            else:
+                self._queue.put_nowait((index, document, routing))
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            logger.warning(f"Bulk indexer queue full, dropped document for index '{index}'")
+            return False
+        with self._stats_lock:
+            self.submitted += 1
+        return True
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """
+        Wait until every queued document has been written
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if the queue drained in time
+        """
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Flush pending documents and stop the writer thread
+
+        Args:
+            timeout: Maximum seconds to wait for the flush
+        """
+        if not self._thread or not self._thread.is_alive():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"Bulk indexer did not flush within {timeout}s; {self._queue.qsize()} documents lost")
+        else:
+            logger.info("Bulk indexer flushed and stopped")
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+                for _ in batch:
+                    self._queue.task_done()
+                with self._idle:
+                    self._idle.notify_all()
+            elif self._stopping.is_set():
+                return
+
+    def _next_batch(self) -> List[Tuple[str, Dict[str, Any], Optional[str]]]:
+        """Collect up to batch_size documents, waiting at most flush_interval after the first"""
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if self._stopping.is_set():
+                remaining = 0
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Tuple[str, Dict[str, Any], Optional[str]]]) -> None:
+        # Each index and alias is prepared once per batch, however many documents it gets
+        for index in dict.fromkeys(index for index, _, _ in batch):
+            if index not in self._known_indices:
+                try:
+                    self.es_manager._create_index_if_not_exists(index)
+                    self._known_indices.set(index, True)
+                except Exception as e:
+                    logger.error(f"Failed to create index '{index}' for bulk write: {str(e)}")
+        for routing in dict.fromkeys(routing for _, _, routing in batch if routing):
+            self.es_manager.ensure_user_alias(routing)
+
+        operations = []
+        for index, document, routing in batch:
+            action = {"_index": index}
+            if routing:
+                action["routing"] = routing
+            operations.append({"index": action})
+            operations.append(document)
+
+        try:
+            response = self._send(operations)
+        except Exception as e:
+            with self._stats_lock:
+                self.failed += len(batch)
+            logger.error(f"Bulk write of {len(batch)} documents failed: {str(e)}")
+            return
+
+        failed = 0
+        if response.get("errors"):
+            failed = sum(1 for item in response.get("items", []) if item.get("index", {}).get("error"))
+            logger.warning(f"Bulk write completed with {failed} failed documents")
+        with self._stats_lock:
+            self.bulk_requests += 1
+            self.indexed += len(batch) - failed
+            self.failed += failed
+
+    @retry_elasticsearch_operation(max_retries=3, breaker=WRITE_BREAKER)
+    def _send(self, operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return self.es_manager.es_client.bulk(body=operations)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth and write counters"""
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "indexed": self.indexed,
+                "failed": self.failed,
+                "bulk_requests": self.bulk_requests,
+                "known_indices": len(self._known_indices)
+            }
@@ -0,0 +1,87 @@
+import copy
+import logging
+from typing import Dict, Any, Optional, Tuple
+from app.utils.cache import LRUCache
+from app.utils.helpers import normalize_query, fingerprint
+
+logger = logging.getLogger(__name__)
+
+class ClassificationCache:
+    """
+    Bounded LRU+TTL cache of Gemini classification results
+
+    Each worker has its own cache. Keys carry the prompt version of the model
+    that answered, and prompt versions are shared through Elasticsearch, so a
+    training data change saved by any worker stops every worker from serving
+    older results once it has rebuilt its model (see ModelRegistry).
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: Optional[float] = 600):
+        """
+        Initialize the classification cache
+
+        Args:
+            maxsize: Maximum number of cached classifications
+            ttl: Lifetime of a cached classification in seconds
+        """
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def make_key(query: str, prompt_version: str,
+                 context: Optional[Dict[str, Any]] = None) -> Tuple[str, str, str]:
+        """
+        Build the cache key for a classification request
+
+        Args:
+            query: User query text
+            prompt_version: Version of the prompt the query would be classified with
+            context: Context sent to the model alongside the query
+
+        Returns:
+            Tuple of normalized query, prompt version and context fingerprint
+        """
+        return (normalize_query(query), prompt_version, fingerprint(context))
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached classification
+
+        Args:
+            key: Key built with make_key
+
+        Returns:
+            Copy of the cached classification, or None on a miss
+        """
+        result = self._cache.get(key)
+        if result is None:
+            return None
+        # Callers enrich extracted_data in place, so never hand out the cached object
+        return copy.deepcopy(result)
+
+    def set(self, key: Tuple[str, str, str], result: Dict[str, Any]) -> None:
+        """
+        Cache a classification result; error fallbacks are never cached
+
+        Args:
+            key: Key built with make_key
+            result: Classification result returned by the model
+        """
+        if not result or "error" in result:
+            return
+        self._cache.set(key, copy.deepcopy(result))
+
+    def invalidate(self) -> None:
+        """
+        Drop every classification cached by this process
+
+        Other workers are not affected; to retire cached results in every
+        worker, bump the prompt version (ElasticsearchManager.bump_prompt_version)
+        instead. Entries left behind by other workers expire after the cache TTL
+        at the latest.
+        """
+        self._cache.clear()
+        logger.info("Classification cache cleared")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters"""
+        return self._cache.stats()
@@ -0,0 +1,295 @@
+import logging
+import re
+import threading
+import time
+from array import array
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from elasticsearch import NotFoundError
+from elasticsearch.helpers import scan
+from app.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize a contact name for matching
+
+    Args:
+        name: Raw contact or payee name
+
+    Returns:
+        Lower-cased name with punctuation replaced by single spaces
+    """
+    return " ".join(re.sub(r"[^\w]+", " ", name.lower()).split())
+
+# Query words that never identify a payee
+QUERY_STOP_WORDS = {
+    "pay", "send", "transfer", "give", "to", "for", "from", "the", "my", "me", "and",
+    "rs", "inr", "rupees", "rupee", "rupaye", "ko", "bhejo", "please", "now", "bill", "amount"
+}
+
+def _ngrams(text: str, n: int) -> List[str]:
+    padded = f" {text} "
+    if len(padded) <= n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+class ContactStore:
+    """Array-backed contacts of one user with a character n-gram inverted index"""
+
+    __slots__ = ("names", "numbers", "normalized", "ngram_size",
+                 "_gram_counts", "_postings", "_by_normalized")
+
+    def __init__(self, contacts: List[Dict[str, Any]], ngram_size: int = 3):
+        """
+        Build the store
+
+        Args:
+            contacts: Contacts with 'name' and 'number'
+            ngram_size: Length of the character n-grams used for fuzzy lookups
+        """
+        self.ngram_size = ngram_size
+        self.names: List[str] = []
+        self.numbers: List[str] = []
+        self.normalized: List[str] = []
+        self._gram_counts = array("H")
+        self._postings: Dict[str, array] = {}
+        self._by_normalized: Dict[str, List[int]] = {}
+
+        for contact in contacts:
+            name = contact.get("name")
+            if not name:
+                continue
+            position = len(self.names)
+            normalized = normalize_name(name)
+            self.names.append(name)
+            self.numbers.append(contact.get("number"))
+            self.normalized.append(normalized)
+            self._by_normalized.setdefault(normalized, []).append(position)
+            grams = set(_ngrams(normalized, ngram_size))
+            self._gram_counts.append(min(len(grams), 65535))
+            for gram in grams:
+                postings = self._postings.get(gram)
+                if postings is None:
+                    postings = self._postings[gram] = array("I")
+                postings.append(position)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def contact(self, position: int) -> Dict[str, Any]:
+        """Get the contact stored at a position"""
+        return {"name": self.names[position], "number": self.numbers[position]}
+
+    def lookup(self, name: str) -> List[int]:
+        """
+        Find contacts whose normalized name equals the given name
+
+        Args:
+            name: Name to look up
+
+        Returns:
+            Positions of matching contacts
+        """
+        return list(self._by_normalized.get(normalize_name(name), []))
+
+    def search(self, query: str, limit: int = 10,
+               min_similarity: float = 0.5) -> List[Tuple[int, float]]:
+        """
+        Fuzzy search by character n-gram overlap
+        
+        Similarity averages the Dice coefficient with the share of query n-grams found
+        in the name, so a first name alone still matches the full contact name.
+
+        Args:
+            query: Name or free text to match against contact names
+            limit: Maximum number of results
+            min_similarity: Minimum similarity (0-1) for a contact to be returned
+
+        Returns:
+            List of (position, similarity) pairs, best match first
+        """
+        grams = set(_ngrams(normalize_name(query), self.ngram_size))
+        if not grams:
+            return []
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for position in self._postings.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+
+        query_count = len(grams)
+        scored = []
+        for position, overlap in shared.items():
+            dice = 2.0 * overlap / (query_count + self._gram_counts[position])
+            similarity = (dice + overlap / query_count) / 2
+            if similarity >= min_similarity:
+                scored.append((position, similarity))
+        scored.sort(key=lambda item: (-item[1], self.names[item[0]]))
+        return scored[:limit]
+
+    def candidates(self, query: str, k: int = 20,
+                   min_similarity: float = 0.5) -> List[str]:
+        """
+        Select the contact names most relevant to a query
+        
+        Each query word (and pair of adjacent words) is matched against the n-gram
+        index and every contact keeps its best score.
+        
+        Args:
+            query: User query text
+            k: Maximum number of names to return
+            min_similarity: Minimum similarity for a contact to be considered
+            
+        Returns:
+            Up to k contact names, best match first
+        """
+        words = [
+            word for word in normalize_name(query).split()
+            if len(word) > 1 and not word.isdigit() and word not in QUERY_STOP_WORDS
+        ]
+        terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        best: Dict[int, float] = {}
+        for term in terms:
+            for position, similarity in self.search(term, limit=k, min_similarity=min_similarity):
+                if similarity > best.get(position, 0.0):
+                    best[position] = similarity
+        ranked = sorted(best.items(), key=lambda item: (-item[1], self.names[item[0]]))
+        return [self.names[position] for position, _ in ranked[:k]]
+
+# Contacts of all users live in one index, routed by user_id
+CONTACTS_INDEX = "user_contacts"
+CONTACTS_MAPPING = {
+    "settings": {
+        "analysis": {
+            "normalizer": {
+                "name_normalizer": {"type": "custom", "filter": ["lowercase", "asciifolding"]}
+            }
+        }
+    },
+    "mappings": {
+        "_routing": {"required": True},
+        "properties": {
+            "user_id": {"type": "keyword"},
+            "name": {
+                "type": "text",
+                "fields": {"normalized": {"type": "keyword", "normalizer": "name_normalizer"}}
+            },
+            "number": {"type": "keyword"}
+        }
+    }
+}
+
+def contact_document_id(user_id: str, number: str) -> str:
+    """Document id of a contact; keying on the number keeps re-imports from duplicating it"""
+    return f"{user_id}_{number}"
+
+def load_contacts_from_elasticsearch(es_client, user_id: str,
+                                     index_name: str = CONTACTS_INDEX) -> List[Dict[str, Any]]:
+    """
+    Load all contacts of a user from Elasticsearch
+
+    Args:
+        es_client: Elasticsearch client
+        user_id: User identifier
+        index_name: Shared contacts index
+
+    Returns:
+        List of contacts with 'name' and 'number'
+    """
+    try:
+        return [
+            hit["_source"] for hit in scan(
+                es_client,
+                index=index_name,
+                query={
+                    "_source": ["name", "number"],
+                    "query": {"bool": {"filter": [{"term": {"user_id": user_id}}]}}
+                },
+                routing=user_id,
+                size=1000
+            )
+        ]
+    except NotFoundError:
+        return []
+
+class ContactIndex:
+    """Per-user contact stores held in memory with LRU eviction by user"""
+
+    def __init__(self, loader: Callable[[str], List[Dict[str, Any]]],
+                 max_users: int = 10000, ttl: Optional[float] = 3600):
+        """
+        Initialize the index
+
+        Args:
+            loader: Function returning the contacts of a user (e.g. from Elasticsearch)
+            max_users: Maximum number of users whose contacts are kept in memory
+            ttl: Seconds after which a user's contacts are reloaded
+        """
+        self.loader = loader
+        self._stores = LRUCache(maxsize=max_users, ttl=ttl)
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.load_errors = 0
+        self.load_time_ms = 0.0
+
+    def get(self, user_id: str) -> Optional[ContactStore]:
+        """
+        Get a user's contact store, loading it on first use
+
+        Args:
+            user_id: User identifier
+
+        Returns:
+            ContactStore (possibly empty), or None if loading failed
+        """
+        store = self._stores.get(user_id)
+        if store is not None:
+            return store
+
+        start = time.perf_counter()
+        try:
+            contacts = self.loader(user_id)
+        except Exception as e:
+            with self._lock:
+                self.load_errors += 1
+            logger.warning(f"Failed to load contacts for user {user_id}: {str(e)}")
+            return None
+        store = ContactStore(contacts)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.loads += 1
+            self.load_time_ms += elapsed_ms
+        # Empty stores are cached too, so users without contacts do not hit ES per request
+        self._stores.set(user_id, store)
+        logger.debug(f"Loaded {len(store)} contacts for user {user_id} in {elapsed_ms:.1f} ms")
+        return store
+
+    def put(self, user_id: str, contacts: List[Dict[str, Any]]) -> ContactStore:
+        """
+        Replace a user's contacts, e.g. right after a VCF import
+
+        Args:
+            user_id: User identifier
+            contacts: Contacts with 'name' and 'number'
+
+        Returns:
+            The new ContactStore
+        """
+        store = ContactStore(contacts)
+        self._stores.set(user_id, store)
+        return store
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop a user's contacts so they are reloaded on next use"""
+        self._stores.pop(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache counters and load timings"""
+        stats = self._stores.stats()
+        with self._lock:
+            stats.update({
+                "loads": self.loads,
+                "load_errors": self.load_errors,
+                "avg_load_ms": round(self.load_time_ms / self.loads, 2) if self.loads else 0.0
+            })
+        return stats
@@ -1,21 +1,62 @@
-import json
 import logging
+import random
 import time
-from typing import Dict, Any, Optional, List, Callable
+from typing import Dict, Any, Optional, List, Callable, Tuple
 from datetime import datetime
-from elasticsearch import Elasticsearch
-from elasticsearch.exceptions import ConnectionError, TransportError
+from elasticsearch import Elasticsearch, NotFoundError
+from elasticsearch.exceptions import ApiError, ConnectionError, TransportError
+from app.services.prompt_builder import render_examples
+from app.utils.cache import LRUCache
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.deadline import DeadlineExceeded, bounded, check_deadline, current_deadline
+from app.utils.helpers import fingerprint
 
 logger = logging.getLogger(__name__)
 
-def retry_elasticsearch_operation(max_retries=5, initial_backoff=1, max_backoff=30):
+# Intents whose examples are included in generated system prompts
+PROMPT_INTENTS = ["PAY_TO_PERSON", "PAY_BILL", "CHECK_REWARDS", "TRANSACTION_HISTORY", "OTHER"]
+
+# Holds one marker per seeded index with the fingerprint of the data last written to it
+SEED_VERSIONS_INDEX = "seed_versions"
+
+# 'per_user': one index per user; 'shared': one index routed by user_id
+USER_STORAGE_MODES = ("per_user", "shared")
+
+def _classify_es_error(e: BaseException) -> str:
+    """Decide whether an exception raised by an Elasticsearch call counts against its circuit"""
+    if isinstance(e, ApiError):
+        # The cluster answered; only throttling and server errors signal a brownout
+        return CircuitBreaker.FAILURE if e.status_code == 429 or e.status_code >= 500 else CircuitBreaker.SUCCESS
+    if isinstance(e, (ConnectionError, TransportError)):
+        # A timeout imposed by the request's own deadline says nothing about the cluster
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            return CircuitBreaker.IGNORE
+        return CircuitBreaker.FAILURE
+    return CircuitBreaker.IGNORE
+
+# Shared by every caller in the process, so one brownout opens one circuit. Reads
+# trip early and probe often because callers can answer from caches; writes
+# tolerate more failures before rejecting user data.
+READ_BREAKER = CircuitBreaker(
+    "elasticsearch_read", failure_threshold=5, recovery_timeout=5.0, max_recovery_timeout=60.0,
+    classify_error=_classify_es_error
+)
+WRITE_BREAKER = CircuitBreaker(
+    "elasticsearch_write", failure_threshold=10, recovery_timeout=15.0, max_recovery_timeout=120.0,
+    classify_error=_classify_es_error
+)
+
+def retry_elasticsearch_operation(max_retries=5, initial_backoff=1, max_backoff=30, breaker=None):
     """
-    Decorator to retry Elasticsearch operations with exponential backoff
+    Decorator to retry Elasticsearch operations with jittered exponential backoff
     
     Args:
         max_retries: Maximum number of retry attempts
         initial_backoff: Initial backoff time in seconds
         max_backoff: Maximum backoff time in seconds
+        breaker: Optional circuit breaker (READ_BREAKER or WRITE_BREAKER); while it
+            is open the operation raises CircuitOpenError without being attempted
     """
     def decorator(func):
         def wrapper(*args, **kwargs):
@@ -24,21 +65,36 @@ def retry_elasticsearch_operation(max_retries=5, initial_backoff=1, max_backoff=
             
             while True:
                 try:
+                    if breaker is not None:
+                        return breaker.call(func, *args, **kwargs)
                     return func(*args, **kwargs)
                 except (ConnectionError, TransportError) as e:
                     retries += 1
                     if retries > max_retries:
                         logger.error(f"Maximum retries ({max_retries}) reached. Operation failed: {str(e)}")
                         raise
+                    # Once the circuit leaves the closed state, stop retrying into the outage
+                    if breaker is not None and breaker.state != CircuitBreaker.CLOSED:
+                        raise
+                    # Inside a request, never sleep past its deadline
+                    deadline = current_deadline()
+                    if deadline is not None and deadline.remaining() <= backoff:
+                        raise DeadlineExceeded(f"No time left to retry Elasticsearch operation: {str(e)}") from e
                     
+                    # Jitter keeps threads and workers that failed together from retrying together
+                    delay = backoff / 2 + random.uniform(0, backoff / 2)
                     logger.warning(f"Elasticsearch operation failed (attempt {retries}/{max_retries}), "
-                                   f"retrying in {backoff} seconds. Error: {str(e)}")
-                    time.sleep(backoff)
+                                   f"retrying in {delay:.2f} seconds. Error: {str(e)}")
+                    time.sleep(delay)
                     # Exponential backoff with cap
                     backoff = min(backoff * 2, max_backoff)
         return wrapper
     return decorator
 
+def breaker_stats() -> Dict[str, Any]:
+    """Get the state and counters of the shared Elasticsearch circuit breakers"""
+    return {"read": READ_BREAKER.stats(), "write": WRITE_BREAKER.stats()}
+
 class ElasticsearchManager:
     @retry_elasticsearch_operation()
     def create_index_with_mapping(self, index_name: str, mapping: dict):
@@ -50,40 +106,95 @@ class ElasticsearchManager:
             logger.info(f"Created Elasticsearch index '{index_name}' with custom mapping")
 
     @retry_elasticsearch_operation()
+    def seed_documents(self, index_name: str, documents: list) -> bool:
+        """
+        Idempotently seed an index with a fixed set of documents
+        
+        Documents are stored under content-derived IDs, so re-seeding never creates
+        copies. A marker in SEED_VERSIONS_INDEX records the fingerprint and the IDs
+        of the last seeded data; nothing is written while the fingerprint matches.
+        When the data changed, only documents of the previous seed that are no
+        longer part of it are removed: the index may also hold documents that were
+        not seeded, and copies left by unkeyed seeding are removed by
+        scripts/dedupe_seed_data.py.
+        
+        Args:
+            index_name: Index to seed
+            documents: Documents to store
+            
+        Returns:
+            True if the index was written, False if it was already up to date or
+            some documents could not be written
+        """
+        version = fingerprint(documents)
+        try:
+            marker = self.es_client.get(index=SEED_VERSIONS_INDEX, id=index_name)["_source"]
+        except NotFoundError:
+            marker = None
+        if marker and marker.get("version") == version:
+            logger.info(f"Seed data for '{index_name}' is up to date (version {version[:12]})")
+            return False
+        
+        ids = []
+        bulk_data = []
+        for document in documents:
+            doc_id = fingerprint(document)
+            ids.append(doc_id)
+            bulk_data.append({"index": {"_index": index_name, "_id": doc_id}})
+            bulk_data.append(document)
+        # Documents of the previous seed version that the new one no longer contains
+        current = set(ids)
+        for doc_id in (marker or {}).get("ids", []):
+            if doc_id not in current:
+                bulk_data.append({"delete": {"_index": index_name, "_id": doc_id}})
+        if bulk_data:
+            response = self.es_client.bulk(body=bulk_data, refresh=True)
+            if response.get("errors"):
+                failed = [item for item in response.get("items", []) if next(iter(item.values())).get("error")]
+                # Without a marker the next start seeds this version again
+                logger.error(f"Seeding '{index_name}' failed for {len(failed)} documents; seed marker not updated")
+                return False
+        self.es_client.index(
+            index=SEED_VERSIONS_INDEX,
+            id=index_name,
+            body={
+                "version": version,
+                "documents": len(documents),
+                "ids": ids,
+                "seeded_at": datetime.now().isoformat()
+            }
+        )
+        logger.info(f"Seeded {len(documents)} documents into Elasticsearch index '{index_name}' (version {version[:12]})")
+        return True
+
     def bulk_insert_generic_bills(self, bills: list, index_name: str = "generic_bills"):
         """
-        Bulk insert generic bill data into Elasticsearch
+        Seed generic bill data into Elasticsearch (no-op if unchanged)
         """
         if not bills:
             return
-        bulk_data = []
-        for bill in bills:
-            action = {"index": {"_index": index_name}}
-            bulk_data.append(action)
-            bulk_data.append(bill)
-        self.es_client.bulk(body=bulk_data, refresh=True)
-        logger.info(f"Inserted {len(bills)} generic bills into Elasticsearch index '{index_name}'")
+        self.seed_documents(index_name, bills)
 
-    @retry_elasticsearch_operation()
     def bulk_insert_user_credit_cards(self, cards: list, index_name: str = "user_credit_cards"):
         """
-        Bulk insert user-specific credit card data into Elasticsearch
+        Seed user-specific credit card data into Elasticsearch (no-op if unchanged)
         """
         if not cards:
             return
-        bulk_data = []
-        for card in cards:
-            action = {"index": {"_index": index_name}}
-            bulk_data.append(action)
-            bulk_data.append(card)
-        self.es_client.bulk(body=bulk_data, refresh=True)
-        logger.info(f"Inserted {len(cards)} user credit cards into Elasticsearch index '{index_name}'")
+        self.seed_documents(index_name, cards)
     """Manages training data in Elasticsearch for global and user-specific examples"""
     
     def __init__(self, es_host="localhost", es_port=9200, 
                  global_index="global_intent_training", 
                  user_index_prefix="user_intent_training",
-                 es_auth=None):
+                 es_auth=None,
+                 max_tracked_users=100000,
+                 prompt_cache_size=1000,
+                 user_storage_mode="per_user",
+                 shared_user_index=None,
+                 user_aliases=False,
+                 version_index="prompt_versions",
+                 version_check_interval=5.0):
         """
         Initialize Elasticsearch connection
         
@@ -93,22 +204,70 @@ class ElasticsearchManager:
             global_index: Index for global training data
             user_index_prefix: Prefix for user-specific indices
             es_auth: Optional dict with auth parameters (http_auth, api_key, etc.)
+            max_tracked_users: Maximum number of per-user prompt versions kept in memory
+            prompt_cache_size: Maximum number of generated system prompts kept in memory
+            user_storage_mode: 'per_user' for one index per user, or 'shared' for a
+                single index routed by user_id
+            shared_user_index: Index holding all user examples in shared mode
+                (defaults to the user index prefix)
+            user_aliases: In shared mode, also create a filtered alias named like the
+                per-user index for every user written to
+            version_index: Index holding the shared prompt version counters
+            version_check_interval: Seconds a prompt version read from Elasticsearch
+                is trusted before it is read again
         """
         # Handle connection params
         if es_auth:
-            self.es_client = Elasticsearch([es_auth])
+            self._connection_params = es_auth
         else:
-            self.es_client = Elasticsearch([{'host': es_host, 'port': es_port, 'scheme': 'http'}])
+            self._connection_params = {'host': es_host, 'port': es_port, 'scheme': 'http'}
+        self.es_client = Elasticsearch([self._connection_params])
             
         self.global_index = global_index
         self.user_index_prefix = user_index_prefix
+        if user_storage_mode not in USER_STORAGE_MODES:
+            raise ValueError(f"Unknown user storage mode '{user_storage_mode}'")
+        self.user_storage_mode = user_storage_mode
+        self.shared_user_index = shared_user_index or user_index_prefix
+        self.user_aliases = user_aliases and self.shared_mode
+        self._aliased_users = LRUCache(maxsize=max_tracked_users)
+        
+        # Prompt versions are counters stored in Elasticsearch, so a change saved by
+        # any worker reaches the caches of every worker within version_check_interval
+        self.version_index = version_index
+        self.version_check_interval = version_check_interval
+        # Version document id -> (version, monotonic time it was read)
+        self._shared_versions = LRUCache(maxsize=max_tracked_users + 1)
+        self._prompt_cache = LRUCache(maxsize=prompt_cache_size)
         
         # Test the connection with retry
         self._test_connection()
         
         # Create global index if it doesn't exist
         self._create_index_if_not_exists(self.global_index)
+        if self.shared_mode:
+            # Created once here so writes never check for user indices
+            self._create_index_if_not_exists(self.shared_user_index)
+        
+    def reconnect(self) -> None:
+        """
+        Replace the client with a new one using the same connection parameters
         
+        Called in forked worker processes, which must not share the parent's
+        connection pool. Sockets inherited from the parent are left to it.
+        """
+        self.es_client = Elasticsearch([self._connection_params])
+        logger.info("Recreated Elasticsearch client")
+    
+    def create_async_client(self):
+        """
+        Create an AsyncElasticsearch client with the same connection parameters
+        
+        Must be called from within the event loop that will use it; needs aiohttp.
+        """
+        from elasticsearch import AsyncElasticsearch
+        return AsyncElasticsearch([self._connection_params])
+    
     @retry_elasticsearch_operation(max_retries=10, initial_backoff=2, max_backoff=60)
     def _test_connection(self):
         """Test Elasticsearch connection with retries"""
@@ -127,9 +286,125 @@ class ElasticsearchManager:
         Returns:
             Index name for the user
         """
+        if self.shared_mode:
+            return self.shared_user_index
         return f"{self.user_index_prefix}_{user_id}"
     
-    @retry_elasticsearch_operation()
+    @property
+    def shared_mode(self) -> bool:
+        """Whether all user examples live in one index routed by user_id"""
+        return self.user_storage_mode == "shared"
+    
+    def _user_routing(self, user_id: str) -> Optional[str]:
+        """Routing value for a user's examples (None in per-user mode)"""
+        return user_id if self.shared_mode else None
+    
+    def _user_filters(self, user_id: str) -> List[Dict[str, Any]]:
+        """Query clauses restricting a search to one user's examples"""
+        return [{"term": {"user_id": user_id}}] if self.shared_mode else []
+    
+    def ensure_user_alias(self, user_id: str) -> None:
+        """
+        Create the filtered alias for a user in shared mode (no-op otherwise)
+        
+        The alias carries the per-user index name, so tools that read
+        '<prefix>_<user_id>' keep working after migration.
+        
+        Args:
+            user_id: Unique user identifier
+        """
+        if not self.user_aliases or user_id in self._aliased_users:
+            return
+        alias = f"{self.user_index_prefix}_{user_id}"
+        try:
+            self.es_client.indices.put_alias(
+                index=self.shared_user_index,
+                name=alias,
+                body={"filter": {"term": {"user_id": user_id}}, "routing": user_id}
+            )
+            self._aliased_users.set(user_id, True)
+        except Exception as e:
+            logger.warning(f"Failed to create alias '{alias}': {str(e)}")
+    
+    @staticmethod
+    def _version_id(user_id: Optional[str]) -> str:
+        """Id of the version document for global examples or one user's examples"""
+        return f"user:{user_id}" if user_id else "global"
+    
+    def get_prompt_version(self, user_id: Optional[str] = None) -> str:
+        """
+        Get the version of the training data a prompt would be built from
+        
+        Versions are read from Elasticsearch at most once per
+        version_check_interval; the global and user versions are read with a
+        single mget. If the read fails, the last known versions are used.
+        
+        Args:
+            user_id: Optional user identifier for personalized prompts
+            
+        Returns:
+            Version string that changes whenever relevant examples are saved
+        """
+        doc_ids = [self._version_id(None)] + ([self._version_id(user_id)] if user_id else [])
+        now = time.monotonic()
+        versions, stale = {}, []
+        for doc_id in doc_ids:
+            entry = self._shared_versions.get(doc_id)
+            if entry is not None:
+                versions[doc_id] = entry[0]
+            if entry is None or now - entry[1] >= self.version_check_interval:
+                stale.append(doc_id)
+        
+        if stale:
+            try:
+                fresh = self._read_versions(stale)
+            except (ApiError, ConnectionError, TransportError, CircuitOpenError, DeadlineExceeded) as e:
+                logger.warning(f"Using last known prompt versions: {str(e)}")
+                # Not retried before the next interval, so an outage adds no latency per request
+                fresh = {doc_id: versions.get(doc_id, 0) for doc_id in stale}
+            for doc_id, version in fresh.items():
+                versions[doc_id] = version
+                self._shared_versions.set(doc_id, (version, now))
+        
+        return ".".join(str(versions[doc_id]) for doc_id in doc_ids)
+    
+    def _read_versions(self, doc_ids: List[str]) -> Dict[str, int]:
+        """Read version counters (0 for ones never bumped) in one round trip"""
+        response = READ_BREAKER.call(bounded(self.es_client).mget, index=self.version_index, ids=doc_ids)
+        return {
+            doc["_id"]: doc["_source"].get("version", 0) if doc.get("found") else 0
+            for doc in response["docs"]
+        }
+    
+    def bump_prompt_version(self, user_id: Optional[str] = None) -> None:
+        """
+        Mark global or user-specific training data as changed
+        
+        Never raises: the data is already saved, so a failed bump is logged and
+        only delays when cached prompts built from older data are replaced.
+        
+        Args:
+            user_id: User whose examples changed, or None for global examples
+        """
+        doc_id = self._version_id(user_id)
+        try:
+            response = self.es_client.update(
+                index=self.version_index,
+                id=doc_id,
+                script={"source": "ctx._source.version += 1", "lang": "painless"},
+                upsert={"version": 1},
+                retry_on_conflict=5,
+                source=True
+            )
+            version = response["get"]["_source"]["version"]
+        except Exception as e:
+            logger.error(f"Failed to bump prompt version '{doc_id}': {str(e)}")
+            return
+        # This worker sees its own change immediately
+        self._shared_versions.set(doc_id, (version, time.monotonic()))
+    
+    # Runs inside save_example's breaker call, so it only gets the short write retry policy
+    @retry_elasticsearch_operation(max_retries=2, initial_backoff=0.5, max_backoff=4)
     def _create_index_if_not_exists(self, index_name: str):
         """
         Create an index if it doesn't exist
@@ -141,6 +416,7 @@ class ElasticsearchManager:
             mapping = {
                 "mappings": {
                     "properties": {
+                        "user_id": {"type": "keyword"},
                         "query": {"type": "text"},
                         "intent": {"type": "keyword"},
                         "confidence": {"type": "float"},
@@ -152,17 +428,19 @@ class ElasticsearchManager:
                     }
                 }
             }
+            if self.shared_mode and index_name == self.shared_user_index:
+                # Every user document must carry its routing so a user's examples share a shard
+                mapping["mappings"]["_routing"] = {"required": True}
             self.es_client.indices.create(index=index_name, body=mapping)
             logger.info(f"Created Elasticsearch index '{index_name}'")
     
-    @retry_elasticsearch_operation()
-    def save_example(self, query: str, classification: Dict[str, Any], 
-                    user_id: Optional[str] = None, 
-                    user_feedback: Optional[bool] = None,
-                    is_global: bool = False,
-                    data_quality: int = 5):
+    def prepare_example(self, query: str, classification: Dict[str, Any],
+                        user_id: Optional[str] = None,
+                        user_feedback: Optional[bool] = None,
+                        is_global: bool = False,
+                        data_quality: int = 5) -> Tuple[str, Dict[str, Any], Optional[str]]:
         """
-        Save a classification example to Elasticsearch
+        Build a training example document and pick the index and routing it belongs to
         
         Args:
             query: User query text
@@ -171,6 +449,9 @@ class ElasticsearchManager:
             user_feedback: Optional boolean indicating user feedback
             is_global: Whether this example should be stored as global
             data_quality: Quality score for this training example (1-10)
+            
+        Returns:
+            Tuple of (index name, document, routing)
         """
         document = {
             "query": query,
@@ -184,20 +465,60 @@ class ElasticsearchManager:
         }
         
         # Determine which index to use
+        routing = None
         if is_global:
             index = self.global_index
         elif user_id:
             index = self._get_user_index(user_id)
-            # Create user-specific index if needed
-            self._create_index_if_not_exists(index)
+            routing = self._user_routing(user_id)
+            if self.shared_mode:
+                document["user_id"] = user_id
         else:
             # If neither global nor user-specific, use global as default
             index = self.global_index
         
-        self.es_client.index(index=index, body=document)
+        return index, document, routing
+    
+    @retry_elasticsearch_operation(max_retries=2, initial_backoff=0.5, max_backoff=4, breaker=WRITE_BREAKER)
+    def save_example(self, query: str, classification: Dict[str, Any], 
+                    user_id: Optional[str] = None, 
+                    user_feedback: Optional[bool] = None,
+                    is_global: bool = False,
+                    data_quality: int = 5,
+                    invalidate_cache: bool = True):
+        """
+        Save a classification example to Elasticsearch
+        
+        Args:
+            query: User query text
+            classification: Classification result
+            user_id: Optional user identifier
+            user_feedback: Optional boolean indicating user feedback
+            is_global: Whether this example should be stored as global
+            data_quality: Quality score for this training example (1-10)
+            invalidate_cache: Whether to bump the prompt version so cached prompts
+                and classifications built from older data are not served
+        """
+        index, document, routing = self.prepare_example(
+            query, classification,
+            user_id=user_id,
+            user_feedback=user_feedback,
+            is_global=is_global,
+            data_quality=data_quality
+        )
+        if routing:
+            self.ensure_user_alias(routing)
+        elif index != self.global_index:
+            # Create user-specific index if needed
+            self._create_index_if_not_exists(index)
+        
+        self.es_client.index(index=index, body=document, routing=routing)
         logger.debug(f"Saved training example to Elasticsearch index '{index}': {query}")
+        
+        if invalidate_cache:
+            self.bump_prompt_version(None if index == self.global_index else user_id)
     
-    @retry_elasticsearch_operation()
+    @retry_elasticsearch_operation(max_retries=1, initial_backoff=0.2, max_backoff=1, breaker=READ_BREAKER)
     def get_examples_by_intent(self, intent: str, user_id: Optional[str] = None,
                               max_global_examples: int = 3, 
                               max_user_examples: int = 2) -> List[Dict[str, Any]]:
@@ -243,6 +564,7 @@ class ElasticsearchManager:
         # Then get user-specific examples if a user_id was provided
         if user_id:
             user_index = self._get_user_index(user_id)
+            routing = self._user_routing(user_id)
             
             try:
                 # Only query if the user index exists
@@ -254,7 +576,7 @@ class ElasticsearchManager:
                             "bool": {
                                 "must": [
                                     {"term": {"intent": intent}}
-                                ]
+                                ] + self._user_filters(user_id)
                             }
                         }
                     }
@@ -263,7 +585,7 @@ class ElasticsearchManager:
                     feedback_query = {**user_query}
                     feedback_query["query"]["bool"]["must"].append({"term": {"user_feedback": True}})
                     
-                    feedback_result = self.es_client.search(index=user_index, body=feedback_query)
+                    feedback_result = self.es_client.search(index=user_index, body=feedback_query, routing=routing)
                     feedback_examples = [hit["_source"] for hit in feedback_result["hits"]["hits"]]
                     
                     # If we don't have enough examples with feedback, get regular examples
@@ -271,7 +593,8 @@ class ElasticsearchManager:
                         remaining = max_user_examples - len(feedback_examples)
                         regular_result = self.es_client.search(
                             index=user_index, 
-                            body={**user_query, "size": remaining}
+                            body={**user_query, "size": remaining},
+                            routing=routing
                         )
                         regular_examples = [hit["_source"] for hit in regular_result["hits"]["hits"]]
                         results.extend(feedback_examples + regular_examples)
@@ -282,6 +605,81 @@ class ElasticsearchManager:
         
         return results
     
+    @retry_elasticsearch_operation(max_retries=1, initial_backoff=0.2, max_backoff=1, breaker=READ_BREAKER)
+    def get_examples_for_intents(self, intents: List[str], user_id: Optional[str] = None,
+                                 max_global_examples: int = 3,
+                                 max_user_examples: int = 2) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get examples for several intents in a single _msearch round trip
+        
+        Global examples are ordered by data quality then recency; user examples put
+        positive feedback first, then the most recent ones.
+        
+        Args:
+            intents: Intent types to fetch examples for
+            user_id: Optional user identifier
+            max_global_examples: Maximum number of global examples per intent
+            max_user_examples: Maximum number of user-specific examples per intent
+            
+        Returns:
+            Dict mapping each intent to its global examples followed by user examples
+        """
+        searches = []
+        slots = []
+        for intent in intents:
+            if max_global_examples > 0:
+                searches.append({"index": self.global_index})
+                searches.append({
+                    "size": max_global_examples,
+                    "sort": [
+                        {"data_quality": {"order": "desc"}},
+                        {"timestamp": {"order": "desc"}}
+                    ],
+                    "query": {
+                        "bool": {
+                            "filter": [
+                                {"term": {"intent": intent}},
+                                {"term": {"is_global": True}}
+                            ]
+                        }
+                    }
+                })
+                slots.append(intent)
+            if user_id and max_user_examples > 0:
+                # ignore_unavailable replaces the indices.exists check for new users
+                header = {"index": self._get_user_index(user_id), "ignore_unavailable": True}
+                if self.shared_mode:
+                    header["routing"] = self._user_routing(user_id)
+                searches.append(header)
+                searches.append({
+                    "size": max_user_examples,
+                    "sort": [
+                        {"user_feedback": {"order": "desc", "missing": "_last"}},
+                        {"timestamp": {"order": "desc"}}
+                    ],
+                    "query": {
+                        "bool": {
+                            "filter": [
+                                {"term": {"intent": intent}}
+                            ] + self._user_filters(user_id)
+                        }
+                    }
+                })
+                slots.append(intent)
+        
+        results = {intent: [] for intent in intents}
+        if not searches:
+            return results
+        
+        response = bounded(self.es_client).msearch(body=searches)
+        for intent, item in zip(slots, response["responses"]):
+            if "error" in item:
+                logger.error(f"Failed to retrieve examples for intent '{intent}': {item['error']}")
+                continue
+            results[intent].extend(hit["_source"] for hit in item["hits"]["hits"])
+        
+        return results
+    
     @retry_elasticsearch_operation()
     def bulk_insert_global_examples(self, examples: List[Dict[str, Any]]) -> None:
         """
@@ -326,12 +724,12 @@ class ElasticsearchManager:
         if bulk_data:
             self.es_client.bulk(body=bulk_data, refresh=True)
             logger.info(f"Inserted {len(examples)} global examples into Elasticsearch")
+            self.bump_prompt_version()
     
-    @retry_elasticsearch_operation()
     def generate_system_prompt(self, user_id: Optional[str] = None,
                               max_examples_per_intent: int = 5) -> str:
         """
-        Generate a system prompt using training examples from Elasticsearch
+        Get the system prompt for a user, rebuilding it only when training data changed
         
         Args:
             user_id: Optional user identifier for personalized prompt
@@ -339,22 +737,15 @@ class ElasticsearchManager:
             
         Returns:
             System prompt string
+            
+        Raises:
+            CircuitOpenError: If Elasticsearch reads are failing fast and the prompt is not cached
         """
-        # Base system prompt
-        system_prompt = """
-        You are an intent classification system for a financial assistant.
-        
-        Classify user queries into these intents:
-        - PAY_TO_PERSON: For person-to-person payments
-        - PAY_BILL: For bill payments (electricity, water, etc.)
-        - OTHER: For any other queries
-        
-        Examples:
-        """
-        
-        # Add examples for each intent type
-        intents = ["PAY_TO_PERSON", "PAY_BILL", "CHECK_REWARDS", "TRANSACTION_HISTORY", "OTHER"]
-        example_count = 1
+        # Read the version before building so a concurrent save is never masked
+        cache_key = (user_id, max_examples_per_intent, self.get_prompt_version(user_id))
+        system_prompt = self._prompt_cache.get(cache_key)
+        if system_prompt is not None:
+            return system_prompt
         
         # Calculate examples distribution - more for user if user_id provided
         if user_id:
@@ -366,31 +757,108 @@ class ElasticsearchManager:
             max_global = max_examples_per_intent
             max_user = 0
         
-        for intent in intents:
-            # Get examples for this intent from Elasticsearch
-            examples = self.get_examples_by_intent(
-                intent, 
+        try:
+            examples_by_intent = self.get_examples_for_intents(
+                PROMPT_INTENTS,
                 user_id=user_id,
                 max_global_examples=max_global,
                 max_user_examples=max_user
             )
+        except CircuitOpenError:
+            # Callers keep their current model rather than one built without examples
+            raise
+        except Exception as e:
+            # A request out of time falls back to the global model rather than an example-less prompt
+            check_deadline("system prompt generation")
+            # Serve a prompt without examples, but do not cache it
+            logger.error(f"Failed to retrieve examples for system prompt: {str(e)}")
+            return self._build_system_prompt({})
+        
+        system_prompt = self._build_system_prompt(examples_by_intent)
+        self._prompt_cache.set(cache_key, system_prompt)
+        return system_prompt
+    
+    def get_prompt_examples(self, user_id: Optional[str] = None,
+                            max_global_examples: int = 20,
+                            max_user_examples: int = 0) -> List[Dict[str, Any]]:
+        """
+        Get the training examples prompts pick their few-shot examples from
+        
+        Cached like system prompts, so examples are only read again after
+        training data changed.
+        
+        Args:
+            user_id: Optional user identifier for user-specific examples
+            max_global_examples: Maximum global examples per intent
+            max_user_examples: Maximum user-specific examples per intent
             
-            # Add examples to prompt
-            for example in examples:
-                query = example.get("query", "")
-                
-                # Reconstruct classification object
-                classification = {
-                    "intent": example.get("intent", "OTHER"),
-                    "confidence": example.get("confidence", 1.0),
-                    "extracted_data": example.get("extracted_data", {})
-                }
-                
-                system_prompt += f"""
-                {example_count}. Query: "{query}"
-                   Classification: {json.dumps(classification, indent=2)}
-                """
-                example_count += 1
+        Returns:
+            Examples of every intent, global ones before user ones within an intent
+            
+        Raises:
+            CircuitOpenError: If Elasticsearch reads are failing fast and the examples are not cached
+        """
+        cache_key = ("examples", user_id, max_global_examples, max_user_examples, self.get_prompt_version(user_id))
+        examples = self._prompt_cache.get(cache_key)
+        if examples is not None:
+            return examples
+        
+        try:
+            examples_by_intent = self.get_examples_for_intents(
+                PROMPT_INTENTS,
+                user_id=user_id,
+                max_global_examples=max_global_examples,
+                max_user_examples=max_user_examples
+            )
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            check_deadline("prompt example retrieval")
+            # Not cached, so the examples are read again on the next build
+            logger.error(f"Failed to retrieve prompt examples: {str(e)}")
+            return []
+        
+        examples = [example for intent in PROMPT_INTENTS for example in examples_by_intent.get(intent, [])]
+        self._prompt_cache.set(cache_key, examples)
+        return examples
+    
+    def generate_instructions(self) -> str:
+        """Get the classification instructions of the system prompt, without examples"""
+        return self._build_system_prompt(None)
+    
+    def prompt_cache_stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters of the system prompt cache"""
+        return self._prompt_cache.stats()
+    
+    def _build_system_prompt(self, examples_by_intent: Optional[Dict[str, List[Dict[str, Any]]]]) -> str:
+        """
+        Render a system prompt from training examples
+        
+        Args:
+            examples_by_intent: Examples per intent, as returned by get_examples_for_intents,
+                or None for the instructions alone (examples are then chosen per query)
+            
+        Returns:
+            System prompt string
+        """
+        # Base system prompt
+        system_prompt = """
+        You are an intent classification system for a financial assistant.
+        
+        Classify user queries into these intents:
+        - PAY_TO_PERSON: For person-to-person payments
+        - PAY_BILL: For bill payments (electricity, water, etc.)
+        - OTHER: For any other queries
+        """
+        if examples_by_intent is not None:
+            system_prompt += """
+        Examples:
+        """
+        
+        # Add examples for each intent type, one compact line each
+        examples = [example for intent in PROMPT_INTENTS for example in (examples_by_intent or {}).get(intent, [])]
+        if examples:
+            system_prompt += render_examples(examples) + "\n"
         
         # Add extraction rules and output format
         system_prompt += """
@@ -0,0 +1,203 @@
+import json
+import logging
+import re
+from typing import Dict, Any, Optional, List, Tuple
+from app.services.biller_catalog import BillerCatalog, CREDIT_CARD_CATEGORY_ID, normalize_biller_name
+from app.services.classification_cache import ClassificationCache
+from app.services.contact_index import ContactStore
+from app.services.model_registry import ModelRegistry
+from app.services.rule_classifier import RuleBasedClassifier
+from app.utils.helpers import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Classification fallbacks and enrichment shared by the Flask route and the async pipeline
+
+USER_CREDIT_CARDS_INDEX = "user_credit_cards"
+
+def select_contact_candidates(contact_store: Optional[ContactStore], query: str,
+                              k: int = 20) -> Tuple[List[str], List[str]]:
+    """
+    Get a user's contact names and the few that resemble the query
+
+    Args:
+        contact_store: The user's contacts (None if unavailable)
+        query: User query text
+        k: Maximum number of candidate names
+
+    Returns:
+        Tuple of (all contact names, candidate names to send to Gemini)
+    """
+    if contact_store is None:
+        return [], []
+    contact_names = contact_store.names
+    # Only the contacts that resemble words of the query are sent to Gemini
+    candidate_names = contact_store.candidates(query, k=k)
+    logger.info(f"Sending {len(candidate_names)}/{len(contact_names)} contacts to Gemini")
+    # Serializing every contact name is only worth it when the estimate is logged
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"Contact prompt tokens: {estimate_tokens(json.dumps(contact_names))} -> "
+            f"{estimate_tokens(json.dumps(candidate_names))}"
+        )
+    return contact_names, candidate_names
+
+def build_ai_context(context: Optional[Dict[str, Any]], candidate_names: List[str]) -> Dict[str, Any]:
+    """Add the candidate contact names to the request context sent to Gemini"""
+    ai_context = context or {}
+    if candidate_names:
+        ai_context = dict(ai_context)  # copy
+        ai_context["contact_names"] = candidate_names
+    return ai_context
+
+def credit_card_query(user_id: str, biller_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build the search body for a user's credit cards
+
+    Args:
+        user_id: User identifier (the cards' customer_id)
+        biller_name: Optional biller name the card name must match
+
+    Returns:
+        Search body
+    """
+    must = [{"term": {"customer_id": user_id}}]
+    if biller_name:
+        # Remove common terms like 'bank' (case-insensitive, word boundary)
+        must.append({"match": {"biller_name": normalize_biller_name(biller_name)}})
+    return {"size": 100, "query": {"bool": {"must": must}}}
+
+def filter_cards_by_biller(cards: List[Dict[str, Any]], biller_name: str) -> List[Dict[str, Any]]:
+    """
+    Keep the cards whose name shares a word with the biller name
+
+    Mirrors the 'match' clause of credit_card_query for cards fetched before the
+    biller name was known.
+    """
+    words = set(re.findall(r"\w+", normalize_biller_name(biller_name)))
+    return [
+        card for card in cards
+        if words & set(re.findall(r"\w+", (card.get("biller_name") or "").lower()))
+    ]
+
+def dedupe_cards(cards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop repeated cards by unique_bill_id; cards without one are all kept"""
+    seen = set()
+    deduped_cards = []
+    for card in cards:
+        unique_id = None
+        # Try to get unique_bill_id from card['request'] if present
+        if isinstance(card.get("request"), dict):
+            unique_id = card["request"].get("unique_bill_id")
+        if unique_id:
+            if unique_id not in seen:
+                seen.add(unique_id)
+                deduped_cards.append(card)
+        else:
+            deduped_cards.append(card)
+    return deduped_cards
+
+def enrich_pay_bill(intent_data: Dict[str, Any], matched_cards: List[Dict[str, Any]],
+                    biller_catalog: BillerCatalog) -> None:
+    """
+    Add the user's matching cards, or matching generic billers, as additional_data
+
+    Args:
+        intent_data: PAY_BILL classification result (modified in place)
+        matched_cards: The user's cards matching the extracted biller
+        biller_catalog: Catalog used when no card matched
+    """
+    extracted_data = intent_data.setdefault("extracted_data", {})
+    if matched_cards:
+        extracted_data["additional_data"] = dedupe_cards(matched_cards)
+        return
+
+    biller_name = extracted_data.get("biller_name")
+    category_name = extracted_data.get("category_name")
+    # If no matched card, look the biller up in the preloaded catalog (ignoring 'bank')
+    biller_catalog.refresh_if_changed()
+    filtered_bills = biller_catalog.all()
+    if biller_name:
+        bill = biller_catalog.match(biller_name)
+        filtered_bills = [bill] if bill else []
+    # Optionally filter by category_name as well
+    if category_name and category_name.upper() == "CREDIT CARD":
+        filtered_bills = [
+            b for b in filtered_bills
+            if any(r.get("category_id") == CREDIT_CARD_CATEGORY_ID for r in b.get("request", []))
+        ]
+    extracted_data["additional_data"] = filtered_bills
+
+def enrich_pay_to_person(intent_data: Dict[str, Any], contact_store: ContactStore) -> None:
+    """
+    Replace the extracted payee name with the matching contacts
+
+    Args:
+        intent_data: PAY_TO_PERSON classification result (modified in place)
+        contact_store: The user's contacts
+    """
+    extracted_data = intent_data["extracted_data"]
+    payee_name = extracted_data["payee_name"]
+    # Only search if payee_name is one of the user's contacts
+    if isinstance(payee_name, str) and contact_store.lookup(payee_name):
+        # Handle multiple contacts with same or similar names
+        matches = contact_store.search(payee_name, limit=10)
+        if matches:
+            # Keep contacts list only within extracted_data
+            extracted_data["contacts"] = [contact_store.contact(position) for position, _ in matches]
+            del extracted_data["payee_name"]
+    else:
+        # If payee_name not in contact_names, show nothing
+        extracted_data.pop("payee_name", None)
+        extracted_data["contacts"] = []
+
+def wants_contacts(intent_data: Dict[str, Any]) -> bool:
+    """Whether a result names a payee to resolve against the user's contacts"""
+    return intent_data.get("intent") == "PAY_TO_PERSON" and "payee_name" in intent_data.get("extracted_data", {})
+
+def local_fallback(query: str, contact_names: List[str], ai_context: Dict[str, Any],
+                      model_registry: ModelRegistry, classification_cache: ClassificationCache,
+                      rule_classifier: Optional[RuleBasedClassifier], fallbacks: List[str]) -> Dict[str, Any]:
+    """
+    Answer a query without Gemini, e.g. when the deadline passed or the Gemini circuit is open
+
+    Tries a cached global-model result, then the only matching rule whatever its
+    confidence, then OTHER with zero confidence.
+
+    Args:
+        query: User query text
+        contact_names: The user's contact names
+        ai_context: Context the query was sent to Gemini with
+        model_registry: Registry holding the global model version
+        classification_cache: Cache of Gemini results
+        rule_classifier: Optional rule-based classifier
+        fallbacks: List the name of the fallback used is appended to
+
+    Returns:
+        Classification result
+    """
+    global_handle = model_registry.global_handle
+    if global_handle:
+        intent_data = classification_cache.get(
+            classification_cache.make_key(query, global_handle.version, ai_context)
+        )
+        if intent_data is not None:
+            intent_data["model_version"] = global_handle.version
+            fallbacks.append("cached_result")
+            return intent_data
+
+    if rule_classifier:
+        intent_data = rule_classifier.best_guess(query, contact_names)
+        if intent_data is not None:
+            intent_data["model_version"] = "rules"
+            fallbacks.append("rule_result")
+            return intent_data
+
+    fallbacks.append("default_result")
+    return {
+        "intent": "OTHER",
+        "confidence": 0.0,
+        "extracted_data": {},
+        "model_version": None,
+        "error": "Classifier unavailable"
+    }
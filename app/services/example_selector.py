@@ -0,0 +1,72 @@
+import logging
+from typing import Dict, Any, Optional, List
+from app.services.prompt_builder import render_examples
+from app.services.vector_store import VectorIndex
+from app.utils.helpers import normalize_query
+
+logger = logging.getLogger(__name__)
+
+_POOL = "pool"
+
+class ExampleSelector:
+    """
+    Picks the training examples most similar to a query from a fixed pool
+
+    Built once per model version; selecting is a vectorization and one matrix
+    product over the pool, so it adds no Elasticsearch round trip per request.
+    """
+
+    def __init__(self, examples: List[Dict[str, Any]], k: int = 6, min_similarity: float = 0.2):
+        """
+        Index the example pool
+
+        Args:
+            examples: Candidate examples; of examples with the same normalized query,
+                the first one is kept
+            k: Examples selected per query
+            min_similarity: Cosine similarity below which an example is not selected
+        """
+        self.k = k
+        self.min_similarity = min_similarity
+        self.examples: List[Dict[str, Any]] = []
+        seen = set()
+        for example in examples:
+            key = normalize_query(example.get("query", ""))
+            if key and key not in seen:
+                seen.add(key)
+                self.examples.append(example)
+        self._index = VectorIndex(dim=512)
+        self._index.add_many(_POOL, [
+            (str(position), example["query"], position) for position, example in enumerate(self.examples)
+        ])
+
+    def select(self, query: str, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get the examples most similar to a query
+
+        When nothing is similar enough, the first example of each intent is
+        returned instead so the model still sees every output shape.
+
+        Args:
+            query: User query text
+            k: Examples to select (defaults to the selector's k)
+
+        Returns:
+            Up to k examples, most similar first
+        """
+        k = self.k if k is None else k
+        if k <= 0 or not self.examples:
+            return []
+        hits = self._index.search(_POOL, query, k=k, min_score=self.min_similarity)
+        if hits:
+            return [self.examples[hit["payload"]] for hit in hits]
+        fallback, intents = [], set()
+        for example in self.examples:
+            if example.get("intent") not in intents:
+                intents.add(example.get("intent"))
+                fallback.append(example)
+        return fallback[:k]
+
+    def render(self, query: str, k: Optional[int] = None) -> str:
+        """Select the examples for a query and render them (see render_examples)"""
+        return render_examples(self.select(query, k))
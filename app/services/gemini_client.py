@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, Optional
+from google.api_core import exceptions as google_exceptions
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.deadline import DeadlineExceeded, current_deadline
+
+logger = logging.getLogger(__name__)
+
+class GeminiUnavailableError(Exception):
+    """Raised when a Gemini call is not made or not answered; callers use a local fallback"""
+
+class GeminiTimeoutError(GeminiUnavailableError):
+    """Raised when Gemini does not answer within the client's call timeout"""
+
+def _classify_gemini_error(e: BaseException) -> str:
+    """Decide whether an exception raised by a Gemini call counts against the circuit"""
+    # DeadlineExceeded is a TimeoutError, hence an OSError: it must be ruled out first
+    if isinstance(e, DeadlineExceeded):
+        return CircuitBreaker.IGNORE
+    if isinstance(e, GeminiTimeoutError):
+        return CircuitBreaker.FAILURE
+    if isinstance(e, (google_exceptions.TooManyRequests, google_exceptions.ServerError)):
+        return CircuitBreaker.FAILURE
+    if isinstance(e, google_exceptions.GoogleAPICallError):
+        # The API answered (e.g. an invalid request)
+        return CircuitBreaker.SUCCESS
+    if isinstance(e, (ConnectionError, OSError)):
+        return CircuitBreaker.FAILURE
+    return CircuitBreaker.IGNORE
+
+class GeminiClient:
+    """
+    Gate in front of every Gemini call in the process
+
+    Caps concurrent calls, bounds how many callers may wait for a slot and for
+    how long, times calls out, and opens a circuit after repeated errors or
+    timeouts so that callers switch to their local fallback at once.
+    """
+
+    def __init__(self, max_in_flight: int = 16, max_queue: int = 64, queue_timeout: float = 2.0,
+                 call_timeout: float = 15.0, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        """
+        Initialize the client
+
+        Args:
+            max_in_flight: Maximum concurrent Gemini calls
+            max_queue: Maximum callers waiting for a slot; further callers are rejected
+            queue_timeout: Seconds a caller waits for a slot before being rejected
+            call_timeout: Seconds after which a call counts as a timeout
+            failure_threshold: Consecutive errors or timeouts that open the circuit
+            recovery_timeout: Seconds the circuit stays open before a trial call
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self.breaker = CircuitBreaker(
+            "gemini", failure_threshold=failure_threshold, recovery_timeout=recovery_timeout,
+            max_recovery_timeout=max(recovery_timeout * 8, 300.0), classify_error=_classify_gemini_error
+        )
+        # Created on first use so they are never inherited across a fork
+        self._slots = None
+        self._async_slots = None
+        self._executor = None
+        self._init_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.rejected = 0
+        self.short_circuited = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def configure(self, max_in_flight: Optional[int] = None, max_queue: Optional[int] = None,
+                  queue_timeout: Optional[float] = None, call_timeout: Optional[float] = None,
+                  failure_threshold: Optional[int] = None, recovery_timeout: Optional[float] = None) -> None:
+        """Change the limits of the shared client before its first call (e.g. from app config)"""
+        if max_in_flight is not None:
+            self.max_in_flight = max_in_flight
+        if max_queue is not None:
+            self.max_queue = max_queue
+        if queue_timeout is not None:
+            self.queue_timeout = queue_timeout
+        if call_timeout is not None:
+            self.call_timeout = call_timeout
+        self.breaker.configure(failure_threshold=failure_threshold, recovery_timeout=recovery_timeout)
+
+    def generate(self, model, message: str):
+        """
+        Call model.generate_content through the limiter and the circuit breaker
+
+        Args:
+            model: Gemini model instance
+            message: Prompt text
+
+        Returns:
+            Gemini response
+
+        Raises:
+            GeminiUnavailableError: If the circuit is open, no slot freed up in time,
+                or the call timed out, was throttled or hit a server error
+            DeadlineExceeded: If the request's deadline passed first
+        """
+        budget, bounded_by_deadline = self._budget()
+        self._admit()
+        slots = self._get_slots()
+        if not self._wait_for_slot(lambda timeout: slots.acquire(timeout=timeout), budget):
+            self._reject("no free slot")
+        with self._stats_lock:
+            self.in_flight += 1
+            self.calls += 1
+
+        # The slot is held until the call really ends, even if the caller stops waiting
+        future = self._get_executor().submit(model.generate_content, message)
+        future.add_done_callback(lambda _: self._release(slots))
+        try:
+            response = future.result(timeout=self._remaining(budget))
+        except FutureTimeoutError:
+            future.cancel()
+            self._timed_out(bounded_by_deadline)
+        except BaseException as e:
+            self._failed(e)
+            raise
+        self.breaker.record_success()
+        return response
+
+    async def generate_async(self, model, message: str):
+        """
+        Await model.generate_content_async through the limiter and the circuit breaker
+
+        Raises:
+            GeminiUnavailableError: If the circuit is open, no slot freed up in time,
+                or the call timed out, was throttled or hit a server error
+            DeadlineExceeded: If the request's deadline passed first
+        """
+        budget, bounded_by_deadline = self._budget()
+        self._admit()
+        slots = self._get_async_slots()
+
+        async def acquire(timeout):
+            try:
+                await asyncio.wait_for(slots.acquire(), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+        with self._stats_lock:
+            self.waiting += 1
+        try:
+            acquired = await acquire(min(self.queue_timeout, self._remaining(budget)))
+        except BaseException as e:
+            # Cancelled while queued
+            self.breaker.record_error(e)
+            raise
+        finally:
+            with self._stats_lock:
+                self.waiting -= 1
+        if not acquired:
+            self._reject("no free slot")
+        with self._stats_lock:
+            self.in_flight += 1
+            self.calls += 1
+        try:
+            response = await asyncio.wait_for(
+                model.generate_content_async(message), self._remaining(budget)
+            )
+        except asyncio.TimeoutError:
+            self._timed_out(bounded_by_deadline)
+        except BaseException as e:
+            self._failed(e)
+            raise
+        finally:
+            self._release(slots)
+        self.breaker.record_success()
+        return response
+
+    def _budget(self):
+        """Get the absolute end of the call and whether the request deadline or call_timeout sets it"""
+        now = time.monotonic()
+        deadline = current_deadline()
+        if deadline is not None and deadline.check("Gemini call") < self.call_timeout:
+            return deadline.expires_at, True
+        return now + self.call_timeout, False
+
+    @staticmethod
+    def _remaining(budget: float) -> float:
+        # Never raises: once the breaker reserved a call, expiry must go through _timed_out
+        return max(budget - time.monotonic(), 0.0)
+
+    def _admit(self) -> None:
+        """Pass the circuit breaker and the queue bound, or raise"""
+        with self._stats_lock:
+            if self.waiting >= self.max_queue and self.in_flight >= self.max_in_flight:
+                self.rejected += 1
+                raise GeminiUnavailableError(f"Gemini queue full ({self.waiting} waiting)")
+        try:
+            self.breaker.allow()
+        except CircuitOpenError as e:
+            with self._stats_lock:
+                self.short_circuited += 1
+            raise GeminiUnavailableError(str(e)) from e
+
+    def _wait_for_slot(self, acquire, budget: float) -> bool:
+        with self._stats_lock:
+            self.waiting += 1
+        try:
+            return acquire(min(self.queue_timeout, self._remaining(budget)))
+        finally:
+            with self._stats_lock:
+                self.waiting -= 1
+
+    def _reject(self, reason: str) -> None:
+        # The breaker reserved a call that is not made
+        self.breaker.record_error(DeadlineExceeded(reason))
+        with self._stats_lock:
+            self.rejected += 1
+        raise GeminiUnavailableError(f"Gemini call rejected: {reason}")
+
+    def _timed_out(self, bounded_by_deadline: bool) -> None:
+        if bounded_by_deadline:
+            self.breaker.record_error(DeadlineExceeded("request deadline"))
+            raise DeadlineExceeded("Gemini call exceeded the request deadline")
+        with self._stats_lock:
+            self.timeouts += 1
+        self.breaker.record_failure()
+        raise GeminiTimeoutError(f"Gemini call exceeded {self.call_timeout}s")
+
+    def _failed(self, e: BaseException) -> None:
+        with self._stats_lock:
+            self.errors += 1
+        self.breaker.record_error(e)
+        # Throttling and outages get the local fallback right away, not only once the circuit opens
+        if _classify_gemini_error(e) == CircuitBreaker.FAILURE:
+            raise GeminiUnavailableError(f"Gemini call failed: {str(e)}") from e
+
+    def _release(self, slots) -> None:
+        with self._stats_lock:
+            self.in_flight -= 1
+        slots.release()
+
+    def _get_slots(self) -> threading.BoundedSemaphore:
+        with self._init_lock:
+            if self._slots is None:
+                self._slots = threading.BoundedSemaphore(self.max_in_flight)
+            return self._slots
+
+    def _get_async_slots(self) -> asyncio.Semaphore:
+        # One event loop per process (see app/asgi.py)
+        with self._init_lock:
+            if self._async_slots is None:
+                self._async_slots = asyncio.Semaphore(self.max_in_flight)
+            return self._async_slots
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._init_lock:
+            if self._executor is None:
+                # One thread per slot, so submitted calls never queue in the executor
+                self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="gemini")
+            return self._executor
+
+    def stats(self) -> Dict[str, Any]:
+        """Get concurrency, queue and rejection counters and the circuit state"""
+        with self._stats_lock:
+            stats = {
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queue_depth": self.waiting,
+                "max_queue": self.max_queue,
+                "calls": self.calls,
+                "rejected": self.rejected,
+                "short_circuited": self.short_circuited,
+                "timeouts": self.timeouts,
+                "errors": self.errors
+            }
+        stats["circuit"] = self.breaker.stats()
+        return stats
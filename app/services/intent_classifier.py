@@ -4,9 +4,17 @@ import re
 from typing import Dict, Any, Optional, List
 from google.generativeai import GenerativeModel
 from app.services.elasticsearch_manager import ElasticsearchManager
+from app.services.gemini_client import GeminiClient, GeminiUnavailableError
+from app.services.prompt_builder import PromptBudget, compact_text
+from app.utils.deadline import DeadlineExceeded
 
 logger = logging.getLogger(__name__)
 
+# Every Gemini call in the process goes through this client, so its limits are shared
+gemini_client = GeminiClient()
+# Every prompt is assembled within this budget, which also records prompt sizes
+prompt_budget = PromptBudget()
+
 def get_intent_classifier_model(system_prompt=None):
     """
     Create and return a Gemini model with the intent classification system prompt.
@@ -53,11 +61,66 @@ def get_intent_classifier_model(system_prompt=None):
     # Create model without system prompt
     model = GenerativeModel(model_name="gemini-2.0-flash")
     
-    # Store the system prompt in the model object for later use
-    model.system_prompt = system_prompt
+    # Store the system prompt in the model object for later use, without the template indentation
+    model.system_prompt = compact_text(system_prompt)
     
     return model
 
+def _build_message(model, query: str, context: Optional[Dict[str, Any]] = None) -> str:
+    """Build the message sent to Gemini, with the model's system prompt, examples and the context"""
+    # Models built for few-shot selection carry a pool; only examples similar to the query are sent
+    selector = getattr(model, 'example_selector', None)
+    examples = selector.select(query) if selector is not None else []
+    return prompt_budget.build(getattr(model, 'system_prompt', None), examples, query, context)
+
+def _parse_response(response) -> Dict[str, Any]:
+    """Parse a Gemini response into an intent dict, falling back to OTHER on invalid JSON"""
+    try:
+        response_text = response.text if hasattr(response, 'text') else response.parts[0].text
+        
+        # Log the raw response for debugging
+        logger.debug(f"Raw response from Gemini: {response_text}")
+        
+        # Check for and remove markdown code blocks
+        json_pattern = r"```(?:json)?\s*([\s\S]*?)\s*```"
+        markdown_match = re.search(json_pattern, response_text)
+        
+        if markdown_match:
+            # Extract JSON from markdown code block
+            clean_json = markdown_match.group(1).strip()
+            logger.debug(f"Extracted JSON from markdown: {clean_json}")
+            intent_data = json.loads(clean_json)
+        else:
+            # Try parsing the response directly as JSON
+            intent_data = json.loads(response_text.strip())
+            
+        # Validate response structure
+        if not all(k in intent_data for k in ["intent", "confidence", "extracted_data"]):
+            raise ValueError("Invalid response structure from Gemini API")
+            
+        return intent_data
+        
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse Gemini response as JSON: {str(e)}")
+        logger.error(f"Response text: {response_text}")
+        
+        # Fallback response
+        return {
+            "intent": "OTHER",
+            "confidence": 0.5,
+            "extracted_data": {},
+            "error": "Failed to parse response"
+        }
+
+def _error_result(e: Exception) -> Dict[str, Any]:
+    logger.error(f"Error in classify_intent: {str(e)}")
+    return {
+        "intent": "OTHER",
+        "confidence": 0.1,
+        "extracted_data": {},
+        "error": str(e)
+    }
+
 def classify_intent(model, query: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Classify user query intent using Gemini AI
@@ -69,71 +132,42 @@ def classify_intent(model, query: str, context: Optional[Dict[str, Any]] = None)
         
     Returns:
         Dict containing intent classification results
+        
+    Raises:
+        DeadlineExceeded: If the request's deadline passed before Gemini answered
+        GeminiUnavailableError: If Gemini is overloaded, failing or too slow
     """
     try:
-        # Prepare context information
-        user_message = query
-        if context:
-            context_str = json.dumps(context)
-            user_message = f"{query}\nContext information: {context_str}"
-
-        # Always include system prompt examples in every request
-        system_prompt = getattr(model, 'system_prompt', None)
-        if system_prompt:
-            full_message = f"""
-            System: {system_prompt}
+        response = gemini_client.generate(model, _build_message(model, query, context))
+        return _parse_response(response)
+    except (DeadlineExceeded, GeminiUnavailableError):
+        raise
+    except Exception as e:
+        return _error_result(e)
 
-            User: {user_message}
-            """
-            response = model.generate_content(full_message)
-        else:
-            response = model.generate_content(user_message)
+async def classify_intent_async(model, query: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Classify user query intent using the async Gemini client
+    
+    Args:
+        model: Gemini model instance
+        query: User query text
+        context: Optional context information
         
-        try:
-            response_text = response.text if hasattr(response, 'text') else response.parts[0].text
-            
-            # Log the raw response for debugging
-            logger.debug(f"Raw response from Gemini: {response_text}")
-            
-            # Check for and remove markdown code blocks
-            json_pattern = r"```(?:json)?\s*([\s\S]*?)\s*```"
-            markdown_match = re.search(json_pattern, response_text)
-            
-            if markdown_match:
-                # Extract JSON from markdown code block
-                clean_json = markdown_match.group(1).strip()
-                logger.debug(f"Extracted JSON from markdown: {clean_json}")
-                intent_data = json.loads(clean_json)
-            else:
-                # Try parsing the response directly as JSON
-                intent_data = json.loads(response_text.strip())
-                
-            # Validate response structure
-            if not all(k in intent_data for k in ["intent", "confidence", "extracted_data"]):
-                raise ValueError("Invalid response structure from Gemini API")
-                
-            return intent_data
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse Gemini response as JSON: {str(e)}")
-            logger.error(f"Response text: {response_text}")
-            
-            # Fallback response
-            return {
-                "intent": "OTHER",
-                "confidence": 0.5,
-                "extracted_data": {},
-                "error": "Failed to parse response"
-            }
-            
+    Returns:
+        Dict containing intent classification results
+        
+    Raises:
+        DeadlineExceeded: If the request's deadline passed before Gemini answered
+        GeminiUnavailableError: If Gemini is overloaded, failing or too slow
+    """
+    try:
+        response = await gemini_client.generate_async(model, _build_message(model, query, context))
+        return _parse_response(response)
+    except (DeadlineExceeded, GeminiUnavailableError):
+        raise
     except Exception as e:
-        logger.error(f"Error in classify_intent: {str(e)}")
-        return {
-            "intent": "OTHER",
-            "confidence": 0.1,
-            "extracted_data": {},
-            "error": str(e)
-        }
+        return _error_result(e)
 
 def classify_intent_direct(model, query: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
@@ -164,6 +198,9 @@ def classify_intent_with_feedback(model, es_manager, query: str,
         
     Returns:
         Dict containing intent classification results
+        
+    Raises:
+        GeminiUnavailableError: If Gemini is overloaded, failing or too slow
     """
     # First get standard classification
     result = classify_intent(model, query, context)
@@ -196,9 +233,9 @@ def classify_intent_with_feedback(model, es_manager, query: str,
                 
                 User: {enhanced_prompt}
                 """
-                enhanced_response = model.generate_content(full_enhanced_prompt)
+                enhanced_response = gemini_client.generate(model, full_enhanced_prompt)
             else:
-                enhanced_response = model.generate_content(enhanced_prompt)
+                enhanced_response = gemini_client.generate(model, enhanced_prompt)
             enhanced_text = enhanced_response.text if hasattr(enhanced_response, 'text') else enhanced_response.parts[0].text
             
             # Check for and remove markdown code blocks
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+class RefreshScheduler:
+    """Coalesces refresh requests so at most one rebuild runs and at most one is pending"""
+
+    def __init__(self, refresh_fn: Callable[[], None], debounce: float = 5.0):
+        """
+        Initialize the scheduler
+
+        Args:
+            refresh_fn: Function that rebuilds the model
+            debounce: Seconds to wait after the first request so a burst of
+                requests is served by a single rebuild
+        """
+        self.refresh_fn = refresh_fn
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._running = False
+        self._pending = False
+        self._pending_since: Optional[float] = None
+        self.requests = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.total_duration_ms = 0.0
+        self.last_duration_ms: Optional[float] = None
+        self.last_refresh_at: Optional[str] = None
+        self.last_lag_ms: Optional[float] = None
+
+    def request(self) -> bool:
+        """
+        Ask for a rebuild
+
+        Returns:
+            True if a new rebuild was scheduled, False if the request was
+            folded into one that is already pending
+        """
+        with self._lock:
+            self.requests += 1
+            if self._pending:
+                self.coalesced += 1
+                return False
+            self._pending = True
+            self._pending_since = time.monotonic()
+            # A running rebuild reschedules itself when it sees the pending flag
+            if not self._running:
+                self._schedule(self.debounce)
+            return True
+
+    def _schedule(self, delay: float) -> None:
+        self._timer = threading.Timer(delay, self._run)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _run(self) -> None:
+        with self._lock:
+            self._pending = False
+            self._running = True
+            requested_at = self._pending_since
+            self._pending_since = None
+
+        start = time.monotonic()
+        success = True
+        try:
+            self.refresh_fn()
+        except Exception as e:
+            success = False
+            logger.error(f"Error refreshing model: {str(e)}")
+        finished = time.monotonic()
+        duration_ms = (finished - start) * 1000
+
+        with self._lock:
+            self._running = False
+            if success:
+                self.refreshes += 1
+                self.total_duration_ms += duration_ms
+                self.last_duration_ms = round(duration_ms, 2)
+                self.last_refresh_at = datetime.now().isoformat()
+                if requested_at is not None:
+                    self.last_lag_ms = round((finished - requested_at) * 1000, 2)
+            else:
+                self.failures += 1
+            if self._pending:
+                self._schedule(self.debounce)
+
+        if success:
+            logger.info(f"Model refreshed with latest training data in {duration_ms:.0f} ms")
+
+    def cancel(self) -> None:
+        """Cancel a scheduled rebuild that has not started yet"""
+        with self._lock:
+            if self._timer and not self._running:
+                self._timer.cancel()
+                self._pending = False
+                self._pending_since = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Get request, coalescing and rebuild timing counters"""
+        with self._lock:
+            return {
+                "debounce_s": self.debounce,
+                "requests": self.requests,
+                "coalesced": self.coalesced,
+                "refreshes": self.refreshes,
+                "failures": self.failures,
+                "running": self._running,
+                "pending": self._pending,
+                "pending_for_ms": round((time.monotonic() - self._pending_since) * 1000, 2)
+                                  if self._pending_since is not None else None,
+                "last_refresh_at": self.last_refresh_at,
+                "last_duration_ms": self.last_duration_ms,
+                "avg_duration_ms": round(self.total_duration_ms / self.refreshes, 2) if self.refreshes else 0.0,
+                "last_lag_ms": self.last_lag_ms
+            }
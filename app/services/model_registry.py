@@ -0,0 +1,204 @@
+import logging
+import threading
+import time
+from typing import Dict, Any, Optional, Callable, List
+from app.services.elasticsearch_manager import ElasticsearchManager
+from app.services.example_selector import ExampleSelector
+from app.services.intent_classifier import get_intent_classifier_model
+from app.utils.cache import LRUCache
+from app.utils.circuit_breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+class ModelHandle:
+    """An immutable model together with the prompt version it was built from"""
+
+    __slots__ = ("model", "version", "user_id", "created_at")
+
+    def __init__(self, model, version: str, user_id: Optional[str] = None):
+        self.model = model
+        self.version = version
+        self.user_id = user_id
+        self.created_at = time.time()
+
+class ModelRegistry:
+    """Versioned global and per-user model handles that request handlers read on every call"""
+
+    def __init__(self, es_manager: Optional[ElasticsearchManager] = None,
+                 model_factory: Callable[[Optional[str]], Any] = get_intent_classifier_model,
+                 max_personal_models: int = 1000,
+                 min_personal_prompt_length: int = 1000,
+                 few_shot_examples: int = 6,
+                 example_pool_size: int = 20,
+                 on_global_stale: Optional[Callable[[], Any]] = None):
+        """
+        Initialize the registry (call refresh_global() to build the global model)
+
+        Args:
+            es_manager: Source of system prompts and prompt versions
+            model_factory: Function building a model from a system prompt
+            max_personal_models: Maximum number of personalized models kept in memory
+            min_personal_prompt_length: Shorter user prompts are served by the global model
+                (only when few_shot_examples is 0)
+            few_shot_examples: Examples sent with each query, chosen by similarity from the
+                model's example pool (0 puts a fixed set of examples in the system prompt)
+            example_pool_size: Examples per intent in a model's pool (global and user each)
+            on_global_stale: Called once per newer global prompt version seen by for_user,
+                e.g. to schedule refresh_global in a worker that did not save the change
+        """
+        self.es_manager = es_manager
+        self.model_factory = model_factory
+        self.min_personal_prompt_length = min_personal_prompt_length
+        self.few_shot_examples = few_shot_examples
+        self.example_pool_size = example_pool_size
+        self.on_global_stale = on_global_stale
+        self._global: Optional[ModelHandle] = None
+        self._stale_version: Optional[str] = None
+        self._global_lock = threading.Lock()
+        # user_id -> ModelHandle, or a handle without a model when the global one should be used
+        self._personal = LRUCache(maxsize=max_personal_models)
+        self._stats_lock = threading.Lock()
+        self.global_builds = 0
+        self.personal_builds = 0
+        self.personal_reuses = 0
+        self.stale_global_detected = 0
+
+    @property
+    def global_handle(self) -> Optional[ModelHandle]:
+        """The current global model handle (a single reference read)"""
+        return self._global
+
+    def refresh_global(self) -> ModelHandle:
+        """
+        Rebuild the global model from the latest training data and swap it in
+
+        Returns:
+            The new global handle
+
+        Raises:
+            CircuitOpenError: If Elasticsearch is failing fast; the current model stays active
+        """
+        with self._global_lock:
+            try:
+                if self.es_manager:
+                    version = self.es_manager.get_prompt_version()
+                    if self.few_shot_examples:
+                        model = self._few_shot_model(
+                            self.es_manager.get_prompt_examples(max_global_examples=self.example_pool_size)
+                        )
+                    else:
+                        model = self.model_factory(self.es_manager.generate_system_prompt())
+                else:
+                    # Default prompt without training data
+                    version = "default"
+                    model = self.model_factory(None)
+            except Exception:
+                # Report the newer version again, so a later request retries the rebuild
+                self._stale_version = None
+                raise
+            handle = ModelHandle(model, version)
+            # Handlers that already read the old handle finish with it
+            self._global = handle
+            with self._stats_lock:
+                self.global_builds += 1
+        logger.info(f"Global model version {version} is active")
+        return handle
+
+    def for_user(self, user_id: Optional[str]) -> Optional[ModelHandle]:
+        """
+        Get the model handle to use for a user
+
+        Personalized models are built once per user prompt version and reused
+        until that user's training data or the global model changes. Versions are shared by all
+        workers, so a change saved by another worker is picked up here as well,
+        including a newer global version (see on_global_stale).
+
+        Args:
+            user_id: Optional user identifier
+
+        Returns:
+            Personalized handle if the user has one, else the global handle
+        """
+        global_handle = self._global
+        if not self.es_manager:
+            return global_handle
+        self._check_global(global_handle)
+        if not user_id:
+            return global_handle
+
+        version = self.es_manager.get_prompt_version(user_id)
+        if self.few_shot_examples and global_handle is not None:
+            # The pool's global examples come from the active global model, which can lag the
+            # shared global version until it is rebuilt
+            version = f"{global_handle.version}.{version.rsplit('.', 1)[1]}"
+        cached = self._personal.get(user_id)
+        if cached is not None and cached.version == version:
+            with self._stats_lock:
+                self.personal_reuses += 1
+            return cached if cached.model is not None else global_handle
+
+        try:
+            model = self._personal_model(user_id, global_handle)
+        except CircuitOpenError as e:
+            # Not cached, so the personalized model is built once Elasticsearch recovers
+            logger.warning(f"Serving global model to user {user_id}: {str(e)}")
+            return global_handle
+        handle = ModelHandle(model, version, user_id)
+        if model is not None:
+            with self._stats_lock:
+                self.personal_builds += 1
+            logger.info(f"Built personalized model version {version} for user {user_id}")
+        self._personal.set(user_id, handle)
+        return handle if handle.model is not None else global_handle
+
+    def _check_global(self, global_handle: Optional[ModelHandle]) -> None:
+        """Report a global prompt version newer than the active global model, once per version"""
+        if global_handle is None or self.on_global_stale is None:
+            return
+        version = self.es_manager.get_prompt_version()
+        if version == global_handle.version or version == self._stale_version:
+            return
+        self._stale_version = version
+        with self._stats_lock:
+            self.stale_global_detected += 1
+        logger.info(f"Global prompt version {version} is newer than the active model {global_handle.version}")
+        self.on_global_stale()
+
+    def _personal_model(self, user_id: str, global_handle: Optional[ModelHandle]):
+        """Build a user's model, or return None when the global model serves them as well"""
+        if not self.few_shot_examples:
+            user_prompt = self.es_manager.generate_system_prompt(user_id=user_id)
+            if "Examples:" in user_prompt and len(user_prompt) > self.min_personal_prompt_length:
+                return self.model_factory(user_prompt)
+            return None
+
+        user_examples = self.es_manager.get_prompt_examples(
+            user_id, max_global_examples=0, max_user_examples=self.example_pool_size
+        )
+        if not user_examples:
+            return None
+        global_selector = getattr(global_handle.model, "example_selector", None) if global_handle else None
+        # User examples come first, so they win over global examples with the same query
+        return self._few_shot_model(user_examples + (global_selector.examples if global_selector else []))
+
+    def _few_shot_model(self, examples: List[Dict[str, Any]]):
+        """Build a model whose prompts carry the pool examples most similar to each query"""
+        model = self.model_factory(self.es_manager.generate_instructions())
+        model.example_selector = ExampleSelector(examples, k=self.few_shot_examples)
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the active global version and personalized model cache counters"""
+        global_handle = self._global
+        stats = {
+            "global_version": global_handle.version if global_handle else None,
+            "personal_models": self._personal.stats()
+        }
+        with self._stats_lock:
+            stats.update({
+                "global_builds": self.global_builds,
+                "personal_builds": self.personal_builds,
+                "personal_reuses": self.personal_reuses,
+                "stale_global_detected": self.stale_global_detected
+            })
+        return stats
@@ -0,0 +1,183 @@
+import json
+import logging
+import re
+import threading
+from typing import Dict, Any, Optional, List
+from app.utils.helpers import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in estimated tokens) of the prompt size histogram
+SIZE_BUCKETS = (500, 1000, 2000, 4000)
+
+def minify_json(data: Any) -> str:
+    """Serialize data as JSON without insignificant whitespace"""
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str)
+
+def compact_text(text: str) -> str:
+    """
+    Remove indentation and blank-line runs from a prompt template
+
+    Args:
+        text: Prompt text, typically an indented triple-quoted string
+
+    Returns:
+        Text with every line stripped and at most one blank line in a row
+    """
+    text = "\n".join(line.strip() for line in text.splitlines())
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+def render_examples(examples: List[Dict[str, Any]]) -> str:
+    """
+    Render few-shot examples one per line with minified classifications
+
+    Args:
+        examples: Training examples with query, intent, confidence and extracted_data
+
+    Returns:
+        Numbered example lines
+    """
+    return "\n".join(_render_example(number, example) for number, example in enumerate(examples, 1))
+
+def _render_example(number: int, example: Dict[str, Any]) -> str:
+    classification = {
+        "intent": example.get("intent", "OTHER"),
+        "confidence": example.get("confidence", 1.0),
+        "extracted_data": example.get("extracted_data", {})
+    }
+    return f"{number}. {minify_json(example.get('query', ''))} -> {minify_json(classification)}"
+
+class PromptBudget:
+    """
+    Assembles Gemini prompts within a token budget and records their sizes
+
+    Instructions and the query are always sent. When the estimate exceeds the
+    budget, sections are trimmed in priority order: examples beyond
+    min_examples (least similar first), then contact names (least relevant
+    first), then the remaining examples.
+    """
+
+    def __init__(self, max_tokens: int = 1500, min_examples: int = 2):
+        """
+        Initialize the budget
+
+        Args:
+            max_tokens: Estimated tokens a prompt may take (0 for no limit)
+            min_examples: Examples kept until every contact name has been trimmed
+        """
+        self.max_tokens = max_tokens
+        self.min_examples = min_examples
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.total_tokens = 0
+        self.largest = 0
+        self.last_tokens = 0
+        self.trimmed = 0
+        self.over_budget = 0
+        self.examples_dropped = 0
+        self.contacts_dropped = 0
+        self.histogram = {bound: 0 for bound in SIZE_BUCKETS}
+        self.histogram_overflow = 0
+
+    def configure(self, max_tokens: Optional[int] = None, min_examples: Optional[int] = None) -> None:
+        """Change the limits of the shared budget (e.g. from app config)"""
+        if max_tokens is not None:
+            self.max_tokens = max_tokens
+        if min_examples is not None:
+            self.min_examples = min_examples
+
+    def build(self, system_prompt: Optional[str], examples: List[Dict[str, Any]], query: str,
+              context: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Assemble the message sent to Gemini
+
+        Args:
+            system_prompt: Classification instructions (already compacted)
+            examples: Few-shot examples, most similar first
+            query: User query text
+            context: Request context; its contact_names are assumed most relevant first
+
+        Returns:
+            Prompt text
+        """
+        context = dict(context or {})
+        contacts = list(context.pop("contact_names", None) or [])
+        example_lines = [_render_example(number, example) for number, example in enumerate(examples, 1)]
+
+        # Sections that are never trimmed, plus the fixed parts of the optional ones
+        fixed = estimate_tokens(system_prompt or "") + estimate_tokens(query) + estimate_tokens(minify_json(context))
+        example_costs = [estimate_tokens(line) + 1 for line in example_lines]
+        contact_costs = [estimate_tokens(minify_json(name)) + 1 for name in contacts]
+        total = fixed + sum(example_costs) + sum(contact_costs)
+
+        kept_examples, kept_contacts = len(example_lines), len(contacts)
+        if self.max_tokens and total > self.max_tokens:
+            while total > self.max_tokens and kept_examples > min(self.min_examples, len(example_lines)):
+                kept_examples -= 1
+                total -= example_costs[kept_examples]
+            while total > self.max_tokens and kept_contacts > 0:
+                kept_contacts -= 1
+                total -= contact_costs[kept_contacts]
+            while total > self.max_tokens and kept_examples > 0:
+                kept_examples -= 1
+                total -= example_costs[kept_examples]
+
+        if kept_contacts:
+            context["contact_names"] = contacts[:kept_contacts]
+        user_message = query
+        if context:
+            user_message = f"{query}\nContext information: {minify_json(context)}"
+
+        sections = []
+        if system_prompt:
+            sections.append(f"System: {system_prompt}")
+        if kept_examples:
+            sections.append("Examples:\n" + "\n".join(example_lines[:kept_examples]))
+        prompt = "\n\n".join(sections + [f"User: {user_message}"]) if sections else user_message
+
+        self._record(
+            estimate_tokens(prompt),
+            len(example_lines) - kept_examples,
+            len(contacts) - kept_contacts
+        )
+        return prompt
+
+    def _record(self, tokens: int, examples_dropped: int, contacts_dropped: int) -> None:
+        with self._lock:
+            self.prompts += 1
+            self.total_tokens += tokens
+            self.largest = max(self.largest, tokens)
+            self.last_tokens = tokens
+            if examples_dropped or contacts_dropped:
+                self.trimmed += 1
+                self.examples_dropped += examples_dropped
+                self.contacts_dropped += contacts_dropped
+            if self.max_tokens and tokens > self.max_tokens:
+                self.over_budget += 1
+            for bound in SIZE_BUCKETS:
+                if tokens <= bound:
+                    self.histogram[bound] += 1
+                    break
+            else:
+                self.histogram_overflow += 1
+        logger.debug(
+            f"Prompt tokens: {tokens} (dropped {examples_dropped} examples, {contacts_dropped} contacts)"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Get prompt size statistics and trimming counters"""
+        with self._lock:
+            histogram = {f"<={bound}": count for bound, count in self.histogram.items()}
+            histogram[f">{SIZE_BUCKETS[-1]}"] = self.histogram_overflow
+            return {
+                "max_tokens": self.max_tokens,
+                "prompts": self.prompts,
+                "avg_tokens": round(self.total_tokens / self.prompts, 1) if self.prompts else 0.0,
+                "largest_tokens": self.largest,
+                "last_tokens": self.last_tokens,
+                "trimmed": self.trimmed,
+                "over_budget": self.over_budget,
+                "examples_dropped": self.examples_dropped,
+                "contacts_dropped": self.contacts_dropped,
+                "size_histogram": histogram
+            }
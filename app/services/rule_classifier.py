@@ -0,0 +1,220 @@
+import logging
+import re
+import threading
+from typing import Dict, Any, Optional, List, Tuple
+from app.services.biller_catalog import BillerCatalog
+from app.utils.helpers import extract_amount, extract_contact_name, normalize_query
+
+logger = logging.getLogger(__name__)
+
+PAY_WORDS = {"pay", "send", "transfer", "give"}
+BILL_WORDS = {"bill", "bills", "due", "dues"}
+CATEGORY_KEYWORDS = {
+    "credit card": "CREDIT CARD",
+    "card": "CREDIT CARD",
+    "electricity": "ELECTRICITY",
+    "electric": "ELECTRICITY",
+    "power": "ELECTRICITY",
+    "fastag": "FASTAG",
+    "gas": "GAS",
+    "insurance": "INSURANCE"
+}
+REWARD_WORDS = {"reward", "rewards", "cashback", "points", "coins", "miles"}
+HISTORY_PHRASES = ("transaction", "transactions", "payment history", "statement", "past payments")
+
+# Words that end a payee name captured by extract_contact_name
+NAME_STOP_WORDS = {"for", "on", "from", "via", "rs", "rupees", "inr", "now", "today", "please"}
+
+class RuleBasedClassifier:
+    """Deterministic classifier that answers obvious queries without calling Gemini"""
+
+    RULES = ("pay_to_person", "pay_bill", "check_rewards", "transaction_history")
+
+    def __init__(self, biller_catalog: BillerCatalog, confidence_threshold: float = 0.9):
+        """
+        Initialize the rule-based classifier
+
+        Args:
+            biller_catalog: Catalog whose aliases identify billers in queries
+            confidence_threshold: Minimum confidence for a rule result to be returned
+        """
+        self.confidence_threshold = confidence_threshold
+        self.biller_catalog = biller_catalog
+        self._lock = threading.Lock()
+        self.evaluated = 0
+        self.fallthrough = 0
+        self.rule_hits = {rule: 0 for rule in self.RULES}
+        self.rule_below_threshold = {rule: 0 for rule in self.RULES}
+
+    def classify(self, query: str, contact_names: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Classify a query if a rule is confident about it
+
+        Args:
+            query: User query text
+            contact_names: The user's contact names, used to resolve payees
+
+        Returns:
+            IntentData-shaped dict, or None if the query should go to Gemini
+        """
+        candidates = self._candidates(query, contact_names)
+
+        chosen = None
+        below_threshold = None
+        # Conflicting rules mean the query is not obvious
+        if len(candidates) == 1:
+            rule, result = candidates[0]
+            if result["confidence"] >= self.confidence_threshold:
+                chosen = rule
+            else:
+                below_threshold = rule
+
+        with self._lock:
+            self.evaluated += 1
+            if chosen:
+                self.rule_hits[chosen] += 1
+            else:
+                self.fallthrough += 1
+                if below_threshold:
+                    self.rule_below_threshold[below_threshold] += 1
+
+        if chosen:
+            logger.debug(f"Rule '{chosen}' classified query: {query}")
+            return candidates[0][1]
+        return None
+
+    def best_guess(self, query: str, contact_names: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Classify a query with the only matching rule, whatever its confidence
+
+        Used when Gemini cannot answer in time; does not update the hit counters.
+
+        Args:
+            query: User query text
+            contact_names: The user's contact names, used to resolve payees
+
+        Returns:
+            IntentData-shaped dict, or None if no rule or several rules match
+        """
+        candidates = self._candidates(query, contact_names)
+        if len(candidates) == 1:
+            return candidates[0][1]
+        return None
+
+    def _candidates(self, query: str, contact_names: Optional[List[str]]) -> List[Tuple[str, Dict[str, Any]]]:
+        normalized = normalize_query(query)
+        words = set(re.findall(r"[a-z]+", normalized))
+
+        candidates = []
+        for rule in self.RULES:
+            result = getattr(self, f"_rule_{rule}")(query, normalized, words, contact_names or [])
+            if result is not None:
+                candidates.append((rule, result))
+        return candidates
+
+    @staticmethod
+    def _format_amount(amount: Optional[float]) -> Optional[float]:
+        if amount is not None and float(amount).is_integer():
+            return int(amount)
+        return amount
+
+    @staticmethod
+    def _resolve_contact(name: str, contact_names: List[str]) -> List[str]:
+        """Return contacts whose name equals, or contains all words of, the extracted name"""
+        target = name.lower().split()
+        exact = [c for c in contact_names if c.lower().split() == target]
+        if exact:
+            return exact
+        return [c for c in contact_names if set(target) <= set(c.lower().split())]
+
+    def _rule_pay_to_person(self, query: str, normalized: str, words: set,
+                            contact_names: List[str]) -> Optional[Dict[str, Any]]:
+        if not words & PAY_WORDS or words & BILL_WORDS:
+            return None
+        amount = extract_amount(query, allow_bare_number=True)
+        name = extract_contact_name(query)
+        if amount is None or not name:
+            return None
+        name_words = []
+        for word in name.split():
+            if word.lower() in NAME_STOP_WORDS or word.lower() in PAY_WORDS:
+                break
+            name_words.append(word)
+        if not name_words:
+            return None
+
+        note_match = re.search(r"\bfor\s+(.+)$", query, re.IGNORECASE)
+        extracted = {
+            "payee_name": " ".join(name_words),
+            "amount": self._format_amount(amount),
+            "note": note_match.group(1).strip() if note_match else ""
+        }
+        matches = self._resolve_contact(extracted["payee_name"], contact_names)
+        if len(matches) == 1:
+            extracted["payee_name"] = matches[0]
+            confidence = 0.95
+        else:
+            # Unknown or ambiguous payees need Gemini's fuzzy contact matching
+            confidence = 0.6
+        return {"intent": "PAY_TO_PERSON", "confidence": confidence, "extracted_data": extracted}
+
+    def _rule_pay_bill(self, query: str, normalized: str, words: set,
+                       contact_names: List[str]) -> Optional[Dict[str, Any]]:
+        if not words & PAY_WORDS:
+            return None
+        category_name = None
+        for keyword, category in CATEGORY_KEYWORDS.items():
+            if re.search(rf"\b{keyword}\b", normalized):
+                category_name = category
+                break
+        if not category_name and not words & BILL_WORDS:
+            return None
+
+        alias, billers = self.biller_catalog.find_in_text(normalized)
+        extracted = {
+            "category_name": category_name,
+            "biller_name": None,
+            "amount": self._format_amount(extract_amount(query, allow_bare_number=True))
+        }
+        if len(billers) == 1:
+            extracted["biller_name"] = billers[0]["biller_name"]
+            extracted["category_name"] = category_name or billers[0]["category_name"]
+            confidence = 0.95
+        elif billers:
+            confidence = 0.7
+        else:
+            # A category without a biller is plausible but worth Gemini's judgement
+            confidence = 0.85 if category_name else 0.6
+        return {"intent": "PAY_BILL", "confidence": confidence, "extracted_data": extracted}
+
+    def _rule_check_rewards(self, query: str, normalized: str, words: set,
+                            contact_names: List[str]) -> Optional[Dict[str, Any]]:
+        reward_words = words & REWARD_WORDS
+        if not reward_words or words & PAY_WORDS:
+            return None
+        reward_type = None
+        for candidate in ("cashback", "points", "coins", "miles"):
+            if candidate in reward_words:
+                reward_type = candidate
+                break
+        return {"intent": "CHECK_REWARDS", "confidence": 0.92, "extracted_data": {"reward_type": reward_type}}
+
+    def _rule_transaction_history(self, query: str, normalized: str, words: set,
+                                  contact_names: List[str]) -> Optional[Dict[str, Any]]:
+        if not any(phrase in normalized for phrase in HISTORY_PHRASES) or words & PAY_WORDS:
+            return None
+        return {"intent": "TRANSACTION_HISTORY", "confidence": 0.92, "extracted_data": {}}
+
+    def stats(self) -> Dict[str, Any]:
+        """Get per-rule hit counters and the share of traffic kept away from Gemini"""
+        with self._lock:
+            hits = sum(self.rule_hits.values())
+            return {
+                "confidence_threshold": self.confidence_threshold,
+                "evaluated": self.evaluated,
+                "hits": hits,
+                "fallthrough": self.fallthrough,
+                "hit_rate": round(hits / self.evaluated, 4) if self.evaluated else 0.0,
+                "rule_hits": dict(self.rule_hits),
+                "rule_below_threshold": dict(self.rule_below_threshold)
+            }
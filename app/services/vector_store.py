@@ -1,87 +1,556 @@
+import copy
+import hashlib
 import logging
+import os
+import re
+import threading
+import uuid
+import zlib
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Iterable, Tuple
 import json
+import numpy as np
+from app.utils.cache import LRUCache
+from app.utils.helpers import normalize_query
 
 logger = logging.getLogger(__name__)
 
 INDEX_NAME = "chat_intents"
 
-def search_similar_intent(es_client, user_id: str, query: str) -> Optional[Dict[str, Any]]:
+# Cosine similarity above which a past query counts as a near-duplicate
+DEFAULT_MATCH_SCORE = 0.9
+
+# Elasticsearch score above which a fuzzy match of a past query is returned
+DEFAULT_FUZZY_MIN_SCORE = 8.0
+# Ranks exact phrase matches above fuzzy-only ones
+EXACT_MATCH_BOOST = 10.0
+# Hits checked for an exact match
+SIMILAR_CANDIDATES = 3
+# Thresholds search_similar_intent uses when its caller passes none (see configure_history_search)
+_history_search = {"min_similarity": DEFAULT_MATCH_SCORE, "min_fuzzy_score": DEFAULT_FUZZY_MIN_SCORE}
+# Old messages found per search and deleted per _bulk request when pruning;
+# stays below index.max_result_window
+PRUNE_PAGE_SIZE = 1000
+
+class HashingVectorizer:
+    """
+    Maps text to L2-normalized vectors of hashed word and character n-gram counts
+    
+    Hashing needs no vocabulary, so vectors of new queries are comparable with
+    stored ones without refitting. CRC32 is used instead of hash() so vectors stay
+    valid across processes and restarts.
+    """
+    
+    def __init__(self, dim: int = 1024, ngram_size: int = 3):
+        """
+        Initialize the vectorizer
+        
+        Args:
+            dim: Vector dimension (number of hash buckets)
+            ngram_size: Length of the character n-grams taken from each word
+        """
+        self.dim = dim
+        self.ngram_size = ngram_size
+    
+    def _features(self, text: str) -> Iterable[Tuple[str, float]]:
+        words = re.findall(r"\w+", normalize_query(text))
+        for word in words:
+            yield f"w:{word}", 1.0
+            padded = f" {word} "
+            for i in range(max(len(padded) - self.ngram_size + 1, 1)):
+                yield f"c:{padded[i:i + self.ngram_size]}", 0.5
+        for first, second in zip(words, words[1:]):
+            yield f"b:{first} {second}", 1.0
+    
+    def transform(self, text: str) -> np.ndarray:
+        """
+        Vectorize one text
+        
+        Args:
+            text: Text to vectorize
+            
+        Returns:
+            float32 vector of length dim with unit norm (all zeros for empty text)
+        """
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            # The sign bit keeps colliding features from only ever adding up
+            vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+    
+    def transform_many(self, texts: List[str]) -> np.ndarray:
+        """Vectorize several texts into a (len(texts), dim) matrix"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self.transform(text)
+        return matrix
+
+class _Shard:
+    """Vectors, ids, texts and payloads of one shard; row i of vectors belongs to ids[i]"""
+    
+    __slots__ = ("vectors", "ids", "texts", "payloads", "positions", "dirty", "vectors_file")
+    
+    def __init__(self, vectors: np.ndarray, ids: List[str], texts: List[str], payloads: List[Any],
+                 vectors_file: Optional[str] = None):
+        self.vectors = vectors
+        self.ids = ids
+        self.texts = texts
+        self.payloads = payloads
+        self.positions = {doc_id: row for row, doc_id in enumerate(ids)}
+        self.dirty = False
+        # Name of the saved vectors file in the index directory, if any
+        self.vectors_file = vectors_file
+    
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+    
+    def writable(self, needed: int) -> np.ndarray:
+        """Get a writable matrix with room for needed rows, copying a memory-mapped or full one"""
+        capacity = self.vectors.shape[0]
+        if needed > capacity or not self.vectors.flags.writeable:
+            grown = np.zeros((max(needed, capacity * 2, 8), self.vectors.shape[1]), dtype=np.float32)
+            grown[:self.size] = self.vectors[:self.size]
+            self.vectors = grown
+        return self.vectors
+
+class VectorIndex:
     """
-    Search for similar intents in Elasticsearch
+    In-process nearest-neighbour index of short texts, sharded by key (e.g. user ID)
+    
+    Each shard is a float32 matrix of unit vectors, so a lookup is one matrix
+    product and needs no network call. Documents are added, replaced and deleted
+    by ID. Shards can be saved to a directory and loaded back memory-mapped, so
+    a restarted worker does not rebuild them and idle shards stay on disk. At
+    most max_shards shards are kept in memory; with a directory, evicted shards
+    are saved first and read back on their next use.
+    """
+    
+    def __init__(self, dim: int = 1024, path: Optional[str] = None, max_shards: int = 10000):
+        """
+        Initialize an empty index
+        
+        Args:
+            dim: Vector dimension
+            path: Directory used by save and load
+            max_shards: Maximum number of shards kept in memory
+        """
+        self.vectorizer = HashingVectorizer(dim=dim)
+        self.path = path
+        # Shard key -> _Shard, least recently used first
+        self._shards = LRUCache(maxsize=max_shards, on_evict=self._evicted)
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.matches = 0
+    
+    def add(self, shard: str, doc_id: str, text: str, payload: Any = None) -> None:
+        """
+        Add a document, replacing any document with the same ID in the shard
+        
+        Args:
+            shard: Shard key
+            doc_id: Document ID
+            text: Text the document is found by
+            payload: Data returned with search hits
+        """
+        self.add_many(shard, [(doc_id, text, payload)])
+    
+    def add_many(self, shard: str, docs: List[Tuple[str, str, Any]]) -> None:
+        """
+        Add several documents to a shard
+        
+        Args:
+            shard: Shard key
+            docs: (doc_id, text, payload) tuples
+        """
+        if not docs:
+            return
+        vectors = self.vectorizer.transform_many([text for _, text, _ in docs])
+        with self._lock:
+            store = self._shard(shard)
+            if store is None:
+                store = _Shard(np.zeros((0, self.vectorizer.dim), dtype=np.float32), [], [], [])
+                self._shards.set(shard, store)
+            matrix = store.writable(store.size + len(docs))
+            for vector, (doc_id, text, payload) in zip(vectors, docs):
+                row = store.positions.get(doc_id)
+                if row is None:
+                    row = store.size
+                    store.positions[doc_id] = row
+                    store.ids.append(doc_id)
+                    store.texts.append(text)
+                    store.payloads.append(payload)
+                else:
+                    store.texts[row] = text
+                    store.payloads[row] = payload
+                matrix[row] = vector
+            store.dirty = True
+    
+    def delete(self, shard: str, doc_ids: Iterable[str]) -> int:
+        """
+        Delete documents from a shard
+        
+        Args:
+            shard: Shard key
+            doc_ids: IDs of the documents to delete
+            
+        Returns:
+            Number of documents deleted
+        """
+        deleted = 0
+        with self._lock:
+            store = self._shard(shard)
+            if store is None:
+                return 0
+            for doc_id in doc_ids:
+                row = store.positions.pop(doc_id, None)
+                if row is None:
+                    continue
+                # Move the last row into the hole so rows stay contiguous
+                last = store.size - 1
+                matrix = store.writable(store.size)
+                if row != last:
+                    matrix[row] = matrix[last]
+                    store.ids[row] = store.ids[last]
+                    store.texts[row] = store.texts[last]
+                    store.payloads[row] = store.payloads[last]
+                    store.positions[store.ids[row]] = row
+                del store.ids[last], store.texts[last], store.payloads[last]
+                deleted += 1
+            if deleted:
+                store.dirty = True
+        return deleted
+    
+    def drop(self, shard: str) -> None:
+        """Remove a whole shard"""
+        with self._lock:
+            self._shards.pop(shard)
+            if not self.path or not os.path.isdir(self.path):
+                return
+            # The metadata goes first, so a failure part-way leaves no loadable shard
+            name = self._shard_name(shard)
+            filenames = [f"{name}.json"] + [
+                filename for filename in os.listdir(self.path)
+                if filename.startswith(f"{name}.") and filename.endswith(".npy")
+            ]
+            for filename in filenames:
+                try:
+                    os.remove(os.path.join(self.path, filename))
+                except FileNotFoundError:
+                    pass
+    
+    def ids(self, shard: str) -> List[str]:
+        """Get the document IDs of a shard"""
+        with self._lock:
+            store = self._shard(shard)
+            return list(store.ids) if store else []
+    
+    def search(self, shard: str, text: str, k: int = 1, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        Find the documents most similar to a text
+        
+        Args:
+            shard: Shard key
+            text: Text to look up
+            k: Maximum number of hits
+            min_score: Minimum cosine similarity of a hit
+            
+        Returns:
+            Hits (id, score, text, payload), best first
+        """
+        return self.search_many(shard, [text], k=k, min_score=min_score)[0]
+    
+    def search_many(self, shard: str, texts: List[str], k: int = 1,
+                    min_score: float = 0.0) -> List[List[Dict[str, Any]]]:
+        """
+        Find the most similar documents for several texts with one matrix product
+        
+        Args:
+            shard: Shard key
+            texts: Texts to look up
+            k: Maximum number of hits per text
+            min_score: Minimum cosine similarity of a hit
+            
+        Returns:
+            Hits for each text, best first
+        """
+        queries = self.vectorizer.transform_many(texts)
+        results: List[List[Dict[str, Any]]] = [[] for _ in texts]
+        with self._lock:
+            self.searches += len(texts)
+            store = self._shard(shard)
+            if store is None or store.size == 0:
+                return results
+            scores = queries @ store.vectors[:store.size].T
+            k = min(k, store.size)
+            for i, row_scores in enumerate(scores):
+                if k < store.size:
+                    top = np.argpartition(-row_scores, k - 1)[:k]
+                    top = top[np.argsort(-row_scores[top])]
+                else:
+                    top = np.argsort(-row_scores)
+                for row in top:
+                    score = float(row_scores[row])
+                    if score < min_score:
+                        break
+                    results[i].append({
+                        "id": store.ids[row],
+                        "score": score,
+                        "text": store.texts[row],
+                        "payload": copy.deepcopy(store.payloads[row])
+                    })
+                if results[i]:
+                    self.matches += 1
+        return results
+    
+    def nearest(self, shard: str, text: str, min_score: float = DEFAULT_MATCH_SCORE) -> Optional[Dict[str, Any]]:
+        """Get the single most similar document if it scores at least min_score"""
+        hits = self.search(shard, text, k=1, min_score=min_score)
+        return hits[0] if hits else None
+    
+    def _shard_name(self, shard: str) -> str:
+        return hashlib.sha1(shard.encode("utf-8")).hexdigest()[:20]
+    
+    def _shard(self, shard: str) -> Optional[_Shard]:
+        # Called with the lock held; shards saved but not in memory are read back
+        store = self._shards.get(shard)
+        if store is None and self.path:
+            meta_file = os.path.join(self.path, f"{self._shard_name(shard)}.json")
+            if os.path.exists(meta_file):
+                loaded = self._read_shard(meta_file)
+                if loaded is not None and loaded[0] == shard:
+                    store = loaded[1]
+                    self._shards.set(shard, store)
+        return store
+    
+    def _evicted(self, shard: str, store: _Shard) -> None:
+        # Called with the lock held when a shard is evicted for size
+        if self.path and store.dirty:
+            try:
+                self._write_shard(shard, store)
+            except Exception as e:
+                logger.error(f"Error saving evicted vector shard: {str(e)}")
+    
+    def _write_shard(self, shard: str, store: _Shard) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        name = self._shard_name(shard)
+        meta_file = os.path.join(self.path, f"{name}.json")
+        # Vectors go to a new file that the metadata names, so renaming the metadata
+        # into place is the single step that replaces the shard
+        vectors_file = f"{name}.{uuid.uuid4().hex[:12]}.npy"
+        with open(os.path.join(self.path, vectors_file), "wb") as f:
+            np.save(f, np.ascontiguousarray(store.vectors[:store.size]))
+        with open(meta_file + ".tmp", "w") as f:
+            json.dump({
+                "shard": shard,
+                "dim": self.vectorizer.dim,
+                "vectors": vectors_file,
+                "ids": store.ids,
+                "texts": store.texts,
+                "payloads": store.payloads
+            }, f, separators=(",", ":"), default=str)
+        os.replace(meta_file + ".tmp", meta_file)
+        if store.vectors_file:
+            # Memory maps of the old file stay valid after it is removed
+            try:
+                os.remove(os.path.join(self.path, store.vectors_file))
+            except FileNotFoundError:
+                pass
+        store.vectors_file = vectors_file
+        store.dirty = False
+    
+    def _read_shard(self, meta_file: str) -> Optional[Tuple[str, _Shard]]:
+        filename = os.path.basename(meta_file)
+        try:
+            with open(meta_file) as f:
+                meta = json.load(f)
+            if meta.get("dim") != self.vectorizer.dim:
+                logger.warning(f"Skipping vector shard {filename}: dimension {meta.get('dim')} != {self.vectorizer.dim}")
+                return None
+            vectors_file = meta.get("vectors", filename[:-len(".json")] + ".npy")
+            vectors = np.load(os.path.join(self.path, vectors_file), mmap_mode="r")
+            documents = len(meta["ids"])
+            if vectors.shape != (documents, self.vectorizer.dim) or not (
+                    len(meta["texts"]) == len(meta["payloads"]) == documents):
+                logger.warning(f"Skipping vector shard {filename}: {vectors.shape[0]} vectors for {documents} documents")
+                return None
+            store = _Shard(vectors, meta["ids"], meta["texts"], meta["payloads"], vectors_file=vectors_file)
+        except Exception as e:
+            logger.error(f"Error loading vector shard {filename}: {str(e)}")
+            return None
+        return meta["shard"], store
+    
+    def save(self) -> int:
+        """
+        Write changed shards to the index directory
+        
+        Returns:
+            Number of shards written
+        """
+        if not self.path:
+            return 0
+        written = 0
+        with self._lock:
+            for shard, store in self._shards.items():
+                if store.dirty:
+                    self._write_shard(shard, store)
+                    written += 1
+        return written
+    
+    def load(self) -> int:
+        """
+        Load the shards saved in the index directory, memory-mapping their vectors
+        
+        Shards whose vectors do not match their metadata are skipped.
+        
+        Returns:
+            Number of shards loaded
+        """
+        if not self.path or not os.path.isdir(self.path):
+            return 0
+        loaded = 0
+        for filename in os.listdir(self.path):
+            if not filename.endswith(".json"):
+                continue
+            shard = self._read_shard(os.path.join(self.path, filename))
+            if shard is None:
+                continue
+            with self._lock:
+                self._shards.set(*shard)
+            loaded += 1
+        logger.info(f"Loaded {loaded} vector index shards from {self.path}")
+        return loaded
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get shard, document and search counters"""
+        with self._lock:
+            return {
+                "dim": self.vectorizer.dim,
+                "shards": len(self._shards),
+                "max_shards": self._shards.maxsize,
+                "evicted_shards": self._shards.evictions,
+                "documents": sum(store.size for _, store in self._shards.items()),
+                "searches": self.searches,
+                "matches": self.matches,
+                "match_rate": round(self.matches / self.searches, 4) if self.searches else 0.0
+            }
+
+def configure_history_search(min_similarity: Optional[float] = None,
+                             min_fuzzy_score: Optional[float] = None) -> None:
+    """
+    Set the default thresholds of search_similar_intent (e.g. from the app config)
+    
+    Args:
+        min_similarity: Cosine similarity a local hit needs to be returned
+        min_fuzzy_score: Score a fuzzy (non-exact) Elasticsearch hit needs to be returned
+    """
+    if min_similarity is not None:
+        _history_search["min_similarity"] = min_similarity
+    if min_fuzzy_score is not None:
+        _history_search["min_fuzzy_score"] = min_fuzzy_score
+
+def search_similar_intent(es_client, user_id: str, query: str,
+                          index: Optional[VectorIndex] = None,
+                          min_similarity: Optional[float] = None,
+                          min_fuzzy_score: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Search for similar intents, first in the local vector index, then in Elasticsearch
+    
+    Exact phrase and fuzzy matches are looked up in a single search; named
+    queries tell which of the two a hit matched.
     
     Args:
         es_client: Elasticsearch client
         user_id: User ID
         query: User query text
+        index: Local index of past queries, sharded by user ID
+        min_similarity: Cosine similarity a local hit needs to be returned
+            (the configured one by default)
+        min_fuzzy_score: Score a fuzzy (non-exact) Elasticsearch hit needs to be returned
+            (the configured one by default)
         
     Returns:
         Intent data if found, None otherwise
     """
+    if min_similarity is None:
+        min_similarity = _history_search["min_similarity"]
+    if min_fuzzy_score is None:
+        min_fuzzy_score = _history_search["min_fuzzy_score"]
+    
+    if index is not None:
+        hit = index.nearest(user_id, query, min_score=min_similarity)
+        if hit is not None:
+            return hit["payload"]
+    
     if not es_client:
         logger.error("Elasticsearch client not initialized")
         return None
     
     try:
-        # First try exact match
-        exact_match_query = {
+        # The user_id term stays scored so fuzzy scores are comparable with min_fuzzy_score
+        similar_query = {
             "query": {
                 "bool": {
                     "must": [
-                        {"term": {"user_id": user_id}},
-                        {"match_phrase": {"query": query}}
-                    ]
-                }
-            },
-            "size": 1
-        }
-        
-        result = es_client.search(index=INDEX_NAME, body=exact_match_query)
-        
-        if result['hits']['total']['value'] > 0:
-            return result['hits']['hits'][0]['_source']['intent_data']
-        
-        # Then try semantic search
-        semantic_query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {"term": {"user_id": user_id}},
+                        {"term": {"user_id": user_id}}
+                    ],
+                    "should": [
+                        {"match_phrase": {"query": {"query": query, "boost": EXACT_MATCH_BOOST, "_name": "exact"}}},
                         {"match": {
                             "query": {
                                 "query": query,
                                 "fuzziness": "AUTO",
-                                "minimum_should_match": "70%"
+                                "minimum_should_match": "70%",
+                                "_name": "fuzzy"
                             }
                         }}
-                    ]
+                    ],
+                    "minimum_should_match": 1
                 }
             },
-            "size": 1
+            "_source": ["intent_data"],
+            "track_total_hits": False,
+            "size": SIMILAR_CANDIDATES
         }
         
-        result = es_client.search(index=INDEX_NAME, body=semantic_query)
+        hits = es_client.search(index=INDEX_NAME, body=similar_query)['hits']['hits']
+        if not hits:
+            return None
+        
+        # Any exact match wins, as with a separate phrase query
+        for hit in hits:
+            if "exact" in hit.get('matched_queries', []):
+                return hit['_source']['intent_data']
+        
+        if hits[0]['_score'] > min_fuzzy_score:
+            return hits[0]['_source']['intent_data']
         
-        if result['hits']['total']['value'] > 0 and result['hits']['hits'][0]['_score'] > 8.0:
-            return result['hits']['hits'][0]['_source']['intent_data']
-            
         return None
         
     except Exception as e:
         logger.error(f"Error searching Elasticsearch: {str(e)}")
         return None
 
-def store_intent(es_client, user_id: str, query: str, intent_data: Dict[str, Any], feedback: bool = False) -> bool:
+def store_intent(es_client, user_id: str, query: str, intent_data: Dict[str, Any], feedback: bool = False,
+                 index: Optional[VectorIndex] = None, pruner: Optional["HistoryPruner"] = None) -> bool:
     """
     Store intent data in Elasticsearch
     
+    The write is a single indexing call; old messages are pruned later by the
+    background pruner once the user's history has grown past its limit.
+    
     Args:
         es_client: Elasticsearch client
         user_id: User ID
         query: User query text
         intent_data: Intent classification data
         feedback: Whether this is feedback data
+        index: Local index of past queries to add the query to
+        pruner: Pruner that keeps the user's history bounded (the shared one by default)
         
     Returns:
         True if successful, False otherwise
@@ -100,10 +569,11 @@ def store_intent(es_client, user_id: str, query: str, intent_data: Dict[str, Any
             "is_feedback": feedback
         }
         
-        es_client.index(index=INDEX_NAME, body=doc)
+        response = es_client.index(index=INDEX_NAME, body=doc)
+        if index is not None:
+            index.add(user_id, response["_id"], query, intent_data)
         
-        # Maintain only last 100 messages per user
-        prune_old_messages(es_client, user_id)
+        (pruner or history_pruner).record(es_client, user_id, index=index)
         
         return True
         
@@ -111,7 +581,8 @@ def store_intent(es_client, user_id: str, query: str, intent_data: Dict[str, Any
         logger.error(f"Error storing in Elasticsearch: {str(e)}")
         return False
 
-def prune_old_messages(es_client, user_id: str, max_messages: int = 100) -> None:
+def prune_old_messages(es_client, user_id: str, max_messages: int = 100,
+                       index: Optional[VectorIndex] = None) -> Tuple[int, int]:
     """
     Prune old messages to maintain only the latest messages
     
@@ -119,32 +590,170 @@ def prune_old_messages(es_client, user_id: str, max_messages: int = 100) -> None
         es_client: Elasticsearch client
         user_id: User ID
         max_messages: Maximum number of messages to keep
+        index: Local index of past queries to remove the pruned messages from
+        
+    Returns:
+        Tuple of (messages the user had, messages deleted)
     """
-    try:
-        # Count total messages for this user
-        count_query = {
-            "query": {"term": {"user_id": user_id}}
+    count_result = es_client.count(index=INDEX_NAME, body={"query": {"term": {"user_id": user_id}}})
+    count = count_result['count']
+    if count <= max_messages:
+        return count, 0
+    
+    excess = count - max_messages
+    deleted = []
+    search_after = None
+    while excess > 0:
+        # IDs of the oldest messages, without their sources
+        body = {
+            "query": {"term": {"user_id": user_id}},
+            "sort": [{"timestamp": "asc"}],
+            "size": min(excess, PRUNE_PAGE_SIZE),
+            "_source": False
         }
+        if search_after is not None:
+            # Deletes are not visible before a refresh, so pages continue after the last hit
+            body["search_after"] = search_after
+        hits = es_client.search(index=INDEX_NAME, body=body)['hits']['hits']
+        if not hits:
+            break
         
-        count_result = es_client.count(index=INDEX_NAME, body=count_query)
-        count = count_result['count']
+        # One _bulk request per page instead of a delete per message
+        operations = [{"delete": {"_index": INDEX_NAME, "_id": hit['_id']}} for hit in hits]
+        response = es_client.bulk(body=operations)
+        deleted.extend(
+            item["delete"]["_id"] for item in response.get("items", [])
+            if item.get("delete", {}).get("status") in (200, 404)
+        )
+        excess -= len(hits)
+        search_after = hits[-1]['sort']
+    
+    if index is not None and deleted:
+        index.delete(user_id, deleted)
+    return count, len(deleted)
+
+class HistoryPruner:
+    """
+    Keeps chat histories bounded without pruning on the write path
+    
+    Writes are counted per user in memory. A user is queued for pruning only
+    once their history has grown slack messages past max_messages, so pruning
+    costs a count, a search and one _bulk request per slack writes (more only
+    when over PRUNE_PAGE_SIZE messages are deleted) instead of several round
+    trips per write. Queued users are pruned by a background
+    thread started on first use.
+    """
+    
+    def __init__(self, max_messages: int = 100, slack: int = 20, max_tracked_users: int = 100000):
+        """
+        Initialize the pruner
         
-        # If more than max_messages, delete oldest messages
-        if count > max_messages:
-            delete_count = count - max_messages
+        Args:
+            max_messages: Messages kept per user
+            slack: Messages a user may be over max_messages before being pruned
+            max_tracked_users: Users whose counts are kept; forgotten users are recounted
+        """
+        self.max_messages = max_messages
+        self.slack = slack
+        # User ID -> estimated number of stored messages
+        self._counts = LRUCache(maxsize=max_tracked_users)
+        # User ID -> (es_client, index) of users waiting to be pruned
+        self._pending: Dict[str, Tuple[Any, Optional[VectorIndex]]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._stopping = False
+        self.recorded = 0
+        self.prunes = 0
+        self.deleted = 0
+        self.errors = 0
+    
+    def record(self, es_client, user_id: str, index: Optional[VectorIndex] = None) -> None:
+        """
+        Count a stored message and queue the user for pruning if needed
+        
+        Args:
+            es_client: Elasticsearch client the message was stored with
+            user_id: User ID
+            index: Local index of past queries to prune along with Elasticsearch
+        """
+        with self._lock:
+            self.recorded += 1
+            count = self._counts.get(user_id)
+            if count is not None:
+                count += 1
+                self._counts.set(user_id, count)
+            # Users seen for the first time are counted once in the background
+            if count is None or count > self.max_messages + self.slack:
+                self._pending[user_id] = (es_client, index)
+                self._ensure_thread()
+                self._wakeup.notify()
+    
+    def _ensure_thread(self) -> None:
+        # Called with the lock held; a forked worker starts its own thread
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="history-pruner", daemon=True)
+            self._thread.start()
+    
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._pending and not self._stopping:
+                    self._wakeup.wait()
+                if self._stopping:
+                    return
+                user_id = next(iter(self._pending))
+                es_client, index = self._pending.pop(user_id)
+            self.prune(es_client, user_id, index=index)
+    
+    def prune(self, es_client, user_id: str, index: Optional[VectorIndex] = None) -> int:
+        """
+        Prune one user's history now
+        
+        Args:
+            es_client: Elasticsearch client
+            user_id: User ID
+            index: Local index of past queries to prune as well
             
-            # Find oldest messages
-            search_query = {
-                "query": {"term": {"user_id": user_id}},
-                "sort": [{"timestamp": "asc"}],
-                "size": delete_count
+        Returns:
+            Number of messages deleted
+        """
+        try:
+            count, deleted = prune_old_messages(es_client, user_id, self.max_messages, index=index)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                # Forgetting the count makes the next write retry
+                self._counts.pop(user_id)
+            logger.error(f"Error pruning old messages: {str(e)}")
+            return 0
+        with self._lock:
+            self._counts.set(user_id, count - deleted)
+            if deleted:
+                self.prunes += 1
+                self.deleted += deleted
+        return deleted
+    
+    def stop(self) -> None:
+        """Stop the background thread; queued users are pruned after their next write"""
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify_all()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get tracked users, queue length and pruning counters"""
+        with self._lock:
+            return {
+                "tracked_users": len(self._counts),
+                "pending": len(self._pending),
+                "recorded": self.recorded,
+                "prunes": self.prunes,
+                "deleted": self.deleted,
+                "errors": self.errors
             }
-            
-            results = es_client.search(index=INDEX_NAME, body=search_query)
-            
-            # Delete them
-            for hit in results['hits']['hits']:
-                es_client.delete(index=INDEX_NAME, id=hit['_id'])
-                
-    except Exception as e:
-        logger.error(f"Error pruning old messages: {str(e)}")
\ No newline at end of file
+
+# Shared pruner used by store_intent
+history_pruner = HistoryPruner()
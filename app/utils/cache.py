@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional time-to-live per entry"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None,
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        """
+        Initialize the cache
+
+        Args:
+            maxsize: Maximum number of entries kept before the least recently used is evicted
+            ttl: Optional lifetime of an entry in seconds (None keeps entries until evicted)
+            on_evict: Optional callback invoked with (key, value) when an entry is evicted for size
+        """
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get a value and mark it as most recently used
+
+        Args:
+            key: Cache key
+            default: Value returned on a miss
+
+        Returns:
+            Cached value or default
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entry if the cache is full
+
+        Args:
+            key: Cache key
+            value: Value to store
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        evicted = []
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False))
+                self.evictions += 1
+        if self.on_evict:
+            for evicted_key, (evicted_value, _) in evicted:
+                self.on_evict(evicted_key, evicted_value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove a key and return its value (or default)"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Get a snapshot of the unexpired (key, value) pairs, least recently used first"""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (value, expires_at) in self._data.items()
+                    if expires_at is None or expires_at > now]
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters
+
+        Returns:
+            Dict with hit/miss/eviction counters and current size
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
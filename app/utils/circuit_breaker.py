@@ -0,0 +1,202 @@
+import logging
+import random
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Thread-safe closed/open/half-open circuit breaker
+
+    Closed: calls pass, consecutive failures are counted. Open: calls fail at once
+    with CircuitOpenError until the (jittered) recovery timeout passes. Half-open:
+    a limited number of trial calls pass; a success closes the circuit and a
+    failure reopens it with a doubled recovery timeout.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    # Outcomes returned by classify_error
+    FAILURE = "failure"
+    SUCCESS = "success"
+    IGNORE = "ignore"
+
+    def __init__(self, name: str, failure_threshold: int = 5,
+                 recovery_timeout: float = 10.0, max_recovery_timeout: float = 120.0,
+                 half_open_max_calls: int = 1, jitter: float = 0.2,
+                 classify_error: Optional[Callable[[BaseException], str]] = None):
+        """
+        Initialize the breaker in the closed state
+
+        Args:
+            name: Name used in logs and errors
+            failure_threshold: Consecutive failures that open the circuit
+            recovery_timeout: Seconds the circuit stays open the first time
+            max_recovery_timeout: Cap for the timeout, which doubles on every failed trial
+            half_open_max_calls: Concurrent trial calls allowed while half-open
+            jitter: Fraction by which open timeouts are randomly stretched or shortened,
+                so processes sharing a dependency do not probe it in lockstep
+            classify_error: Maps an exception raised by a call to FAILURE, SUCCESS (the
+                dependency answered) or IGNORE (says nothing about it); every
+                exception is a failure by default
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.max_recovery_timeout = max_recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.jitter = jitter
+        self.classify_error = classify_error or (lambda e: self.FAILURE)
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._consecutive_opens = 0
+        self._open_until = 0.0
+        self._trials = 0
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def configure(self, failure_threshold: Optional[int] = None,
+                  recovery_timeout: Optional[float] = None) -> None:
+        """Change the thresholds of a shared breaker (e.g. from app config)"""
+        with self._lock:
+            if failure_threshold is not None:
+                self.failure_threshold = failure_threshold
+            if recovery_timeout is not None:
+                self.recovery_timeout = recovery_timeout
+
+    @property
+    def state(self) -> str:
+        """Current state; an open circuit whose timeout passed reports half-open"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() >= self._open_until:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> None:
+        """
+        Reserve a call, raising if the circuit does not let it through
+
+        Every allowed call must be followed by record_success, record_failure
+        or record_error.
+
+        Raises:
+            CircuitOpenError: If the circuit is open or its trial calls are taken
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.OPEN:
+                if now < self._open_until:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self._open_until - now)
+                self._state = self.HALF_OPEN
+                self._trials = 0
+                logger.info(f"Circuit '{self.name}' half-open, probing")
+            if self._state == self.HALF_OPEN:
+                if self._trials >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 0.0)
+                self._trials += 1
+            self.calls += 1
+
+    def record_success(self) -> None:
+        """Record a call the dependency answered"""
+        with self._lock:
+            self._consecutive_failures = 0
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._consecutive_opens = 0
+                logger.info(f"Circuit '{self.name}' closed")
+
+    def record_failure(self) -> None:
+        """Record a failed call, opening the circuit if needed"""
+        with self._lock:
+            self.failures += 1
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                self._trip()
+
+    def record_error(self, e: BaseException) -> None:
+        """Record a call that raised, according to classify_error"""
+        outcome = self.classify_error(e)
+        if outcome == self.FAILURE:
+            self.record_failure()
+        elif outcome == self.SUCCESS:
+            self.record_success()
+        else:
+            with self._lock:
+                if self._state == self.HALF_OPEN and self._trials > 0:
+                    # Free the trial slot without a verdict
+                    self._trials -= 1
+
+    def call(self, func: Callable, *args, **kwargs):
+        """
+        Call func through the breaker
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        self.allow()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self.record_error(e)
+            raise
+        self.record_success()
+        return result
+
+    async def call_async(self, func: Callable, *args, **kwargs):
+        """
+        Await func(*args, **kwargs) through the breaker
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+        """
+        self.allow()
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            self.record_error(e)
+            raise
+        self.record_success()
+        return result
+
+    def _trip(self) -> None:
+        # Called with the lock held
+        timeout = min(self.recovery_timeout * (2 ** self._consecutive_opens), self.max_recovery_timeout)
+        timeout *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        self._state = self.OPEN
+        self._open_until = time.monotonic() + timeout
+        self._consecutive_opens += 1
+        self._consecutive_failures = 0
+        self.opened += 1
+        logger.warning(f"Circuit '{self.name}' opened for {timeout:.1f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the state and call/failure/rejection counters"""
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "opened": self.opened,
+                "open_for_s": round(max(0.0, self._open_until - time.monotonic()), 2) if state == self.OPEN else 0.0,
+                "failure_threshold": self.failure_threshold,
+                "recovery_timeout_s": self.recovery_timeout
+            }
@@ -0,0 +1,159 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+
+# Deadline of the request being handled; threads and asyncio tasks each see their own
+_current_deadline: contextvars.ContextVar = contextvars.ContextVar("deadline", default=None)
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request has no time left for a dependency call"""
+
+class Deadline:
+    """Absolute point in time by which a request must be answered"""
+
+    def __init__(self, timeout: float):
+        """
+        Initialize the deadline
+
+        Args:
+            timeout: Seconds from now
+        """
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        """Seconds left (0 once expired)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str = "request") -> float:
+        """
+        Get the seconds left, raising if there are none
+
+        Args:
+            stage: Name of the step about to run, for the error message
+
+        Returns:
+            Seconds left
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Deadline of {self.timeout}s exceeded before {stage}")
+        return remaining
+
+def current_deadline() -> Optional[Deadline]:
+    """Get the deadline of the current request, if any"""
+    return _current_deadline.get()
+
+def check_deadline(stage: str = "request") -> None:
+    """Raise DeadlineExceeded if the current request's deadline has passed"""
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+@contextmanager
+def deadline_scope(timeout: Optional[float]) -> Iterator[Optional[Deadline]]:
+    """
+    Apply a deadline to every dependency call made inside the block
+
+    Args:
+        timeout: Seconds the block may take (None for no deadline)
+
+    Yields:
+        The active Deadline, or None
+    """
+    deadline = Deadline(timeout) if timeout else None
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+def resolve_timeout(timeout_ms: Any, default: Optional[float], maximum: Optional[float]) -> Optional[float]:
+    """
+    Get the deadline in seconds for a request
+
+    Args:
+        timeout_ms: Timeout requested by the client in milliseconds (None for the default)
+        default: Timeout in seconds used when the client sets none
+        maximum: Upper bound in seconds for client-requested timeouts
+
+    Returns:
+        Timeout in seconds, or None for no deadline
+
+    Raises:
+        ValueError: If timeout_ms is not a positive number
+    """
+    if timeout_ms is None:
+        return default
+    if isinstance(timeout_ms, bool) or not isinstance(timeout_ms, (int, float)) or timeout_ms <= 0:
+        raise ValueError("timeout_ms must be a positive number")
+    timeout = timeout_ms / 1000.0
+    return min(timeout, maximum) if maximum else timeout
+
+def bounded(es_client):
+    """
+    Get a client whose requests time out at the current deadline
+
+    Works for both Elasticsearch and AsyncElasticsearch; returns the client
+    unchanged outside a deadline scope.
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return es_client
+    return es_client.options(request_timeout=deadline.check("Elasticsearch request"))
+
+class DeadlineStats:
+    """Counts requests served degraded (out of time or Gemini unavailable) and the fallbacks used"""
+
+    FALLBACKS = (
+        "gemini_unavailable",   # Gemini circuit open, queue full or call timed out
+        "contacts_skipped",     # classified without the user's contacts
+        "global_model",         # personalized model could not be built in time
+        "cached_result",        # served a cached global-model result
+        "rule_result",          # served a below-threshold rule result
+        "default_result",       # served OTHER with zero confidence
+        "cards_skipped"         # PAY_BILL enriched from the biller catalog only
+    )
+
+    def __init__(self, default_timeout: Optional[float] = None):
+        """
+        Initialize the counters
+
+        Args:
+            default_timeout: Deadline applied to requests that do not set one
+        """
+        self.default_timeout = default_timeout
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.degraded = 0
+        self.fallbacks = {fallback: 0 for fallback in self.FALLBACKS}
+
+    def record(self, fallbacks) -> None:
+        """
+        Record a finished request
+
+        Args:
+            fallbacks: Fallbacks the request used (empty if it completed in time)
+        """
+        with self._lock:
+            self.requests += 1
+            if fallbacks:
+                self.degraded += 1
+            for fallback in fallbacks:
+                self.fallbacks[fallback] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get request and per-fallback counters"""
+        with self._lock:
+            return {
+                "default_timeout_s": self.default_timeout,
+                "requests": self.requests,
+                "degraded": self.degraded,
+                "fallbacks": dict(self.fallbacks)
+            }
@@ -1,5 +1,6 @@
 import re
 import json
+import hashlib
 from typing import Dict, Any, List, Optional
 
 def sanitize_input(text: str) -> str:
@@ -23,12 +24,53 @@ def sanitize_input(text: str) -> str:
     
     return text
 
-def extract_amount(text: str) -> Optional[float]:
+def normalize_query(text: str) -> str:
+    """
+    Normalize a user query for use as a lookup key
+    
+    Args:
+        text: Raw query text
+        
+    Returns:
+        Lower-cased query with collapsed whitespace and no surrounding punctuation
+    """
+    text = re.sub(r'\s+', ' ', text.lower()).strip()
+    return text.strip(' .,!?;:')
+
+def fingerprint(data: Any) -> str:
+    """
+    Build a stable fingerprint of JSON-like data
+    
+    Args:
+        data: Dict/list/scalar to fingerprint
+        
+    Returns:
+        Hex digest that is identical for equal data regardless of key order
+    """
+    if not data:
+        return ""
+    serialized = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens in a text
+    
+    Args:
+        text: Prompt text
+        
+    Returns:
+        Approximate token count (about 4 characters per token)
+    """
+    return (len(text) + 3) // 4
+
+def extract_amount(text: str, allow_bare_number: bool = False) -> Optional[float]:
     """
     Extract monetary amount from text
     
     Args:
         text: Text containing amount
+        allow_bare_number: Also accept a number without currency marker (e.g. "pay 500 to Raj")
         
     Returns:
         Extracted amount as float or None if not found
@@ -46,6 +88,11 @@ def extract_amount(text: str) -> Optional[float]:
         if match:
             return float(match.group(1))
     
+    if allow_bare_number:
+        match = re.search(r'\b(\d+(?:\.\d+)?)\b', text)
+        if match:
+            return float(match.group(1))
+    
     return None
 
 def extract_contact_name(text: str) -> Optional[str]:
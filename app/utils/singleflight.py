@@ -0,0 +1,145 @@
+import asyncio
+import copy
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from app.utils.deadline import DeadlineExceeded, current_deadline
+
+class _Call:
+    """One in-flight call that identical callers wait on"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Deduplicates identical concurrent calls: the first caller of a key runs the
+    function, callers arriving while it runs wait for it and get a copy of its result
+
+    Results are deep-copied for every waiting caller, so callers may modify what
+    they get. A call that failed only because the first caller ran out of time is
+    retried by the callers still waiting.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.follower_timeouts = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn, or wait for the identical call already running
+
+        Followers wait at most until the current request deadline.
+
+        Args:
+            key: Identity of the call
+            fn: Function producing the result
+
+        Returns:
+            Tuple of (result, whether it was shared from another caller's call)
+
+        Raises:
+            DeadlineExceeded: If the deadline passed while waiting
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.leaders += 1
+                else:
+                    self.followers += 1
+
+            if leader:
+                try:
+                    result = fn()
+                    # Stored privately so the leader can modify its own result freely
+                    call.result = copy.deepcopy(result)
+                    return result, False
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    call.done.set()
+
+            deadline = current_deadline()
+            if not call.done.wait(deadline.remaining() if deadline else None):
+                with self._lock:
+                    self.follower_timeouts += 1
+                raise DeadlineExceeded("Deadline exceeded waiting for an identical in-flight call")
+            if isinstance(call.error, DeadlineExceeded):
+                # The leader's own deadline was shorter; try again with ours
+                continue
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result), True
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await fn(), or wait for the identical call already running in this event loop
+
+        Args:
+            key: Identity of the call
+            fn: Coroutine function producing the result
+
+        Returns:
+            Tuple of (result, whether it was shared from another caller's call)
+
+        Raises:
+            DeadlineExceeded: If the deadline passed while waiting
+        """
+        while True:
+            future = self._async_calls.get(key)
+            if future is None:
+                future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+                with self._lock:
+                    self.leaders += 1
+                try:
+                    result = await fn()
+                    future.set_result((copy.deepcopy(result), None))
+                    return result, False
+                except BaseException as e:
+                    future.set_result((None, e))
+                    raise
+                finally:
+                    del self._async_calls[key]
+
+            with self._lock:
+                self.followers += 1
+            deadline = current_deadline()
+            try:
+                result, error = await asyncio.wait_for(
+                    asyncio.shield(future), deadline.remaining() if deadline else None
+                )
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self.follower_timeouts += 1
+                raise DeadlineExceeded("Deadline exceeded waiting for an identical in-flight call")
+            if isinstance(error, (DeadlineExceeded, asyncio.CancelledError)):
+                # The leader ran out of time or its client went away; try again ourselves
+                continue
+            if error is not None:
+                raise error
+            return copy.deepcopy(result), True
+
+    def stats(self) -> Dict[str, Any]:
+        """Get leader/follower counters and the number of calls in flight"""
+        with self._lock:
+            calls = self.leaders + self.followers
+            return {
+                "in_flight": len(self._calls) + len(self._async_calls),
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "follower_timeouts": self.follower_timeouts,
+                "shared_rate": round(self.followers / calls, 4) if calls else 0.0
+            }
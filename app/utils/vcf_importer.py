@@ -1,11 +1,32 @@
+import hashlib
+import logging
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional
+from elasticsearch.helpers import bulk, scan
 from app.services.elasticsearch_manager import ElasticsearchManager
+from app.services.contact_index import CONTACTS_INDEX, CONTACTS_MAPPING, contact_document_id
 
+logger = logging.getLogger(__name__)
 
+# One document per imported file, keyed by user_id, holding the hash of the last import
+CONTACT_IMPORT_STATE_INDEX = "contact_import_state"
+CONTACT_IMPORT_STATE_MAPPING = {
+    "mappings": {
+        "properties": {
+            "file": {"type": "keyword"},
+            "sha256": {"type": "keyword"},
+            "contacts": {"type": "integer"},
+            "imported_at": {"type": "date"}
+        }
+    }
+}
 
-def parse_vcf_contacts(vcf_path):
-    contacts = []
 
+def iter_vcf_contacts(vcf_path) -> Iterator[Dict[str, str]]:
+    """Yield the contacts of a .vcf file one at a time"""
     with open(vcf_path, 'r') as f:
         contact = {}
 
@@ -22,33 +43,178 @@ def parse_vcf_contacts(vcf_path):
                 contact['number'] = number
             elif line == 'END:VCARD':
                 if 'name' in contact and 'number' in contact:
-                    contacts.append(contact)
+                    yield contact
                 contact = {}
 
-    return contacts
+
+def parse_vcf_contacts(vcf_path):
+    return list(iter_vcf_contacts(vcf_path))
+
+
+def file_sha256(path, chunk_size: int = 1 << 16) -> str:
+    """Hash a file without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _user_id_from_filename(fname: str) -> str:
+    return fname.replace('.vcf', '').replace('user', '')
+
+
+def _parse_if_changed(path: str, known_sha256: Optional[str]) -> Dict[str, Any]:
+    """
+    Hash a .vcf file and parse it only if it changed since the last import
+
+    Runs in a worker process, so it only takes and returns plain data.
+    """
+    start = time.perf_counter()
+    sha256 = file_sha256(path)
+    if sha256 == known_sha256:
+        return {"sha256": sha256, "changed": False, "contacts": None,
+                "parse_ms": round((time.perf_counter() - start) * 1000, 2)}
+    contacts = parse_vcf_contacts(path)
+    return {"sha256": sha256, "changed": True, "contacts": contacts,
+            "parse_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+def _load_import_state(es_manager: ElasticsearchManager) -> Dict[str, str]:
+    """Get user_id -> sha256 of every previously imported file"""
+    # Scrolled rather than one capped search, so no file silently loses its state
+    hits = scan(
+        es_manager.es_client,
+        index=CONTACT_IMPORT_STATE_INDEX,
+        query={"_source": ["sha256"], "query": {"match_all": {}}}
+    )
+    return {hit["_id"]: hit["_source"].get("sha256") for hit in hits}
 
 
+def _delete_removed_contacts(es_manager: ElasticsearchManager, user_id: str,
+                             contacts: List[Dict[str, str]]) -> int:
+    """
+    Delete a user's imported contacts that are not in the latest version of their file
 
-def import_all_user_contacts(contacts_dir, es_manager: ElasticsearchManager):
-    for fname in os.listdir(contacts_dir):
-        if fname.endswith('.vcf'):
-            user_id = fname.replace('.vcf', '').replace('user', '')
+    Args:
+        es_manager: ElasticsearchManager used for writes
+        user_id: Owner of the file
+        contacts: Contacts of the latest file, already indexed
 
-            contacts = parse_vcf_contacts(os.path.join(contacts_dir, fname))
+    Returns:
+        Number of contacts deleted
+    """
+    keep = [contact_document_id(user_id, contact['number']) for contact in contacts]
+    resp = es_manager.es_client.delete_by_query(
+        index=CONTACTS_INDEX,
+        routing=user_id,
+        body={"query": {"bool": {
+            "filter": [{"term": {"user_id": user_id}}],
+            "must_not": [{"ids": {"values": keep}}]
+        }}},
+        conflicts="proceed",
+        refresh=True
+    )
+    return resp.get("deleted", 0)
 
+
+def _contact_actions(user_id: str, contacts: List[Dict[str, str]]) -> Iterator[Dict[str, Any]]:
+    for contact in contacts:
+        # Phone number in the document ID prevents duplicates; routing keeps a user on one shard
+        yield {
+            "_index": CONTACTS_INDEX,
+            "_id": contact_document_id(user_id, contact['number']),
+            "_routing": user_id,
+            "_source": {**contact, 'user_id': user_id}
+        }
+
+
+def import_all_user_contacts(contacts_dir, es_manager: ElasticsearchManager, contact_index=None,
+                             workers: Optional[int] = None, chunk_size: int = 1000) -> List[Dict[str, Any]]:
+    """
+    Import contacts from .vcf files, skipping files unchanged since the last import
+
+    Files are hashed and parsed across a process pool and contacts are written
+    with _bulk in chunks. When a previously imported file changed, contacts no
+    longer in it are deleted.
+
+    Args:
+        contacts_dir: Directory holding user<user_id>.vcf files
+        es_manager: ElasticsearchManager used for writes
+        contact_index: Optional in-memory ContactIndex to prime with imported contacts
+        workers: Number of parser processes (1 parses in-process, None uses the CPU count)
+        chunk_size: Contacts per _bulk request
+
+    Returns:
+        Per-file report with status, contact count and timings
+    """
+    # One shared index for all users, created once
+    es_manager.create_index_with_mapping(CONTACTS_INDEX, CONTACTS_MAPPING)
+    es_manager.create_index_with_mapping(CONTACT_IMPORT_STATE_INDEX, CONTACT_IMPORT_STATE_MAPPING)
+    start = time.perf_counter()
+
+    files = sorted(fname for fname in os.listdir(contacts_dir) if fname.endswith('.vcf'))
+    try:
+        known = _load_import_state(es_manager)
+    except Exception as e:
+        logger.warning(f"Failed to read contact import state, importing every file: {str(e)}")
+        known = {}
+
+    paths = [os.path.join(contacts_dir, fname) for fname in files]
+    user_ids = [_user_id_from_filename(fname) for fname in files]
+    known_hashes = [known.get(user_id) for user_id in user_ids]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+            parsed = list(pool.map(_parse_if_changed, paths, known_hashes))
+    else:
+        parsed = [_parse_if_changed(path, known_hash) for path, known_hash in zip(paths, known_hashes)]
+
+    report = []
+    for fname, user_id, result in zip(files, user_ids, parsed):
+        entry = {"file": fname, "user_id": user_id, "parse_ms": result["parse_ms"]}
+        report.append(entry)
+        if not result["changed"]:
+            entry.update({"status": "unchanged", "contacts": None, "deleted": 0, "index_ms": 0.0})
+            continue
+
+        contacts = result["contacts"]
+        entry["contacts"] = len(contacts)
+        entry["deleted"] = 0
+        index_start = time.perf_counter()
+        try:
             if contacts:
-                index = f'user_contacts_{user_id}'
-                # Create index if not exists
-                if not es_manager.es_client.indices.exists(index=index):
-                    es_manager.es_client.indices.create(index=index, body={
-                        "mappings": {
-                            "properties": {
-                                "name": {"type": "text"},
-                                "number": {"type": "keyword"}
-                            }
-                        }
-                    })
-
-                # Bulk insert contacts with phone number as document ID to prevent duplicates
-                for contact in contacts:
-                    es_manager.es_client.index(index=index, body=contact, id=contact['number'])
+                bulk(es_manager.es_client, _contact_actions(user_id, contacts), chunk_size=chunk_size)
+            # Contacts removed from the file; deleted after the writes so the user is never left without contacts
+            entry["deleted"] = _delete_removed_contacts(es_manager, user_id, contacts)
+            es_manager.es_client.index(
+                index=CONTACT_IMPORT_STATE_INDEX,
+                id=user_id,
+                body={
+                    "file": fname,
+                    "sha256": result["sha256"],
+                    "contacts": len(contacts),
+                    "imported_at": datetime.now().isoformat()
+                }
+            )
+            entry["status"] = "imported"
+        except Exception as e:
+            entry["status"] = "failed"
+            logger.error(f"Failed to import contacts from {fname}: {str(e)}")
+        entry["index_ms"] = round((time.perf_counter() - index_start) * 1000, 2)
+
+        # Prime the in-memory contact index so first requests skip Elasticsearch
+        if contact_index is not None and entry["status"] == "imported":
+            contact_index.put(user_id, contacts)
+
+    for entry in report:
+        logger.info(
+            f"Contacts {entry['file']}: {entry['status']}, {entry['contacts']} contacts "
+            f"({entry['deleted']} removed), parse {entry['parse_ms']} ms, index {entry['index_ms']} ms"
+        )
+    imported = sum(1 for entry in report if entry["status"] == "imported")
+    logger.info(
+        f"Contact import finished in {(time.perf_counter() - start) * 1000:.0f} ms: "
+        f"{imported} imported, {len(report) - imported} unchanged or failed of {len(report)} files"
+    )
+    return report
@@ -10,11 +10,17 @@ class Config:
     # Flask configuration
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-key-please-change-in-production')
     DEBUG = os.environ.get('DEBUG', 'False').lower() in ['true', '1', 't']
+    # Set by gunicorn.conf.py when the app is created once in the master before forking
+    PRELOAD_APP = os.environ.get('PRELOAD_APP', 'False').lower() in ['true', '1', 't']
     
     # Elasticsearch configuration
     ELASTICSEARCH_HOST = os.environ.get('ELASTICSEARCH_HOST', 'localhost:9200')
     ELASTICSEARCH_USER = os.environ.get('ELASTICSEARCH_USER', '')
     ELASTICSEARCH_PASSWORD = os.environ.get('ELASTICSEARCH_PASSWORD', '')
+    # 'per_user' keeps one training index per user; 'shared' stores all users in one routed index
+    ES_USER_STORAGE_MODE = os.environ.get('ES_USER_STORAGE_MODE', 'per_user')
+    ES_USER_SHARED_INDEX = os.environ.get('ES_USER_SHARED_INDEX', 'user_intent_training')
+    ES_USER_ALIASES = os.environ.get('ES_USER_ALIASES', 'False').lower() in ['true', '1', 't']
     
     # Gemini API configuration
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
@@ -23,6 +29,75 @@ class Config:
     MAPI_SERVICE_URL = os.environ.get('MAPI_SERVICE_URL', 'http://twid_mapi/api')
     MAPI_SERVICE_TOKEN = os.environ.get('MAPI_SERVICE_TOKEN', '')
     
+    # Classification result cache
+    CLASSIFICATION_CACHE_SIZE = int(os.environ.get('CLASSIFICATION_CACHE_SIZE', 10000))
+    CLASSIFICATION_CACHE_TTL = int(os.environ.get('CLASSIFICATION_CACHE_TTL', 600))
+    
+    # System prompt cache (entries are rebuilt when training data changes)
+    PROMPT_CACHE_SIZE = int(os.environ.get('PROMPT_CACHE_SIZE', 1000))
+    # Prompt versions are shared through this index; workers re-read them at this interval
+    PROMPT_VERSION_INDEX = os.environ.get('PROMPT_VERSION_INDEX', 'prompt_versions')
+    PROMPT_VERSION_CHECK_INTERVAL = float(os.environ.get('PROMPT_VERSION_CHECK_INTERVAL', 5.0))
+    
+    # In-memory contact index (per-user, LRU evicted)
+    CONTACT_INDEX_MAX_USERS = int(os.environ.get('CONTACT_INDEX_MAX_USERS', 10000))
+    CONTACT_INDEX_TTL = int(os.environ.get('CONTACT_INDEX_TTL', 3600))
+    # Number of best-matching contacts sent to Gemini with a query
+    CONTACT_CANDIDATES_K = int(os.environ.get('CONTACT_CANDIDATES_K', 20))
+    
+    # Startup VCF import (0 workers = one parser process per CPU; unchanged files are skipped)
+    CONTACT_IMPORT_WORKERS = int(os.environ.get('CONTACT_IMPORT_WORKERS', 0))
+    CONTACT_IMPORT_CHUNK_SIZE = int(os.environ.get('CONTACT_IMPORT_CHUNK_SIZE', 1000))
+    
+    # Biller catalog (seconds between checks for changes to generic_bills)
+    BILLER_CATALOG_REFRESH_INTERVAL = int(os.environ.get('BILLER_CATALOG_REFRESH_INTERVAL', 300))
+    
+    # Rule-based fast path (skips Gemini for obvious queries)
+    RULE_CLASSIFIER_ENABLED = os.environ.get('RULE_CLASSIFIER_ENABLED', 'True').lower() in ['true', '1', 't']
+    RULE_CLASSIFIER_THRESHOLD = float(os.environ.get('RULE_CLASSIFIER_THRESHOLD', 0.9))
+    
+    # Write-behind bulk indexer for auto-stored training examples
+    BULK_INDEXER_QUEUE_SIZE = int(os.environ.get('BULK_INDEXER_QUEUE_SIZE', 10000))
+    BULK_INDEXER_BATCH_SIZE = int(os.environ.get('BULK_INDEXER_BATCH_SIZE', 500))
+    BULK_INDEXER_FLUSH_INTERVAL = float(os.environ.get('BULK_INDEXER_FLUSH_INTERVAL', 1.0))
+    BULK_INDEXER_ENQUEUE_TIMEOUT = float(os.environ.get('BULK_INDEXER_ENQUEUE_TIMEOUT', 0.0))
+    
+    # Personalized Gemini models kept in memory (per-user, LRU evicted)
+    PERSONAL_MODEL_CACHE_SIZE = int(os.environ.get('PERSONAL_MODEL_CACHE_SIZE', 1000))
+    
+    # Few-shot examples sent per query, picked from a pool of examples per intent (0 = fixed examples)
+    FEW_SHOT_EXAMPLES = int(os.environ.get('FEW_SHOT_EXAMPLES', 6))
+    FEW_SHOT_POOL_SIZE = int(os.environ.get('FEW_SHOT_POOL_SIZE', 20))
+    
+    # Estimated tokens a Gemini prompt may take (0 = no limit); examples, then contacts are trimmed
+    PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 1500))
+    PROMPT_MIN_EXAMPLES = int(os.environ.get('PROMPT_MIN_EXAMPLES', 2))
+    
+    # Seconds to wait after feedback before rebuilding the model (bursts share one rebuild)
+    MODEL_REFRESH_DEBOUNCE = float(os.environ.get('MODEL_REFRESH_DEBOUNCE', 5.0))
+    
+    # Circuit breakers around Elasticsearch reads and writes (consecutive failures, seconds open)
+    ES_READ_BREAKER_THRESHOLD = int(os.environ.get('ES_READ_BREAKER_THRESHOLD', 5))
+    ES_READ_BREAKER_RECOVERY = float(os.environ.get('ES_READ_BREAKER_RECOVERY', 5.0))
+    ES_WRITE_BREAKER_THRESHOLD = int(os.environ.get('ES_WRITE_BREAKER_THRESHOLD', 10))
+    ES_WRITE_BREAKER_RECOVERY = float(os.environ.get('ES_WRITE_BREAKER_RECOVERY', 15.0))
+    
+    # Per-request deadline for /api/classify-intent (requests may lower it with timeout_ms)
+    CLASSIFY_TIMEOUT = float(os.environ.get('CLASSIFY_TIMEOUT', 8.0))
+    CLASSIFY_MAX_TIMEOUT = float(os.environ.get('CLASSIFY_MAX_TIMEOUT', 30.0))
+    
+    # Gemini client limits (concurrent calls, waiting callers, seconds) and circuit breaker
+    GEMINI_MAX_IN_FLIGHT = int(os.environ.get('GEMINI_MAX_IN_FLIGHT', 16))
+    GEMINI_MAX_QUEUE = int(os.environ.get('GEMINI_MAX_QUEUE', 64))
+    GEMINI_QUEUE_TIMEOUT = float(os.environ.get('GEMINI_QUEUE_TIMEOUT', 2.0))
+    GEMINI_CALL_TIMEOUT = float(os.environ.get('GEMINI_CALL_TIMEOUT', 15.0))
+    GEMINI_BREAKER_THRESHOLD = int(os.environ.get('GEMINI_BREAKER_THRESHOLD', 5))
+    GEMINI_BREAKER_RECOVERY = float(os.environ.get('GEMINI_BREAKER_RECOVERY', 30.0))
+    
+    # Chat history matches: cosine similarity of a local near-duplicate, Elasticsearch score of a fuzzy match
+    HISTORY_MATCH_SCORE = float(os.environ.get('HISTORY_MATCH_SCORE', 0.9))
+    HISTORY_FUZZY_MIN_SCORE = float(os.environ.get('HISTORY_FUZZY_MIN_SCORE', 8.0))
+    
     # Rate limiting
     RATE_LIMIT_PER_MINUTE = int(os.environ.get('RATE_LIMIT_PER_MINUTE', 60))
 
@@ -0,0 +1,29 @@
+"""
+Gunicorn configuration
+
+With PRELOAD_APP enabled (the default) the master runs create_app once
+(ES checks, contact import, seeding, biller catalog and prompt build) and
+forks workers that inherit the result. Each worker then only recreates
+its network clients and starts its background threads.
+
+Usage:
+    gunicorn -c gunicorn.conf.py main:app
+"""
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+threads = int(os.environ.get("GUNICORN_THREADS", 2))
+preload_app = os.environ.get("PRELOAD_APP", "True").lower() in ["true", "1", "t"]
+
+# Read by config.settings when main:app is imported, after this file is loaded
+os.environ["PRELOAD_APP"] = str(preload_app)
+
+def post_fork(server, worker):
+    if preload_app:
+        from app import init_worker
+        init_worker(server.app.wsgi())
+
+def worker_exit(server, worker):
+    from app import shutdown_worker
+    shutdown_worker()
@@ -0,0 +1,145 @@
+"""
+Compare per-intent example retrieval with the batched _msearch path.
+
+Runs against an in-process Elasticsearch stand-in that adds a fixed latency
+per round trip, so the numbers reflect how many sequential calls each path
+makes rather than the speed of a particular cluster.
+
+Usage:
+    python scripts/benchmark_example_retrieval.py --latency-ms 5 --iterations 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import elasticsearch_manager
+from app.services.elasticsearch_manager import ElasticsearchManager, PROMPT_INTENTS
+
+class _StandInIndices:
+    def __init__(self, client):
+        self.client = client
+
+    def exists(self, index):
+        self.client.round_trip()
+        return index in self.client.docs
+
+    def create(self, index, body=None):
+        self.client.round_trip()
+        self.client.docs.setdefault(index, [])
+
+class StandInElasticsearch:
+    """Minimal in-memory stand-in for the search calls used by example retrieval"""
+
+    def __init__(self, *args, latency: float = 0.005, **kwargs):
+        self.latency = latency
+        self.docs: Dict[str, List[Dict[str, Any]]] = {}
+        self.round_trips = 0
+        self.indices = _StandInIndices(self)
+
+    def round_trip(self):
+        self.round_trips += 1
+        time.sleep(self.latency)
+
+    def ping(self):
+        return True
+
+    def _matches(self, doc, query):
+        clauses = query.get("bool", {})
+        for clause in clauses.get("must", []) + clauses.get("filter", []):
+            (field, value), = clause["term"].items()
+            if doc.get(field) != value:
+                return False
+        return True
+
+    def _search(self, index, body):
+        docs = [d for d in self.docs.get(index, []) if self._matches(d, body.get("query", {}))]
+        for spec in reversed(body.get("sort", [])):
+            (field, options), = spec.items()
+            descending = options.get("order") == "desc"
+            # Missing values sort last in both directions, like "missing": "_last"
+            present = [d for d in docs if d.get(field) is not None]
+            missing = [d for d in docs if d.get(field) is None]
+            present.sort(key=lambda d: d[field], reverse=descending)
+            docs = present + missing
+        hits = [{"_source": d} for d in docs[:body.get("size", 10)]]
+        return {"hits": {"total": {"value": len(hits)}, "hits": hits}}
+
+    def search(self, index, body, routing=None, **kwargs):
+        # Routing only selects shards, which the stand-in does not have
+        self.round_trip()
+        return self._search(index, body)
+
+    def msearch(self, body, **kwargs):
+        self.round_trip()
+        responses = []
+        for header, search in zip(body[::2], body[1::2]):
+            index = header["index"]
+            if index not in self.docs and not header.get("ignore_unavailable"):
+                responses.append({"error": {"type": "index_not_found_exception"}})
+            else:
+                responses.append(self._search(index, search))
+        return {"responses": responses}
+
+def _seed(client: StandInElasticsearch, manager: ElasticsearchManager, user_id: str,
+          per_intent: int = 20) -> None:
+    now = datetime.now()
+    client.docs[manager.global_index] = []
+    client.docs[manager._get_user_index(user_id)] = []
+    for intent in PROMPT_INTENTS:
+        for i in range(per_intent):
+            timestamp = (now - timedelta(minutes=random.randint(0, 10000))).isoformat()
+            client.docs[manager.global_index].append({
+                "query": f"{intent} global {i}", "intent": intent, "confidence": 1.0,
+                "extracted_data": {}, "timestamp": timestamp, "is_global": True,
+                "user_feedback": True, "data_quality": random.randint(1, 10)
+            })
+            client.docs[manager._get_user_index(user_id)].append({
+                "query": f"{intent} user {i}", "intent": intent, "confidence": 0.9,
+                "extracted_data": {}, "timestamp": timestamp, "is_global": False,
+                "user_feedback": random.choice([True, None]), "data_quality": 5
+            })
+
+def _time(func, iterations: int) -> List[float]:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Simulated latency per ES round trip")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    elasticsearch_manager.Elasticsearch = lambda *a, **kw: StandInElasticsearch(latency=latency)
+    manager = ElasticsearchManager()
+    client = manager.es_client
+    user_id = "bench_user"
+    _seed(client, manager, user_id)
+
+    def per_intent():
+        for intent in PROMPT_INTENTS:
+            manager.get_examples_by_intent(intent, user_id=user_id, max_global_examples=2, max_user_examples=3)
+
+    def batched():
+        manager.get_examples_for_intents(PROMPT_INTENTS, user_id=user_id, max_global_examples=2, max_user_examples=3)
+
+    for name, func in (("per-intent", per_intent), ("batched msearch", batched)):
+        client.round_trips = 0
+        timings = _time(func, args.iterations)
+        print(f"{name:16s} round trips/build: {client.round_trips / args.iterations:5.1f}  "
+              f"p50: {statistics.median(timings):7.2f} ms  max: {max(timings):7.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Measure personalized example retrieval latency for the per-user and shared
+user storage modes against a real Elasticsearch cluster.
+
+Shared mode loads every simulated user into one routed index. Per-user mode
+creates one index per user, which most clusters cannot do for 10k+ users
+(cluster.max_shards_per_node defaults to 1000), so it is capped by
+--max-user-indices and the shard count is reported next to the latency.
+
+All benchmark indices use the 'bench_' prefix and are deleted afterwards
+unless --keep is given.
+
+Usage:
+    python scripts/benchmark_user_storage.py --users 10000 100000 --samples 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Iterator
+from dotenv import load_dotenv
+from elasticsearch.helpers import bulk
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.elasticsearch_manager import ElasticsearchManager, PROMPT_INTENTS
+
+# Load environment variables
+load_dotenv()
+
+ES_HOST = os.environ.get("ELASTICSEARCH_HOST", "localhost")
+ES_PORT = int(os.environ.get("ELASTICSEARCH_PORT", "9200"))
+ES_USER = os.environ.get("ELASTICSEARCH_USER", "")
+ES_PASSWORD = os.environ.get("ELASTICSEARCH_PASSWORD", "")
+
+BENCH_GLOBAL_INDEX = "bench_global_intent_training"
+BENCH_USER_PREFIX = "bench_user_intent_training"
+
+def _manager(mode: str) -> ElasticsearchManager:
+    connection_params = {'host': ES_HOST, 'port': ES_PORT, 'scheme': 'http'}
+    if ES_USER and ES_PASSWORD:
+        connection_params['http_auth'] = (ES_USER, ES_PASSWORD)
+    return ElasticsearchManager(
+        es_host=ES_HOST,
+        es_port=ES_PORT,
+        global_index=BENCH_GLOBAL_INDEX,
+        user_index_prefix=BENCH_USER_PREFIX,
+        es_auth=connection_params,
+        user_storage_mode=mode
+    )
+
+def _actions(manager: ElasticsearchManager, users: int, per_user: int) -> Iterator[Dict[str, Any]]:
+    now = datetime.now()
+    for u in range(users):
+        user_id = f"u{u}"
+        for i in range(per_user):
+            intent = PROMPT_INTENTS[i % len(PROMPT_INTENTS)]
+            index, document, routing = manager.prepare_example(
+                f"{intent.lower()} example {i} for {user_id}",
+                {"intent": intent, "confidence": 0.9, "extracted_data": {}},
+                user_id=user_id,
+                user_feedback=random.choice([True, None])
+            )
+            document["timestamp"] = (now - timedelta(minutes=random.randint(0, 100000))).isoformat()
+            action = {"_index": index, "_source": document}
+            if routing:
+                action["_routing"] = routing
+            yield action
+
+def _load(manager: ElasticsearchManager, users: int, per_user: int) -> float:
+    start = time.perf_counter()
+    if not manager.shared_mode:
+        for u in range(users):
+            manager._create_index_if_not_exists(manager._get_user_index(f"u{u}"))
+    bulk(manager.es_client, _actions(manager, users, per_user), chunk_size=2000, refresh="wait_for")
+    return time.perf_counter() - start
+
+def _measure(manager: ElasticsearchManager, users: int, samples: int) -> List[float]:
+    timings = []
+    for _ in range(samples):
+        user_id = f"u{random.randrange(users)}"
+        start = time.perf_counter()
+        manager.get_examples_for_intents(PROMPT_INTENTS, user_id=user_id, max_global_examples=2, max_user_examples=3)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def _cleanup(manager: ElasticsearchManager) -> None:
+    manager.es_client.indices.delete(index="bench_*", ignore_unavailable=True, allow_no_indices=True)
+
+def run(mode: str, users: int, per_user: int, samples: int, keep: bool) -> None:
+    manager = _manager(mode)
+    try:
+        load_seconds = _load(manager, users, per_user)
+        shards = manager.es_client.cluster.health()["active_shards"]
+        timings = sorted(_measure(manager, users, samples))
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        print(f"{mode:8s} users: {users:7d}  docs: {users * per_user:8d}  shards: {shards:6d}  "
+              f"load: {load_seconds:7.1f} s  p50: {statistics.median(timings):6.2f} ms  "
+              f"p95: {p95:6.2f} ms  p99: {p99:6.2f} ms")
+    finally:
+        if not keep:
+            _cleanup(manager)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--examples-per-user", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--max-user-indices", type=int, default=500,
+                        help="Largest user count benchmarked in per_user mode")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark indices")
+    args = parser.parse_args()
+
+    for users in args.users:
+        run("shared", users, args.examples_per_user, args.samples, args.keep)
+        per_user_users = min(users, args.max_user_indices)
+        if per_user_users < users:
+            print(f"per_user mode capped at {per_user_users} users (one index per user)")
+        run("per_user", per_user_users, args.examples_per_user, args.samples, args.keep)
+
+if __name__ == "__main__":
+    main()
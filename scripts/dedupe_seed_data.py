@@ -0,0 +1,93 @@
+"""
+Remove duplicate documents left behind by repeated startup seeding.
+
+Documents with identical content are collapsed into one copy stored under
+its content-derived ID (the ID seeding now uses), and every other copy is
+deleted.
+
+Usage:
+    python scripts/dedupe_seed_data.py --dry-run
+    python scripts/dedupe_seed_data.py --index generic_bills --index user_credit_cards
+"""
+import argparse
+import logging
+import os
+import sys
+from collections import defaultdict
+from dotenv import load_dotenv
+from elasticsearch.helpers import scan, bulk
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.elasticsearch_manager import ElasticsearchManager
+from app.utils.helpers import fingerprint
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ES_HOST = os.environ.get("ELASTICSEARCH_HOST", "localhost")
+ES_PORT = int(os.environ.get("ELASTICSEARCH_PORT", "9200"))
+ES_USER = os.environ.get("ELASTICSEARCH_USER", "")
+ES_PASSWORD = os.environ.get("ELASTICSEARCH_PASSWORD", "")
+DEFAULT_INDICES = ["generic_bills", "user_credit_cards"]
+
+def dedupe_index(es_client, index_name: str, dry_run: bool = False) -> int:
+    """
+    Collapse documents with identical content into one content-keyed copy
+
+    Args:
+        es_client: Elasticsearch client
+        index_name: Index to clean up
+        dry_run: Only count the duplicates
+
+    Returns:
+        Number of documents deleted (or that would be deleted)
+    """
+    groups = defaultdict(list)
+    sources = {}
+    for hit in scan(es_client, index=index_name, query={"query": {"match_all": {}}}, size=1000):
+        doc_id = fingerprint(hit["_source"])
+        groups[doc_id].append(hit["_id"])
+        sources[doc_id] = hit["_source"]
+
+    actions = []
+    for doc_id, hit_ids in groups.items():
+        if doc_id not in hit_ids:
+            actions.append({"_op_type": "index", "_index": index_name, "_id": doc_id, "_source": sources[doc_id]})
+        actions.extend(
+            {"_op_type": "delete", "_index": index_name, "_id": hit_id}
+            for hit_id in hit_ids if hit_id != doc_id
+        )
+    deletes = sum(1 for action in actions if action["_op_type"] == "delete")
+    documents = sum(len(hit_ids) for hit_ids in groups.values())
+    logger.info(f"'{index_name}': {documents} documents, {len(groups)} unique, {deletes} to delete")
+
+    if actions and not dry_run:
+        bulk(es_client, actions, refresh=True)
+        logger.info(f"'{index_name}': removed {deletes} duplicates")
+    return deletes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", action="append", help="Index to clean up (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the duplicates")
+    args = parser.parse_args()
+
+    connection_params = {'host': ES_HOST, 'port': ES_PORT, 'scheme': 'http'}
+    if ES_USER and ES_PASSWORD:
+        connection_params['http_auth'] = (ES_USER, ES_PASSWORD)
+    es_manager = ElasticsearchManager(es_host=ES_HOST, es_port=ES_PORT, es_auth=connection_params)
+
+    for index_name in args.index or DEFAULT_INDICES:
+        try:
+            dedupe_index(es_manager.es_client, index_name, args.dry_run)
+        except Exception as e:
+            logger.error(f"Failed to clean up '{index_name}': {str(e)}")
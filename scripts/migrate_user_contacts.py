@@ -0,0 +1,123 @@
+"""
+One-shot migration of per-user 'user_contacts_<user_id>' indices into the
+shared, routed 'user_contacts' index.
+
+Each contact gets user_id, is routed by user_id and is stored under the id
+'<user_id>_<number>', so running the migration twice does not duplicate
+contacts. Document counts are compared before a source index is deleted.
+
+Usage:
+    python scripts/migrate_user_contacts.py --dry-run
+    python scripts/migrate_user_contacts.py --delete-source
+"""
+import argparse
+import logging
+import os
+import sys
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.elasticsearch_manager import ElasticsearchManager
+from app.services.contact_index import CONTACTS_INDEX, CONTACTS_MAPPING
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ES_HOST = os.environ.get("ELASTICSEARCH_HOST", "localhost")
+ES_PORT = int(os.environ.get("ELASTICSEARCH_PORT", "9200"))
+ES_USER = os.environ.get("ELASTICSEARCH_USER", "")
+ES_PASSWORD = os.environ.get("ELASTICSEARCH_PASSWORD", "")
+SOURCE_PREFIX = f"{CONTACTS_INDEX}_"
+
+def migrate_contacts_index(es_client, source: str, user_id: str, delete_source: bool = False) -> bool:
+    """
+    Copy one per-user contacts index into the shared index
+
+    Args:
+        es_client: Elasticsearch client
+        source: Per-user contacts index name
+        user_id: User the index belongs to
+        delete_source: Delete the per-user index once all contacts were copied
+
+    Returns:
+        True if every contact was copied
+    """
+    expected = es_client.count(index=source)["count"]
+    es_client.reindex(
+        body={
+            "source": {"index": source},
+            "dest": {"index": CONTACTS_INDEX, "routing": f"={user_id}"},
+            "script": {
+                # Per-user indices used the phone number as the document id
+                "source": "ctx._source.user_id = params.user_id; ctx._id = params.user_id + '_' + ctx._id",
+                "params": {"user_id": user_id}
+            }
+        },
+        wait_for_completion=True,
+        refresh=True
+    )
+    copied = es_client.count(
+        index=CONTACTS_INDEX,
+        routing=user_id,
+        body={"query": {"term": {"user_id": user_id}}}
+    )["count"]
+    if copied < expected:
+        logger.error(f"Only {copied}/{expected} contacts of '{source}' reached '{CONTACTS_INDEX}'; keeping source")
+        return False
+    logger.info(f"Copied {expected} contacts from '{source}'")
+
+    if delete_source:
+        es_client.indices.delete(index=source)
+        logger.info(f"Deleted '{source}'")
+    return True
+
+def migrate(dry_run: bool = False, delete_source: bool = False) -> bool:
+    """Migrate every per-user contacts index; returns True if all of them were copied"""
+    connection_params = {'host': ES_HOST, 'port': ES_PORT, 'scheme': 'http'}
+    if ES_USER and ES_PASSWORD:
+        connection_params['http_auth'] = (ES_USER, ES_PASSWORD)
+    es_manager = ElasticsearchManager(es_host=ES_HOST, es_port=ES_PORT, es_auth=connection_params)
+    es_client = es_manager.es_client
+    es_manager.create_index_with_mapping(CONTACTS_INDEX, CONTACTS_MAPPING)
+
+    sources = sorted(es_client.indices.get(index=f"{SOURCE_PREFIX}*", expand_wildcards="open"))
+    logger.info(f"Found {len(sources)} per-user contacts indices to migrate into '{CONTACTS_INDEX}'")
+
+    failures = 0
+    for source in sources:
+        user_id = source[len(SOURCE_PREFIX):]
+        if dry_run:
+            count = es_client.count(index=source)["count"]
+            logger.info(f"[dry run] Would copy {count} contacts from '{source}' for user {user_id}")
+            continue
+        try:
+            if not migrate_contacts_index(es_client, source, user_id, delete_source):
+                failures += 1
+        except Exception as e:
+            failures += 1
+            logger.error(f"Failed to migrate '{source}': {str(e)}")
+
+    if failures:
+        logger.error(f"{failures} of {len(sources)} indices were not migrated")
+    return failures == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only list the indices and their sizes")
+    parser.add_argument("--delete-source", action="store_true", help="Delete per-user indices after copying")
+    args = parser.parse_args()
+
+    if migrate(args.dry_run, args.delete_source):
+        logger.info("Contacts migration completed successfully")
+    else:
+        logger.error("Contacts migration finished with errors")
+        sys.exit(1)
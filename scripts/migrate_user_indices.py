@@ -0,0 +1,147 @@
+"""
+Reindex per-user training indices into the shared, routed user index.
+
+Every '<ES_USER_PREFIX>_<user_id>' index is copied into ES_USER_SHARED_INDEX
+with user_id set on each document and used as its routing value. Document
+counts are compared before a source index is deleted, and a filtered alias
+with the old index name can be created in its place.
+
+Run with the app stopped (or still in per_user mode), then set
+ES_USER_STORAGE_MODE=shared.
+
+Usage:
+    python scripts/migrate_user_indices.py --dry-run
+    python scripts/migrate_user_indices.py --delete-source --aliases
+"""
+import argparse
+import logging
+import os
+import sys
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.elasticsearch_manager import ElasticsearchManager
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+ES_HOST = os.environ.get("ELASTICSEARCH_HOST", "localhost")
+ES_PORT = int(os.environ.get("ELASTICSEARCH_PORT", "9200"))
+ES_USER = os.environ.get("ELASTICSEARCH_USER", "")
+ES_PASSWORD = os.environ.get("ELASTICSEARCH_PASSWORD", "")
+ES_GLOBAL_INDEX = os.environ.get("ES_GLOBAL_INDEX", "global_intent_training")
+ES_USER_PREFIX = os.environ.get("ES_USER_PREFIX", "user_intent_training")
+ES_USER_SHARED_INDEX = os.environ.get("ES_USER_SHARED_INDEX", ES_USER_PREFIX)
+
+def migrate_user_index(es_manager: ElasticsearchManager, source: str, user_id: str,
+                       delete_source: bool = False, create_alias: bool = False) -> bool:
+    """
+    Copy one per-user index into the shared index
+
+    Args:
+        es_manager: Manager in shared mode
+        source: Per-user index name
+        user_id: User the index belongs to
+        delete_source: Delete the per-user index once all documents were copied
+        create_alias: Create a filtered alias named like the deleted index
+
+    Returns:
+        True if every document was copied
+    """
+    es_client = es_manager.es_client
+    target = es_manager.shared_user_index
+    expected = es_client.count(index=source)["count"]
+    es_client.reindex(
+        body={
+            "source": {"index": source},
+            # Re-running after a partial migration must not duplicate documents
+            "conflicts": "proceed",
+            "dest": {"index": target, "routing": f"={user_id}", "op_type": "create"},
+            "script": {
+                "source": "ctx._source.user_id = params.user_id",
+                "params": {"user_id": user_id}
+            }
+        },
+        wait_for_completion=True,
+        refresh=True
+    )
+    copied = es_client.count(
+        index=target,
+        routing=user_id,
+        body={"query": {"term": {"user_id": user_id}}}
+    )["count"]
+    if copied < expected:
+        logger.error(f"Only {copied}/{expected} documents of '{source}' reached '{target}'; keeping source")
+        return False
+    logger.info(f"Copied {expected} documents from '{source}'")
+
+    if delete_source:
+        es_client.indices.delete(index=source)
+        logger.info(f"Deleted '{source}'")
+        if create_alias:
+            es_manager.ensure_user_alias(user_id)
+    return True
+
+def migrate(dry_run: bool = False, delete_source: bool = False, create_alias: bool = False) -> bool:
+    """Migrate every per-user index; returns True if all of them were copied"""
+    connection_params = {'host': ES_HOST, 'port': ES_PORT, 'scheme': 'http'}
+    if ES_USER and ES_PASSWORD:
+        connection_params['http_auth'] = (ES_USER, ES_PASSWORD)
+    es_manager = ElasticsearchManager(
+        es_host=ES_HOST,
+        es_port=ES_PORT,
+        global_index=ES_GLOBAL_INDEX,
+        user_index_prefix=ES_USER_PREFIX,
+        es_auth=connection_params,
+        user_storage_mode="shared",
+        shared_user_index=ES_USER_SHARED_INDEX,
+        user_aliases=create_alias
+    )
+
+    # Aliases created by earlier runs resolve to the shared index, which is skipped
+    sources = sorted(
+        name for name in es_manager.es_client.indices.get(index=f"{ES_USER_PREFIX}_*", expand_wildcards="open")
+        if name != es_manager.shared_user_index
+    )
+    logger.info(f"Found {len(sources)} per-user indices to migrate into '{es_manager.shared_user_index}'")
+
+    failures = 0
+    for source in sources:
+        user_id = source[len(ES_USER_PREFIX) + 1:]
+        if dry_run:
+            count = es_manager.es_client.count(index=source)["count"]
+            logger.info(f"[dry run] Would copy {count} documents from '{source}' for user {user_id}")
+            continue
+        try:
+            if not migrate_user_index(es_manager, source, user_id, delete_source, create_alias):
+                failures += 1
+        except Exception as e:
+            failures += 1
+            logger.error(f"Failed to migrate '{source}': {str(e)}")
+
+    if failures:
+        logger.error(f"{failures} of {len(sources)} indices were not migrated")
+    return failures == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only list the indices and their sizes")
+    parser.add_argument("--delete-source", action="store_true", help="Delete per-user indices after copying")
+    parser.add_argument("--aliases", action="store_true",
+                        help="Create a filtered alias for each deleted index (requires --delete-source)")
+    args = parser.parse_args()
+
+    if migrate(args.dry_run, args.delete_source, args.aliases):
+        logger.info("User index migration completed successfully")
+    else:
+        logger.error("User index migration finished with errors")
+        sys.exit(1)
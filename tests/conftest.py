@@ -0,0 +1,24 @@
+import os
+import sys
+import pytest
+
+# Tests import the app package from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+@pytest.fixture
+def fake_es():
+    """In-memory Elasticsearch client shared by every manager a test creates"""
+    from tests.fakes import FakeElasticsearch
+    return FakeElasticsearch()
+
+@pytest.fixture
+def make_es_manager(fake_es, monkeypatch):
+    """Factory for ElasticsearchManagers connected to fake_es (one per simulated worker)"""
+    from app.services import elasticsearch_manager
+
+    monkeypatch.setattr(elasticsearch_manager, "Elasticsearch", lambda hosts: fake_es)
+
+    def make(**kwargs):
+        return elasticsearch_manager.ElasticsearchManager(**kwargs)
+    return make
@@ -0,0 +1,199 @@
+import copy
+import itertools
+import json
+from typing import Any, Dict, List, Optional
+from elastic_transport import SerializerCollection
+from elasticsearch import NotFoundError
+
+class FakeResponse(dict):
+    """Response that also exposes .body, as elasticsearch.helpers expects"""
+
+    @property
+    def body(self) -> Dict[str, Any]:
+        return self
+
+class FakeTransport:
+    serializers = SerializerCollection()
+
+class FakeIndices:
+    """The part of the indices API the services use"""
+
+    def __init__(self, es: "FakeElasticsearch"):
+        self.es = es
+        self.aliases: Dict[str, Dict[str, Any]] = {}
+
+    def exists(self, index: str) -> bool:
+        return index in self.es.docs
+
+    def create(self, index: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        self.es.docs.setdefault(index, {})
+        return {"acknowledged": True}
+
+    def put_alias(self, index: str, name: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        self.aliases[name] = {"index": index, **(body or {})}
+        return {"acknowledged": True}
+
+class FakeElasticsearch:
+    """
+    In-memory stand-in for the Elasticsearch client
+
+    Stores documents per index and records every call in `calls`. Searches
+    return no hits unless `search_hits` is set, or, with `search_stored` set,
+    evaluate term queries against the stored documents (sort, size and
+    search_after on ascending sorts included). Stored-document msearches
+    answer a missing index with an error item unless ignore_unavailable is set.
+    """
+
+    def __init__(self):
+        self.docs: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.indices = FakeIndices(self)
+        self.transport = FakeTransport()
+        self.calls: List[tuple] = []
+        self.search_hits: List[Dict[str, Any]] = []
+        self.search_stored = False
+        self._ids = itertools.count(1)
+
+    def options(self, **kwargs) -> "FakeElasticsearch":
+        return self
+
+    def ping(self) -> bool:
+        return True
+
+    def count_calls(self, name: str) -> int:
+        return sum(1 for call in self.calls if call[0] == name)
+
+    def index(self, index: str, body: Dict[str, Any], id: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        self.calls.append(("index", index, id))
+        doc_id = id or str(next(self._ids))
+        self.docs.setdefault(index, {})[doc_id] = copy.deepcopy(body)
+        return {"_id": doc_id, "result": "created"}
+
+    def get(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        self.calls.append(("get", index, id))
+        if id not in self.docs.get(index, {}):
+            raise NotFoundError(404, "not_found", {"found": False})
+        return {"_id": id, "found": True, "_source": copy.deepcopy(self.docs[index][id])}
+
+    def mget(self, index: str, ids: List[str], **kwargs) -> Dict[str, Any]:
+        self.calls.append(("mget", index, tuple(ids)))
+        stored = self.docs.get(index, {})
+        return {"docs": [
+            {"_id": doc_id, "found": True, "_source": copy.deepcopy(stored[doc_id])}
+            if doc_id in stored else {"_id": doc_id, "found": False}
+            for doc_id in ids
+        ]}
+
+    def update(self, index: str, id: str, script: Dict[str, Any], upsert: Dict[str, Any],
+               **kwargs) -> Dict[str, Any]:
+        # Only the counter increment used for prompt versions is supported
+        self.calls.append(("update", index, id))
+        stored = self.docs.setdefault(index, {})
+        if id in stored:
+            stored[id]["version"] += 1
+        else:
+            stored[id] = copy.deepcopy(upsert)
+        return {"_id": id, "get": {"_source": copy.deepcopy(stored[id])}}
+
+    def delete(self, index: str, id: str, **kwargs) -> Dict[str, Any]:
+        self.calls.append(("delete", index, id))
+        self.docs.get(index, {}).pop(id, None)
+        return {"result": "deleted"}
+
+    def bulk(self, body: Optional[List[Any]] = None, operations: Optional[List[Any]] = None,
+             **kwargs) -> Dict[str, Any]:
+        # elasticsearch.helpers.bulk sends serialized lines as operations
+        body = [json.loads(line) if isinstance(line, (str, bytes)) else line for line in (body or operations)]
+        self.calls.append(("bulk", len(body)))
+        items = []
+        lines = iter(body)
+        for action in lines:
+            op, meta = next(iter(action.items()))
+            index, doc_id = meta.get("_index"), meta.get("_id")
+            if op == "delete":
+                self.docs.get(index, {}).pop(doc_id, None)
+            else:
+                doc_id = doc_id or str(next(self._ids))
+                self.docs.setdefault(index, {})[doc_id] = copy.deepcopy(next(lines))
+            items.append({op: {"_index": index, "_id": doc_id, "status": 200}})
+        return FakeResponse({"errors": False, "items": items})
+
+    def delete_by_query(self, index: str, body: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        self.calls.append(("delete_by_query", index))
+        stored = self.docs.get(index, {})
+        doomed = [doc_id for doc_id, doc in stored.items() if _matches(doc_id, doc, body.get("query", {}))]
+        for doc_id in doomed:
+            del stored[doc_id]
+        return {"deleted": len(doomed)}
+
+    def search(self, index: str, body: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        self.calls.append(("search", index))
+        if "scroll" in kwargs:
+            # Scans (elasticsearch.helpers.scan) get every stored document in one page
+            hits = [{"_id": doc_id, "_source": copy.deepcopy(doc)} for doc_id, doc in self.docs.get(index, {}).items()]
+            return {"_scroll_id": "scroll", "_shards": {"total": 1, "successful": 1, "skipped": 0},
+                    "hits": {"hits": hits}}
+        if self.search_stored:
+            return {"hits": {"hits": self._search_stored(index, body or {})}}
+        return {"hits": {"hits": copy.deepcopy(self.search_hits)}}
+
+    def _search_stored(self, index: str, body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        stored = self.docs.get(index, {})
+        specs = []
+        for spec in body.get("sort", []):
+            (field, order), = spec.items()
+            specs.append((field, order.get("order", "asc") if isinstance(order, dict) else order))
+        hits = [
+            {"_id": doc_id, "_source": copy.deepcopy(doc), "sort": [doc.get(field) for field, _ in specs]}
+            for doc_id, doc in stored.items() if _matches(doc_id, doc, body.get("query", {}))
+        ]
+        # Stable sorts from the last key to the first; missing values go last
+        for position, (_, order) in reversed(list(enumerate(specs))):
+            present = [hit for hit in hits if hit["sort"][position] is not None]
+            present.sort(key=lambda hit: hit["sort"][position], reverse=order == "desc")
+            hits = present + [hit for hit in hits if hit["sort"][position] is None]
+        if "search_after" in body:
+            hits = [hit for hit in hits if hit["sort"] > body["search_after"]]
+        if body.get("_source") is False:
+            for hit in hits:
+                del hit["_source"]
+        return hits[:body.get("size", 10)]
+
+    def count(self, index: str, body: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        self.calls.append(("count", index))
+        stored = self.docs.get(index, {})
+        query = (body or {}).get("query", {})
+        return {"count": sum(1 for doc_id, doc in stored.items() if _matches(doc_id, doc, query))}
+
+    def scroll(self, scroll_id: str, **kwargs) -> Dict[str, Any]:
+        return {"_scroll_id": scroll_id, "_shards": {"total": 1, "successful": 1, "skipped": 0},
+                "hits": {"hits": []}}
+
+    def clear_scroll(self, scroll_id: str, **kwargs) -> Dict[str, Any]:
+        return {"succeeded": True}
+
+    def msearch(self, body: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        self.calls.append(("msearch", len(body) // 2, copy.deepcopy(body[::2])))
+        if not self.search_stored:
+            return {"responses": [{"hits": {"hits": copy.deepcopy(self.search_hits)}} for _ in body[1::2]]}
+        responses = []
+        for header, search in zip(body[::2], body[1::2]):
+            if header["index"] not in self.docs and not header.get("ignore_unavailable"):
+                responses.append({"error": {"type": "index_not_found_exception", "index": header["index"]},
+                                  "status": 404})
+            else:
+                responses.append({"hits": {"hits": self._search_stored(header["index"], search)}})
+        return {"responses": responses}
+
+def _matches(doc_id: str, doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """Evaluate the term, ids and bool queries the services send with deletes"""
+    if not query or "match_all" in query:
+        return True
+    if "term" in query:
+        (field, value), = query["term"].items()
+        return doc.get(field) == value
+    if "ids" in query:
+        return doc_id in query["ids"]["values"]
+    clauses = query["bool"]
+    required = clauses.get("filter", []) + clauses.get("must", [])
+    return (all(_matches(doc_id, doc, clause) for clause in required)
+            and not any(_matches(doc_id, doc, clause) for clause in clauses.get("must_not", [])))
@@ -0,0 +1,45 @@
+import threading
+import time
+from app.services.biller_catalog import BillerCatalog
+
+BILLS = [{"title": "Airtel", "category_id": 1}, {"title": "BESCOM", "category_id": 2}]
+
+class Source:
+    def __init__(self):
+        self.version = 1
+        self.signature_calls = 0
+
+    def signature(self):
+        self.signature_calls += 1
+        time.sleep(0.02)
+        return self.version
+
+    def load(self):
+        return BILLS[:self.version]
+
+def test_changed_sources_are_reloaded_once_per_interval():
+    source = Source()
+    catalog = BillerCatalog(loader=source.load, signature=source.signature, refresh_interval=60)
+    assert [bill["title"] for bill in catalog.all()] == ["Airtel"]
+
+    source.version = 2
+    assert catalog.refresh_if_changed() is False
+    catalog._last_check -= 60
+    assert catalog.refresh_if_changed() is True
+    assert len(catalog.all()) == 2
+
+def test_concurrent_callers_check_the_source_once():
+    source = Source()
+    catalog = BillerCatalog(loader=source.load, signature=source.signature, refresh_interval=60)
+    catalog._last_check -= 60
+    checks = source.signature_calls
+
+    # Every thread passes the interval check before any of them gets the lock
+    threads = [threading.Thread(target=catalog.refresh_if_changed) for _ in range(8)]
+    with catalog._refresh_lock:
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+    assert source.signature_calls == checks + 1
@@ -0,0 +1,44 @@
+from app.services.bulk_indexer import BulkIndexer
+
+def make_indexer(make_es_manager, **kwargs):
+    manager = make_es_manager(**kwargs.pop("manager_options", {}))
+    indexer = BulkIndexer(manager, flush_interval=0.01, **kwargs)
+    indexer.start()
+    return manager, indexer
+
+def test_batches_are_written_with_one_bulk_request(make_es_manager, fake_es):
+    manager, indexer = make_indexer(make_es_manager)
+    for i in range(5):
+        indexer.submit(manager.global_index, {"query": f"q{i}"})
+    assert indexer.flush()
+    indexer.stop()
+    assert len(fake_es.docs[manager.global_index]) == 5
+    assert indexer.stats()["indexed"] == 5
+
+def test_known_indices_are_bounded(make_es_manager, fake_es):
+    manager, indexer = make_indexer(make_es_manager, max_known_indices=2)
+    for user in ("a", "b", "c", "d"):
+        indexer.submit(f"user_intent_training_{user}", {"query": "q"})
+    assert indexer.flush()
+    indexer.stop()
+    assert indexer.stats()["known_indices"] == 2
+    assert all(f"user_intent_training_{user}" in fake_es.docs for user in ("a", "b", "c", "d"))
+
+def test_routing_values_are_prepared_once_per_batch(make_es_manager, monkeypatch):
+    manager, indexer = make_indexer(
+        make_es_manager, manager_options={"user_storage_mode": "shared", "user_aliases": True}
+    )
+    aliased = []
+    monkeypatch.setattr(manager, "ensure_user_alias", aliased.append)
+    indexer.stop()
+    batch = [(manager.shared_user_index, {"query": f"q{i}", "user_id": user}, user)
+             for i, user in enumerate(["alice", "bob", "alice", "alice", "bob"])]
+    indexer._write(batch)
+    assert aliased == ["alice", "bob"]
+
+def test_full_queue_drops_documents(make_es_manager):
+    manager = make_es_manager()
+    indexer = BulkIndexer(manager, max_queue_size=1)
+    assert indexer.submit(manager.global_index, {"query": "q1"})
+    assert not indexer.submit(manager.global_index, {"query": "q2"})
+    assert indexer.stats()["dropped"] == 1
@@ -0,0 +1,55 @@
+import pytest
+from app.utils import cache as cache_module
+from app.utils.cache import LRUCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+def test_least_recently_used_entries_are_evicted():
+    evicted = []
+    cache = LRUCache(maxsize=2, on_evict=lambda key, value: evicted.append((key, value)))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert evicted == [("b", 2)]
+    assert cache.stats()["evictions"] == 1
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = LRUCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    clock[0] += 59
+    assert cache.get("a") == 1
+    clock[0] += 1
+    assert "a" not in cache
+    assert cache.get("a", "missing") == "missing"
+    assert cache.stats()["expirations"] == 1
+
+def test_entries_without_ttl_never_expire(clock):
+    cache = LRUCache(maxsize=10)
+    cache.set("a", 1)
+    clock[0] += 10 ** 6
+    assert cache.get("a") == 1
+
+def test_pop_and_clear():
+    cache = LRUCache(maxsize=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "missing") == "missing"
+    cache.clear()
+    assert len(cache) == 0
+
+def test_stats_report_the_hit_rate():
+    cache = LRUCache(maxsize=10)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+    assert stats["size"] == 1
@@ -0,0 +1,121 @@
+import asyncio
+import time
+import pytest
+from elastic_transport import ApiResponseMeta, HttpHeaders, NodeConfig
+from elasticsearch import ApiError
+from elasticsearch.exceptions import ConnectionError
+from app.services.elasticsearch_manager import _classify_es_error
+from app.utils import circuit_breaker
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.deadline import deadline_scope
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic for the breaker module"""
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+def fail():
+    raise RuntimeError("down")
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+
+def api_error(status):
+    meta = ApiResponseMeta(status=status, http_version="1.1", headers=HttpHeaders(), duration=0.0,
+                           node=NodeConfig("http", "localhost", 9200))
+    return ApiError("error", meta, {})
+
+def test_consecutive_failures_open_the_circuit(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, jitter=0)
+    trip(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.call(lambda: "ok")
+    assert excinfo.value.retry_after == pytest.approx(10.0)
+    assert breaker.stats()["rejected"] == 1
+
+def test_a_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2)
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.call(lambda: "ok") == "ok"
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_half_open_success_closes_the_circuit(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=5, jitter=0)
+    trip(breaker)
+    clock[0] += 5
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_half_open_failure_reopens_with_a_doubled_timeout(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=5, max_recovery_timeout=15, jitter=0)
+    trip(breaker)
+    clock[0] += 5
+    trip(breaker)
+    clock[0] += 9.9
+    assert breaker.state == CircuitBreaker.OPEN
+    clock[0] += 0.1
+    trip(breaker)
+    # Capped by max_recovery_timeout
+    clock[0] += 15
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+def test_half_open_allows_limited_trial_calls(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=5, jitter=0)
+    trip(breaker)
+    clock[0] += 5
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+def test_ignored_errors_free_the_trial_slot(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=5, jitter=0,
+                             classify_error=lambda e: CircuitBreaker.IGNORE)
+    breaker.record_failure()
+    clock[0] += 5
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_errors_classified_as_success_keep_the_circuit_closed(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, classify_error=lambda e: CircuitBreaker.SUCCESS)
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_async_calls_are_counted(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1)
+
+    async def failing():
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(breaker.call_async(failing))
+    assert breaker.state == CircuitBreaker.OPEN
+
+@pytest.mark.parametrize("status, outcome", [
+    (404, CircuitBreaker.SUCCESS),
+    (400, CircuitBreaker.SUCCESS),
+    (429, CircuitBreaker.FAILURE),
+    (503, CircuitBreaker.FAILURE)
+])
+def test_elasticsearch_api_errors(status, outcome):
+    assert _classify_es_error(api_error(status)) == outcome
+
+def test_elasticsearch_connection_errors_are_failures():
+    assert _classify_es_error(ConnectionError("refused")) == CircuitBreaker.FAILURE
+
+def test_elasticsearch_timeouts_past_the_request_deadline_are_ignored():
+    with deadline_scope(0.001):
+        time.sleep(0.002)
+        assert _classify_es_error(ConnectionError("timed out")) == CircuitBreaker.IGNORE
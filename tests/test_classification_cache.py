@@ -0,0 +1,62 @@
+from app.services.classification_cache import ClassificationCache
+from app.services.model_registry import ModelRegistry
+
+RESULT = {"intent": "PAY_BILL", "confidence": 0.95, "extracted_data": {"biller_name": "Airtel"}}
+
+class FakeModel:
+    def __init__(self, system_prompt):
+        self.system_prompt = system_prompt
+
+def test_keys_normalize_queries_and_separate_versions_and_contexts():
+    assert ClassificationCache.make_key("Pay  Airtel bill", "1") == ClassificationCache.make_key("pay airtel bill", "1")
+    assert ClassificationCache.make_key("pay airtel bill", "1") != ClassificationCache.make_key("pay airtel bill", "2")
+    assert (ClassificationCache.make_key("pay rahul", "1", {"contact_names": ["Rahul"]})
+            != ClassificationCache.make_key("pay rahul", "1", {"contact_names": ["Rahul S"]}))
+
+def test_callers_get_copies():
+    cache = ClassificationCache()
+    key = cache.make_key("pay airtel bill", "1")
+    cache.set(key, RESULT)
+    cache.get(key)["extracted_data"]["biller_name"] = "changed"
+    assert cache.get(key) == RESULT
+
+def test_error_results_are_not_cached():
+    cache = ClassificationCache()
+    key = cache.make_key("pay airtel bill", "1")
+    cache.set(key, {"intent": "OTHER", "error": "timeout"})
+    assert cache.get(key) is None
+
+def test_invalidate_drops_local_entries():
+    cache = ClassificationCache()
+    key = cache.make_key("pay airtel bill", "1")
+    cache.set(key, RESULT)
+    cache.invalidate()
+    assert cache.get(key) is None
+
+def test_results_cached_by_another_worker_are_retired_by_a_version_bump(make_es_manager):
+    # Each worker has its own manager, registry and cache; only Elasticsearch is shared
+    writer = make_es_manager()
+    reader = make_es_manager(version_check_interval=0)
+    registry = ModelRegistry(reader, model_factory=FakeModel)
+    registry.on_global_stale = registry.refresh_global
+    registry.refresh_global()
+    cache = ClassificationCache()
+
+    key = cache.make_key("pay airtel bill", registry.for_user(None).version)
+    cache.set(key, RESULT)
+    assert cache.get(cache.make_key("pay airtel bill", registry.for_user(None).version)) == RESULT
+
+    writer.save_example("pay airtel bill", {"intent": "PAY_BILL"}, is_global=True)
+    # The first request after the change notices the newer version and triggers the rebuild
+    registry.for_user(None)
+    assert cache.get(cache.make_key("pay airtel bill", registry.for_user(None).version)) is None
+
+def test_stale_entries_expire_after_the_ttl(monkeypatch):
+    import app.utils.cache as cache_module
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = ClassificationCache(ttl=600)
+    key = cache.make_key("pay airtel bill", "1")
+    cache.set(key, RESULT)
+    now[0] += 601
+    assert cache.get(key) is None
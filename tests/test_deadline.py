@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.utils.deadline import (
+    DeadlineExceeded, DeadlineStats, bounded, check_deadline, current_deadline, deadline_scope, resolve_timeout
+)
+
+class OptionsClient:
+    """Records the options a bounded client was created with"""
+
+    def __init__(self):
+        self.options_calls = []
+
+    def options(self, **kwargs):
+        self.options_calls.append(kwargs)
+        return self
+
+def test_scope_sets_and_restores_the_deadline():
+    assert current_deadline() is None
+    with deadline_scope(5) as deadline:
+        assert current_deadline() is deadline
+        assert 0 < deadline.remaining() <= 5
+        with deadline_scope(None):
+            assert current_deadline() is None
+        assert current_deadline() is deadline
+    assert current_deadline() is None
+
+def test_expired_deadline_raises():
+    with deadline_scope(0.001) as deadline:
+        time.sleep(0.002)
+        assert deadline.expired
+        assert deadline.remaining() == 0.0
+        with pytest.raises(DeadlineExceeded):
+            check_deadline("Gemini call")
+
+def test_deadline_exceeded_is_a_timeout_error():
+    assert issubclass(DeadlineExceeded, TimeoutError)
+
+def test_other_threads_do_not_see_the_deadline():
+    seen = []
+    with deadline_scope(5):
+        thread = threading.Thread(target=lambda: seen.append(current_deadline()))
+        thread.start()
+        thread.join()
+    assert seen == [None]
+
+def test_tasks_keep_their_own_deadlines():
+    async def handler(timeout):
+        with deadline_scope(timeout):
+            await asyncio.sleep(0.01)
+            return current_deadline().timeout
+
+    async def main():
+        return await asyncio.gather(handler(1), handler(2))
+    assert asyncio.run(main()) == [1, 2]
+
+def test_bounded_clients_time_out_at_the_deadline():
+    client = OptionsClient()
+    assert bounded(client) is client
+    assert client.options_calls == []
+    with deadline_scope(2):
+        bounded(client)
+    assert 0 < client.options_calls[0]["request_timeout"] <= 2
+
+def test_bounded_raises_once_the_deadline_passed():
+    with deadline_scope(0.001):
+        time.sleep(0.002)
+        with pytest.raises(DeadlineExceeded):
+            bounded(OptionsClient())
+
+@pytest.mark.parametrize("timeout_ms, expected", [
+    (None, 8.0),
+    (500, 0.5),
+    (60000, 30.0)
+])
+def test_resolve_timeout(timeout_ms, expected):
+    assert resolve_timeout(timeout_ms, default=8.0, maximum=30.0) == expected
+
+@pytest.mark.parametrize("timeout_ms", [0, -5, "100", True])
+def test_resolve_timeout_rejects_invalid_values(timeout_ms):
+    with pytest.raises(ValueError):
+        resolve_timeout(timeout_ms, default=8.0, maximum=30.0)
+
+def test_stats_count_degraded_requests_and_fallbacks():
+    stats = DeadlineStats(default_timeout=8.0)
+    stats.record([])
+    stats.record(["contacts_skipped", "global_model"])
+    result = stats.stats()
+    assert result["requests"] == 2
+    assert result["degraded"] == 1
+    assert result["fallbacks"]["global_model"] == 1
+    assert result["fallbacks"]["default_result"] == 0
@@ -0,0 +1,36 @@
+import logging
+from app.services import enrichment
+from app.services.contact_index import ContactStore
+from app.services.enrichment import build_ai_context, select_contact_candidates
+
+def make_store(names):
+    return ContactStore([{"name": name} for name in names])
+
+def test_token_estimates_are_skipped_unless_debug_logging(monkeypatch, caplog):
+    calls = []
+    monkeypatch.setattr(enrichment, "estimate_tokens", lambda text: calls.append(text) or 0)
+    store = make_store(["Rahul Sharma", "Asha Verma"])
+
+    with caplog.at_level(logging.INFO, logger=enrichment.logger.name):
+        select_contact_candidates(store, "pay rahul 500")
+    assert calls == []
+
+    with caplog.at_level(logging.DEBUG, logger=enrichment.logger.name):
+        select_contact_candidates(store, "pay rahul 500")
+    assert len(calls) == 2
+
+def test_candidates_resemble_the_query():
+    contact_names, candidate_names = select_contact_candidates(
+        make_store(["Rahul Sharma", "Asha Verma"]), "pay rahul 500"
+    )
+    assert sorted(contact_names) == ["Asha Verma", "Rahul Sharma"]
+    assert candidate_names == ["Rahul Sharma"]
+
+def test_missing_contacts_select_nothing():
+    assert select_contact_candidates(None, "pay rahul 500") == ([], [])
+
+def test_context_is_copied_before_adding_candidates():
+    context = {"amount": 500}
+    ai_context = build_ai_context(context, ["Rahul Sharma"])
+    assert ai_context == {"amount": 500, "contact_names": ["Rahul Sharma"]}
+    assert context == {"amount": 500}
@@ -0,0 +1,38 @@
+from app.services.example_selector import ExampleSelector
+
+EXAMPLES = [
+    {"query": "pay 500 to Rahul", "intent": "PAY_TO_PERSON", "extracted_data": {"payee_name": "Rahul"}},
+    {"query": "Pay 500 to rahul", "intent": "PAY_TO_PERSON", "extracted_data": {"payee_name": "duplicate"}},
+    {"query": "send money to Asha", "intent": "PAY_TO_PERSON", "extracted_data": {"payee_name": "Asha"}},
+    {"query": "pay my electricity bill", "intent": "PAY_BILL", "extracted_data": {"category_name": "ELECTRICITY"}},
+    {"query": "pay airtel postpaid bill", "intent": "PAY_BILL", "extracted_data": {"biller_name": "Airtel"}},
+    {"query": "show my cashback", "intent": "CHECK_REWARDS", "extracted_data": {"reward_type": "cashback"}}
+]
+
+def test_examples_with_the_same_normalized_query_are_kept_once():
+    selector = ExampleSelector(EXAMPLES)
+    assert len(selector.examples) == 5
+    assert selector.examples[0]["extracted_data"]["payee_name"] == "Rahul"
+
+def test_most_similar_examples_come_first():
+    selector = ExampleSelector(EXAMPLES, k=2)
+    selected = selector.select("pay my gas bill")
+    assert len(selected) == 2
+    assert {example["intent"] for example in selected} == {"PAY_BILL"}
+
+def test_one_example_per_intent_when_nothing_is_similar():
+    selector = ExampleSelector(EXAMPLES, k=6, min_similarity=0.99)
+    selected = selector.select("zzz")
+    assert [example["intent"] for example in selected] == ["PAY_TO_PERSON", "PAY_BILL", "CHECK_REWARDS"]
+
+def test_k_limits_the_selection():
+    selector = ExampleSelector(EXAMPLES, k=6)
+    assert selector.select("pay", k=0) == []
+    assert len(selector.select("pay my bill", k=1)) == 1
+
+def test_empty_pools_select_nothing():
+    assert ExampleSelector([]).select("pay my bill") == []
+
+def test_render_numbers_the_selected_examples():
+    rendered = ExampleSelector(EXAMPLES, k=1).render("show my cashback")
+    assert rendered.startswith('1. "show my cashback" -> {"intent":"CHECK_REWARDS"')
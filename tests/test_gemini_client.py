@@ -0,0 +1,64 @@
+import threading
+import time
+import pytest
+from google.api_core import exceptions as google_exceptions
+from app.services.gemini_client import (
+    GeminiClient, GeminiTimeoutError, GeminiUnavailableError, _classify_gemini_error
+)
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.deadline import DeadlineExceeded, deadline_scope
+
+class SlowModel:
+    """Model whose calls take a fixed time"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def generate_content(self, message):
+        time.sleep(self.delay)
+        return "ok"
+
+def test_deadline_exceeded_is_ignored_by_the_breaker():
+    assert _classify_gemini_error(DeadlineExceeded("request deadline")) == CircuitBreaker.IGNORE
+
+@pytest.mark.parametrize("error", [
+    GeminiTimeoutError("slow"),
+    google_exceptions.TooManyRequests("quota"),
+    google_exceptions.ServiceUnavailable("down"),
+    ConnectionError("reset")
+])
+def test_gemini_outages_count_as_failures(error):
+    assert _classify_gemini_error(error) == CircuitBreaker.FAILURE
+
+def test_invalid_request_counts_as_success():
+    assert _classify_gemini_error(google_exceptions.InvalidArgument("bad")) == CircuitBreaker.SUCCESS
+
+def test_deadline_bounded_timeouts_leave_the_circuit_closed():
+    client = GeminiClient(call_timeout=5.0, failure_threshold=1)
+    for _ in range(3):
+        with deadline_scope(0.05):
+            with pytest.raises(DeadlineExceeded):
+                client.generate(SlowModel(0.3), "hello")
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    assert client.stats()["timeouts"] == 0
+
+def test_call_timeout_opens_the_circuit():
+    client = GeminiClient(call_timeout=0.05, failure_threshold=1, recovery_timeout=30.0)
+    with pytest.raises(GeminiTimeoutError):
+        client.generate(SlowModel(0.3), "hello")
+    assert client.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(GeminiUnavailableError):
+        client.generate(SlowModel(0.0), "hello")
+    assert client.stats()["short_circuited"] == 1
+
+def test_rejection_within_the_callers_deadline_leaves_the_circuit_closed():
+    client = GeminiClient(max_in_flight=1, queue_timeout=1.0, call_timeout=5.0, failure_threshold=1)
+    holder = threading.Thread(target=client.generate, args=(SlowModel(0.3), "first"))
+    holder.start()
+    time.sleep(0.05)
+    with deadline_scope(0.05):
+        with pytest.raises(GeminiUnavailableError):
+            client.generate(SlowModel(0.0), "second")
+    holder.join()
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    assert client.stats()["rejected"] == 1
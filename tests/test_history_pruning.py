@@ -0,0 +1,84 @@
+import time
+import pytest
+from app.services import vector_store
+from app.services.vector_store import INDEX_NAME, HistoryPruner, VectorIndex, prune_old_messages, store_intent
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def add_messages(fake_es, index, user_id, count):
+    for i in range(count):
+        doc_id = f"{user_id}-{i}"
+        fake_es.docs.setdefault(INDEX_NAME, {})[doc_id] = {
+            "user_id": user_id, "query": f"query {i}", "timestamp": f"2025-01-01T00:00:{i:02d}"
+        }
+        index.add(user_id, doc_id, f"query {i}")
+
+@pytest.fixture
+def pruner():
+    pruner = HistoryPruner(max_messages=5, slack=2)
+    yield pruner
+    pruner.stop()
+
+@pytest.fixture
+def history_es(fake_es):
+    fake_es.search_stored = True
+    return fake_es
+
+def test_oldest_messages_are_deleted_in_pages(history_es, monkeypatch):
+    monkeypatch.setattr(vector_store, "PRUNE_PAGE_SIZE", 2)
+    index = VectorIndex(dim=64)
+    add_messages(history_es, index, "alice", 10)
+    add_messages(history_es, index, "bob", 3)
+
+    assert prune_old_messages(history_es, "alice", max_messages=5, index=index) == (10, 5)
+
+    kept = [f"alice-{i}" for i in range(5, 10)]
+    assert sorted(doc_id for doc_id in history_es.docs[INDEX_NAME] if doc_id.startswith("alice")) == kept
+    assert sorted(index.ids("alice")) == kept
+    assert len(index.ids("bob")) == 3
+    assert history_es.count_calls("search") == 3
+    assert history_es.count_calls("bulk") == 3
+
+def test_store_intent_writes_once_and_prunes_in_the_background(history_es, pruner):
+    index = VectorIndex(dim=64)
+    # A user's first write is counted in the background, later ones only in memory
+    store_intent(history_es, "alice", "query 0", {"intent": "PAY_BILL"}, index=index, pruner=pruner)
+    wait_until(lambda: pruner.stats()["tracked_users"] == 1)
+    for i in range(1, 7):
+        assert store_intent(history_es, "alice", f"query {i}", {"intent": "PAY_BILL"}, index=index, pruner=pruner)
+    assert history_es.count_calls("index") == 7
+    assert history_es.count_calls("count") == 1
+    assert history_es.count_calls("bulk") == 0
+    assert len(index.ids("alice")) == 7
+
+    # Past max_messages + slack, the oldest messages are pruned from both stores
+    store_intent(history_es, "alice", "query 7", {"intent": "PAY_BILL"}, index=index, pruner=pruner)
+    wait_until(lambda: pruner.stats()["deleted"] == 3)
+    assert len(history_es.docs[INDEX_NAME]) == 5
+    assert sorted(index.ids("alice")) == sorted(history_es.docs[INDEX_NAME])
+
+def test_writes_within_the_slack_are_not_pruned(history_es, pruner):
+    index = VectorIndex(dim=64)
+    add_messages(history_es, index, "alice", 5)
+    assert pruner.prune(history_es, "alice", index=index) == 0
+
+    pruner.record(history_es, "alice", index=index)
+    pruner.record(history_es, "alice", index=index)
+    assert pruner.stats()["pending"] == 0
+    assert history_es.count_calls("count") == 1
+
+def test_failed_prune_forgets_the_count(history_es, pruner, monkeypatch):
+    add_messages(history_es, VectorIndex(dim=64), "alice", 5)
+    pruner.prune(history_es, "alice")
+    assert pruner.stats()["tracked_users"] == 1
+
+    def unavailable(**kwargs):
+        raise ConnectionError("cluster down")
+    monkeypatch.setattr(history_es, "count", unavailable)
+    assert pruner.prune(history_es, "alice") == 0
+    assert pruner.stats()["errors"] == 1
+    assert pruner.stats()["tracked_users"] == 0
@@ -0,0 +1,79 @@
+import threading
+import time
+from app.services.model_refresh import RefreshScheduler
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+class BlockingRefresh:
+    """Refresh function whose first call waits until released and may fail"""
+
+    def __init__(self, fail_first=False):
+        self.calls = 0
+        self.fail_first = fail_first
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls == 1:
+            self.started.set()
+            self.release.wait(2.0)
+            if self.fail_first:
+                raise RuntimeError("elasticsearch unavailable")
+
+def test_a_burst_of_requests_is_served_by_one_refresh():
+    calls = []
+    scheduler = RefreshScheduler(lambda: calls.append(1), debounce=0.02)
+    assert scheduler.request() is True
+    assert not any(scheduler.request() for _ in range(9))
+
+    wait_until(lambda: scheduler.stats()["refreshes"] == 1)
+    time.sleep(0.05)
+    assert calls == [1]
+    assert scheduler.stats()["coalesced"] == 9
+
+def test_requests_during_a_refresh_schedule_exactly_one_follow_up():
+    refresh = BlockingRefresh()
+    scheduler = RefreshScheduler(refresh, debounce=0.01)
+    scheduler.request()
+    assert refresh.started.wait(2.0)
+
+    assert scheduler.request() is True
+    assert scheduler.request() is False
+    assert scheduler.stats()["running"] is True
+    refresh.release.set()
+
+    wait_until(lambda: scheduler.stats()["refreshes"] == 2)
+    time.sleep(0.05)
+    assert refresh.calls == 2
+
+def test_a_failed_refresh_is_counted_and_keeps_the_pending_request():
+    refresh = BlockingRefresh(fail_first=True)
+    scheduler = RefreshScheduler(refresh, debounce=0.01)
+    scheduler.request()
+    assert refresh.started.wait(2.0)
+    scheduler.request()
+    refresh.release.set()
+
+    wait_until(lambda: scheduler.stats()["refreshes"] == 1)
+    stats = scheduler.stats()
+    assert stats["failures"] == 1
+    assert stats["pending"] is False
+    assert refresh.calls == 2
+
+def test_cancel_drops_a_scheduled_refresh():
+    calls = []
+    scheduler = RefreshScheduler(lambda: calls.append(1), debounce=0.05)
+    scheduler.request()
+    scheduler.cancel()
+    assert scheduler.stats()["pending"] is False
+    time.sleep(0.1)
+    assert calls == []
+
+    # The next request schedules a new refresh
+    assert scheduler.request() is True
+    wait_until(lambda: calls == [1])
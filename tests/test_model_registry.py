@@ -0,0 +1,81 @@
+import pytest
+from app.services.model_registry import ModelRegistry
+from app.utils.circuit_breaker import CircuitOpenError
+
+class FakeModel:
+    def __init__(self, system_prompt):
+        self.system_prompt = system_prompt
+
+def make_registry(es_manager, **kwargs):
+    registry = ModelRegistry(es_manager, model_factory=FakeModel, **kwargs)
+    registry.refresh_global()
+    return registry
+
+def test_global_model_is_reported_stale_once_per_version(make_es_manager):
+    writer = make_es_manager()
+    reader = make_es_manager(version_check_interval=0)
+    requests = []
+    registry = make_registry(reader, on_global_stale=lambda: requests.append(1))
+
+    registry.for_user(None)
+    assert requests == []
+
+    writer.bump_prompt_version()
+    registry.for_user(None)
+    registry.for_user("alice")
+    assert requests == [1]
+
+    registry.refresh_global()
+    assert registry.global_handle.version == reader.get_prompt_version()
+    registry.for_user(None)
+    assert requests == [1]
+    assert registry.stats()["stale_global_detected"] == 1
+
+def test_personal_models_follow_changes_saved_by_other_workers(make_es_manager, fake_es):
+    writer = make_es_manager()
+    reader = make_es_manager(version_check_interval=0)
+    registry = make_registry(reader)
+    fake_es.search_hits = [{"_source": {"query": "pay rahul 500", "intent": "PAY_TO_PERSON"}}]
+
+    first = registry.for_user("alice")
+    assert registry.for_user("alice") is first
+
+    writer.save_example("pay asha 200", {"intent": "PAY_TO_PERSON"}, user_id="alice")
+    second = registry.for_user("alice")
+    assert second is not first
+    assert second.version == reader.get_prompt_version("alice")
+
+def test_failed_global_rebuild_is_requested_again(make_es_manager, monkeypatch):
+    writer = make_es_manager()
+    reader = make_es_manager(version_check_interval=0)
+    requests = []
+    registry = make_registry(reader, on_global_stale=lambda: requests.append(1))
+
+    writer.bump_prompt_version()
+    registry.for_user(None)
+    assert requests == [1]
+
+    def unavailable(*args, **kwargs):
+        raise CircuitOpenError("elasticsearch_read", 5.0)
+    monkeypatch.setattr(reader, "get_prompt_examples", unavailable)
+    with pytest.raises(CircuitOpenError):
+        registry.refresh_global()
+    registry.for_user(None)
+    assert requests == [1, 1]
+
+def test_personal_models_are_rebuilt_with_the_global_model(make_es_manager, fake_es):
+    writer = make_es_manager()
+    reader = make_es_manager(version_check_interval=0)
+    registry = make_registry(reader)
+    fake_es.search_hits = [{"_source": {"query": "pay rahul 500", "intent": "PAY_TO_PERSON"}}]
+    first = registry.for_user("alice")
+
+    # Until the global model is rebuilt, personal models keep using its examples
+    writer.bump_prompt_version()
+    assert registry.for_user("alice") is first
+
+    registry.refresh_global()
+    second = registry.for_user("alice")
+    assert second is not first
+    assert second.version == reader.get_prompt_version("alice")
+    assert registry.for_user("alice") is second
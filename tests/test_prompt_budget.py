@@ -0,0 +1,62 @@
+from app.services.prompt_builder import PromptBudget, compact_text, minify_json, render_examples
+
+EXAMPLES = [
+    {"query": f"pay bill number {i} for the month", "intent": "PAY_BILL", "confidence": 1.0,
+     "extracted_data": {"category_name": "ELECTRICITY", "amount": i}}
+    for i in range(6)
+]
+CONTEXT = {"contact_names": [f"Contact Name {i}" for i in range(20)], "currency": "INR"}
+SYSTEM_PROMPT = "Classify the user's payment intent. " * 10
+
+def test_minify_json_drops_whitespace():
+    assert minify_json({"a": [1, 2], "b": "₹"}) == '{"a":[1,2],"b":"₹"}'
+
+def test_compact_text_strips_indentation_and_blank_runs():
+    assert compact_text("\n    First\n\n\n\n      Second\n    ") == "First\n\nSecond"
+
+def test_render_examples_numbers_each_example():
+    lines = render_examples(EXAMPLES[:2]).splitlines()
+    assert lines[0].startswith('1. "pay bill number 0 for the month" -> {"intent":"PAY_BILL"')
+    assert lines[1].startswith("2. ")
+
+def test_prompts_within_budget_are_not_trimmed():
+    budget = PromptBudget(max_tokens=0)
+    prompt = budget.build(SYSTEM_PROMPT, EXAMPLES, "pay my bill", CONTEXT)
+    assert prompt.startswith("System: ")
+    assert "6. " in prompt and "Contact Name 19" in prompt
+    assert budget.stats()["trimmed"] == 0
+
+def test_extra_examples_are_trimmed_before_contacts():
+    full = PromptBudget(max_tokens=0)
+    full.build(SYSTEM_PROMPT, EXAMPLES, "pay my bill", CONTEXT)
+    budget = PromptBudget(max_tokens=full.stats()["last_tokens"] - 20, min_examples=2)
+    prompt = budget.build(SYSTEM_PROMPT, EXAMPLES, "pay my bill", CONTEXT)
+    assert "Contact Name 19" in prompt
+    assert "6. " not in prompt
+    assert budget.stats()["examples_dropped"] >= 1
+    assert budget.stats()["contacts_dropped"] == 0
+
+def test_least_relevant_contacts_go_after_extra_examples():
+    budget = PromptBudget(max_tokens=220, min_examples=2)
+    prompt = budget.build(SYSTEM_PROMPT, EXAMPLES, "pay my bill", CONTEXT)
+    stats = budget.stats()
+    assert stats["examples_dropped"] == 4
+    assert 0 < stats["contacts_dropped"] < 20
+    assert "Contact Name 0" in prompt and "Contact Name 19" not in prompt
+
+def test_instructions_and_query_are_never_trimmed():
+    budget = PromptBudget(max_tokens=10)
+    prompt = budget.build(SYSTEM_PROMPT, EXAMPLES, "pay my bill", CONTEXT)
+    assert SYSTEM_PROMPT in prompt and "pay my bill" in prompt
+    assert "Examples:" not in prompt and "contact_names" not in prompt
+    assert budget.stats()["over_budget"] == 1
+
+def test_queries_without_instructions_are_sent_alone():
+    assert PromptBudget().build(None, [], "pay my bill") == "pay my bill"
+
+def test_sizes_are_recorded_in_the_histogram():
+    budget = PromptBudget()
+    budget.build(None, [], "pay my bill")
+    stats = budget.stats()
+    assert stats["prompts"] == 1
+    assert stats["size_histogram"]["<=500"] == 1
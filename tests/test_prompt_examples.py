@@ -0,0 +1,79 @@
+import pytest
+
+GLOBAL = [
+    {"query": "pay rahul 500", "intent": "PAY_TO_PERSON", "is_global": True, "data_quality": 5, "timestamp": "2025-01-02"},
+    {"query": "send 200 to asha", "intent": "PAY_TO_PERSON", "is_global": True, "data_quality": 9, "timestamp": "2025-01-01"},
+    {"query": "pay my electricity bill", "intent": "PAY_BILL", "is_global": True, "data_quality": 8, "timestamp": "2025-01-01"}
+]
+USER = [
+    {"query": "pay mom 1000", "intent": "PAY_TO_PERSON", "user_feedback": None, "timestamp": "2025-03-01"},
+    {"query": "transfer to dad", "intent": "PAY_TO_PERSON", "user_feedback": True, "timestamp": "2025-01-01"},
+    {"query": "send bro 50", "intent": "PAY_TO_PERSON", "user_feedback": False, "timestamp": "2025-02-01"},
+    {"query": "airtel recharge", "intent": "PAY_BILL", "user_feedback": False, "timestamp": "2025-01-01"}
+]
+
+def store(fake_es, index, docs, **fields):
+    stored = fake_es.docs.setdefault(index, {})
+    for doc in docs:
+        stored[f"{index}-{len(stored)}"] = {**doc, **fields}
+
+@pytest.fixture
+def manager(make_es_manager, fake_es):
+    manager = make_es_manager()
+    fake_es.search_stored = True
+    store(fake_es, manager.global_index, GLOBAL)
+    store(fake_es, manager._get_user_index("alice"), USER)
+    return manager
+
+def queries(examples):
+    return [example["query"] for example in examples]
+
+def test_global_examples_are_ranked_by_quality(manager):
+    results = manager.get_examples_for_intents(["PAY_TO_PERSON", "PAY_BILL"], max_global_examples=2)
+    assert queries(results["PAY_TO_PERSON"]) == ["send 200 to asha", "pay rahul 500"]
+    assert queries(results["PAY_BILL"]) == ["pay my electricity bill"]
+
+def test_user_examples_put_feedback_first_then_the_newest(manager):
+    results = manager.get_examples_for_intents(["PAY_TO_PERSON"], user_id="alice",
+                                               max_global_examples=0, max_user_examples=3)
+    assert queries(results["PAY_TO_PERSON"]) == ["transfer to dad", "send bro 50", "pay mom 1000"]
+
+def test_results_stay_with_their_intent_when_searches_are_skipped(manager, fake_es):
+    results = manager.get_examples_for_intents(["PAY_TO_PERSON", "PAY_BILL", "CHECK_REWARDS"], user_id="alice",
+                                               max_global_examples=0, max_user_examples=1)
+    assert {intent: queries(examples) for intent, examples in results.items()} == {
+        "PAY_TO_PERSON": ["transfer to dad"], "PAY_BILL": ["airtel recharge"], "CHECK_REWARDS": []
+    }
+
+    results = manager.get_examples_for_intents(["PAY_BILL", "PAY_TO_PERSON"], user_id="alice",
+                                               max_global_examples=1, max_user_examples=1)
+    assert queries(results["PAY_BILL"]) == ["pay my electricity bill", "airtel recharge"]
+    assert queries(results["PAY_TO_PERSON"]) == ["send 200 to asha", "transfer to dad"]
+    assert fake_es.count_calls("msearch") == 2
+
+def test_a_failed_search_only_loses_its_own_examples(manager, fake_es):
+    del fake_es.docs[manager.global_index]
+    results = manager.get_examples_for_intents(["PAY_TO_PERSON", "PAY_BILL"], user_id="alice",
+                                               max_global_examples=2, max_user_examples=1)
+    assert queries(results["PAY_TO_PERSON"]) == ["transfer to dad"]
+    assert queries(results["PAY_BILL"]) == ["airtel recharge"]
+
+def test_new_users_need_no_index_check(manager, fake_es):
+    results = manager.get_examples_for_intents(["PAY_TO_PERSON"], user_id="bob",
+                                               max_global_examples=1, max_user_examples=2)
+    assert queries(results["PAY_TO_PERSON"]) == ["send 200 to asha"]
+    headers = fake_es.calls[-1][2]
+    assert headers[1] == {"index": manager._get_user_index("bob"), "ignore_unavailable": True}
+    assert fake_es.count_calls("msearch") == 1
+
+def test_shared_mode_searches_are_routed_to_the_user(make_es_manager, fake_es):
+    manager = make_es_manager(user_storage_mode="shared", shared_user_index="user_examples")
+    fake_es.search_stored = True
+    store(fake_es, "user_examples", USER, user_id="alice")
+    store(fake_es, "user_examples", [{"query": "pay carol 5", "intent": "PAY_TO_PERSON", "user_feedback": True,
+                                      "timestamp": "2025-05-01", "user_id": "bob"}])
+
+    results = manager.get_examples_for_intents(["PAY_TO_PERSON"], user_id="alice",
+                                               max_global_examples=0, max_user_examples=1)
+    assert queries(results["PAY_TO_PERSON"]) == ["transfer to dad"]
+    assert fake_es.calls[-1][2] == [{"index": "user_examples", "ignore_unavailable": True, "routing": "alice"}]
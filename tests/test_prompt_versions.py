@@ -0,0 +1,62 @@
+from elasticsearch.exceptions import ConnectionError
+from app.services.elasticsearch_manager import READ_BREAKER
+
+def test_versions_start_at_zero(make_es_manager):
+    manager = make_es_manager()
+    assert manager.get_prompt_version() == "0"
+    assert manager.get_prompt_version("alice") == "0.0"
+
+def test_bump_is_visible_to_the_bumping_worker_immediately(make_es_manager):
+    manager = make_es_manager(version_check_interval=60)
+    manager.get_prompt_version("alice")
+    manager.bump_prompt_version("alice")
+    manager.bump_prompt_version()
+    assert manager.get_prompt_version("alice") == "1.1"
+    assert manager.get_prompt_version("bob") == "1.0"
+
+def test_other_workers_see_a_bump_after_the_check_interval(make_es_manager):
+    writer = make_es_manager()
+    reader = make_es_manager(version_check_interval=60)
+    before = reader.get_prompt_version("alice")
+    writer.bump_prompt_version("alice")
+    # Within the interval the reader keeps its last read
+    assert reader.get_prompt_version("alice") == before
+    reader.version_check_interval = 0
+    assert reader.get_prompt_version("alice") != before
+
+def test_versions_are_read_once_per_interval_in_one_round_trip(make_es_manager, fake_es):
+    manager = make_es_manager(version_check_interval=60)
+    for _ in range(5):
+        manager.get_prompt_version("alice")
+    assert fake_es.count_calls("mget") == 1
+
+def test_read_failure_keeps_the_last_known_version(make_es_manager, fake_es, monkeypatch):
+    manager = make_es_manager(version_check_interval=0)
+    manager.bump_prompt_version()
+    assert manager.get_prompt_version() == "1"
+
+    def unavailable(**kwargs):
+        raise ConnectionError("cluster down")
+    monkeypatch.setattr(fake_es, "mget", unavailable)
+    monkeypatch.setattr(READ_BREAKER, "classify_error", lambda e: READ_BREAKER.IGNORE)
+    assert manager.get_prompt_version() == "1"
+
+def test_failed_bump_does_not_raise(make_es_manager, fake_es, monkeypatch):
+    manager = make_es_manager()
+
+    def unavailable(**kwargs):
+        raise ConnectionError("cluster down")
+    monkeypatch.setattr(fake_es, "update", unavailable)
+    manager.bump_prompt_version("alice")
+    assert manager.get_prompt_version("alice") == "0.0"
+
+def test_cached_prompt_examples_are_rebuilt_in_other_workers(make_es_manager, fake_es):
+    writer = make_es_manager()
+    reader = make_es_manager(version_check_interval=0)
+    reader.get_prompt_examples("alice", max_global_examples=2, max_user_examples=2)
+    reader.get_prompt_examples("alice", max_global_examples=2, max_user_examples=2)
+    assert fake_es.count_calls("msearch") == 1
+
+    writer.save_example("pay rahul 500", {"intent": "PAY_TO_PERSON"}, user_id="alice")
+    reader.get_prompt_examples("alice", max_global_examples=2, max_user_examples=2)
+    assert fake_es.count_calls("msearch") == 2
@@ -0,0 +1,62 @@
+import pytest
+from app.services.bill_seed_data import GENERIC_BILL_DATA
+from app.services.biller_catalog import BillerCatalog
+from app.services.rule_classifier import RuleBasedClassifier
+
+CONTACTS = ["Rahul Sharma", "Asha Verma"]
+
+@pytest.fixture
+def classifier():
+    return RuleBasedClassifier(BillerCatalog(fallback_bills=GENERIC_BILL_DATA))
+
+def test_payments_to_a_known_contact(classifier):
+    result = classifier.classify("pay 500 to Rahul for dinner", CONTACTS)
+    assert result == {
+        "intent": "PAY_TO_PERSON",
+        "confidence": 0.95,
+        "extracted_data": {"payee_name": "Rahul Sharma", "amount": 500, "note": "dinner"}
+    }
+
+def test_payments_to_unknown_payees_go_to_gemini(classifier):
+    assert classifier.classify("send 500 to Vikram", CONTACTS) is None
+    assert classifier.best_guess("send 500 to Vikram", CONTACTS)["confidence"] < classifier.confidence_threshold
+
+def test_bill_payments_with_a_single_biller(classifier):
+    result = classifier.classify("pay my hdfc credit card bill", CONTACTS)
+    assert result["intent"] == "PAY_BILL"
+    assert result["extracted_data"]["biller_name"] == "HDFC"
+    assert result["extracted_data"]["category_name"] == "CREDIT CARD"
+
+def test_bill_category_without_a_biller_is_below_threshold(classifier):
+    assert classifier.classify("pay my electricity bill", CONTACTS) is None
+    assert classifier.best_guess("pay my electricity bill", CONTACTS)["extracted_data"]["category_name"] == "ELECTRICITY"
+
+@pytest.mark.parametrize("query, intent", [
+    ("show my cashback", "CHECK_REWARDS"),
+    ("show my transactions", "TRANSACTION_HISTORY")
+])
+def test_read_only_intents(classifier, query, intent):
+    assert classifier.classify(query, CONTACTS)["intent"] == intent
+
+def test_conflicting_rules_fall_through(classifier):
+    # Both a payment to a person and a bill payment
+    assert classifier.classify("send 300 to Rahul for electricity bill", CONTACTS) is None
+
+def test_unrelated_queries_fall_through(classifier):
+    assert classifier.classify("what is the weather", CONTACTS) is None
+    assert classifier.best_guess("what is the weather", CONTACTS) is None
+
+def test_stats_count_hits_and_below_threshold_results(classifier):
+    classifier.classify("show my cashback", CONTACTS)
+    classifier.classify("pay my electricity bill", CONTACTS)
+    classifier.classify("what is the weather", CONTACTS)
+    stats = classifier.stats()
+    assert stats["evaluated"] == 3
+    assert stats["hits"] == 1
+    assert stats["rule_hits"]["check_rewards"] == 1
+    assert stats["rule_below_threshold"]["pay_bill"] == 1
+    assert stats["hit_rate"] == pytest.approx(1 / 3, abs=1e-4)
+
+def test_best_guess_does_not_update_counters(classifier):
+    classifier.best_guess("show my cashback", CONTACTS)
+    assert classifier.stats()["evaluated"] == 0
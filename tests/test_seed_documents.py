@@ -0,0 +1,50 @@
+from app.services.elasticsearch_manager import SEED_VERSIONS_INDEX
+
+BILLS = [{"title": "Airtel", "id": 1}, {"title": "Jio", "id": 2}]
+
+def test_unchanged_seed_data_is_not_written_again(make_es_manager, fake_es):
+    manager = make_es_manager()
+    assert manager.seed_documents("generic_bills", BILLS) is True
+    assert manager.seed_documents("generic_bills", BILLS) is False
+    assert fake_es.count_calls("bulk") == 1
+    assert len(fake_es.docs["generic_bills"]) == 2
+
+def test_changed_seed_data_replaces_only_previously_seeded_documents(make_es_manager, fake_es):
+    manager = make_es_manager()
+    manager.seed_documents("user_credit_cards", BILLS)
+    # Written by the application, not by seeding
+    fake_es.index(index="user_credit_cards", id="real-card", body={"title": "HDFC", "customer_id": "c1"})
+
+    manager.seed_documents("user_credit_cards", [BILLS[0], {"title": "Vi", "id": 3}])
+
+    titles = sorted(doc["title"] for doc in fake_es.docs["user_credit_cards"].values())
+    assert titles == ["Airtel", "HDFC", "Vi"]
+    assert fake_es.count_calls("delete_by_query") == 0
+    assert len(fake_es.docs[SEED_VERSIONS_INDEX]["user_credit_cards"]["ids"]) == 2
+
+def test_markers_without_ids_delete_nothing(make_es_manager, fake_es):
+    manager = make_es_manager()
+    fake_es.index(index="generic_bills", id="old-copy", body={"title": "Airtel", "id": 1})
+    fake_es.index(index=SEED_VERSIONS_INDEX, id="generic_bills", body={"version": "old", "documents": 1})
+
+    manager.seed_documents("generic_bills", BILLS)
+
+    assert "old-copy" in fake_es.docs["generic_bills"]
+    assert len(fake_es.docs["generic_bills"]) == 3
+
+def test_failed_documents_leave_the_marker_unchanged(make_es_manager, fake_es, monkeypatch):
+    manager = make_es_manager()
+
+    def partially_failing(body, **kwargs):
+        return {"errors": True, "items": [
+            {"index": {"_index": "generic_bills", "_id": "a", "status": 201}},
+            {"index": {"_index": "generic_bills", "_id": "b", "status": 429,
+                       "error": {"type": "es_rejected_execution_exception"}}}
+        ]}
+    monkeypatch.setattr(fake_es, "bulk", partially_failing)
+    assert manager.seed_documents("generic_bills", BILLS) is False
+    assert SEED_VERSIONS_INDEX not in fake_es.docs
+
+    monkeypatch.delattr(fake_es, "bulk")
+    assert manager.seed_documents("generic_bills", BILLS) is True
+    assert len(fake_es.docs["generic_bills"]) == 2
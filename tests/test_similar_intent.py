@@ -0,0 +1,25 @@
+from app.services import vector_store
+from app.services.vector_store import configure_history_search, search_similar_intent
+
+def hit(intent, score, *matched):
+    return {"_score": score, "_source": {"intent_data": {"intent": intent}}, "matched_queries": list(matched)}
+
+def test_exact_matches_win_over_higher_scoring_fuzzy_ones(fake_es):
+    fake_es.search_hits = [hit("PAY_BILL", 20.0, "fuzzy"), hit("PAY_TO_PERSON", 12.0, "exact", "fuzzy")]
+    assert search_similar_intent(fake_es, "alice", "pay rahul 500") == {"intent": "PAY_TO_PERSON"}
+    assert fake_es.count_calls("search") == 1
+
+def test_fuzzy_matches_need_the_minimum_score(fake_es):
+    fake_es.search_hits = [hit("PAY_BILL", 6.0, "fuzzy")]
+    assert search_similar_intent(fake_es, "alice", "pay my bil") is None
+    assert search_similar_intent(fake_es, "alice", "pay my bil", min_fuzzy_score=5.0) == {"intent": "PAY_BILL"}
+
+def test_configured_fuzzy_score_is_the_default(fake_es, monkeypatch):
+    monkeypatch.setattr(vector_store, "_history_search", dict(vector_store._history_search))
+    configure_history_search(min_fuzzy_score=5.0)
+    fake_es.search_hits = [hit("PAY_BILL", 6.0, "fuzzy")]
+    assert search_similar_intent(fake_es, "alice", "pay my bil") == {"intent": "PAY_BILL"}
+
+def test_a_miss_costs_one_search(fake_es):
+    assert search_similar_intent(fake_es, "alice", "what is the weather") is None
+    assert fake_es.count_calls("search") == 1
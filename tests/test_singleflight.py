@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.utils.deadline import DeadlineExceeded, deadline_scope
+from app.utils.singleflight import SingleFlight
+
+def run_concurrently(flights, key, fn, callers):
+    """Call flights.do from several threads at once and collect (result, shared) pairs"""
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flights.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = []
+
+    def classify():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"intent": "PAY_BILL"}
+
+    results, errors = run_concurrently(flights, "key", classify, callers=5)
+    assert errors == []
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert flights.stats()["followers"] == 4
+    assert flights.stats()["in_flight"] == 0
+
+def test_followers_get_their_own_copies():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def classify():
+        started.set()
+        release.wait()
+        return {"extracted_data": {"amount": 1}}
+
+    leader = []
+    thread = threading.Thread(target=lambda: leader.append(flights.do("key", classify)))
+    thread.start()
+    started.wait()
+    follower = []
+    follower_thread = threading.Thread(target=lambda: follower.append(flights.do("key", classify)))
+    follower_thread.start()
+    time.sleep(0.05)
+    release.set()
+    thread.join()
+    follower_thread.join()
+
+    leader[0][0]["extracted_data"]["amount"] = 2
+    assert follower[0] == ({"extracted_data": {"amount": 1}}, True)
+
+def test_errors_reach_every_caller():
+    flights = SingleFlight()
+
+    def failing():
+        time.sleep(0.1)
+        raise ValueError("bad response")
+
+    results, errors = run_concurrently(flights, "key", failing, callers=3)
+    assert results == []
+    assert len(errors) == 3 and all(isinstance(e, ValueError) for e in errors)
+
+def test_followers_give_up_at_their_deadline():
+    flights = SingleFlight()
+    release = threading.Event()
+    thread = threading.Thread(target=lambda: flights.do("key", lambda: release.wait(1)))
+    thread.start()
+    time.sleep(0.05)
+    with deadline_scope(0.05):
+        with pytest.raises(DeadlineExceeded):
+            flights.do("key", lambda: "unused")
+    release.set()
+    thread.join()
+    assert flights.stats()["follower_timeouts"] == 1
+
+def test_followers_retry_when_the_leader_ran_out_of_time():
+    flights = SingleFlight()
+    calls = []
+
+    def classify():
+        calls.append(1)
+        time.sleep(0.1)
+        if len(calls) == 1:
+            raise DeadlineExceeded("leader deadline")
+        return "ok"
+
+    results, errors = run_concurrently(flights, "key", classify, callers=2)
+    assert len(calls) == 2
+    assert [result for result, _ in results] == ["ok"]
+    assert len(errors) == 1 and isinstance(errors[0], DeadlineExceeded)
+
+def test_async_callers_share_one_call():
+    flights = SingleFlight()
+    calls = []
+
+    async def classify():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"intent": "OTHER"}
+
+    async def main():
+        return await asyncio.gather(*(flights.do_async("key", classify) for _ in range(3)))
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True]
+
+def test_async_followers_retry_when_the_leader_is_cancelled():
+    flights = SingleFlight()
+    calls = []
+
+    async def classify():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def main():
+        leader = asyncio.create_task(flights.do_async("key", classify))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flights.do_async("key", classify))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+    assert asyncio.run(main()) == ("ok", False)
+    assert len(calls) == 2
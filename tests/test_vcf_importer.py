@@ -0,0 +1,37 @@
+from app.services.contact_index import CONTACTS_INDEX
+from app.utils.vcf_importer import CONTACT_IMPORT_STATE_INDEX, import_all_user_contacts
+
+def write_vcf(path, contacts):
+    path.write_text("".join(
+        f"BEGIN:VCARD\nFN:{name}\nTEL;TYPE=CELL:{number}\nEND:VCARD\n" for name, number in contacts
+    ))
+
+def names(fake_es, user_id):
+    return sorted(doc["name"] for doc in fake_es.docs[CONTACTS_INDEX].values() if doc["user_id"] == user_id)
+
+def test_contacts_removed_from_a_file_are_deleted(make_es_manager, fake_es, tmp_path):
+    manager = make_es_manager()
+    write_vcf(tmp_path / "user1.vcf", [("Rahul", "111"), ("Asha", "222")])
+    write_vcf(tmp_path / "user2.vcf", [("Vikram", "333")])
+    import_all_user_contacts(str(tmp_path), manager, workers=1)
+
+    write_vcf(tmp_path / "user1.vcf", [("Asha", "222"), ("Meera", "444")])
+    report = import_all_user_contacts(str(tmp_path), manager, workers=1)
+
+    assert names(fake_es, "1") == ["Asha", "Meera"]
+    assert names(fake_es, "2") == ["Vikram"]
+    by_file = {entry["file"]: entry for entry in report}
+    assert by_file["user1.vcf"]["deleted"] == 1
+    assert by_file["user2.vcf"]["status"] == "unchanged"
+
+def test_every_imported_file_keeps_its_state(make_es_manager, fake_es, tmp_path):
+    manager = make_es_manager()
+    for user in range(3):
+        write_vcf(tmp_path / f"user{user}.vcf", [("Rahul", f"{user}00")])
+    import_all_user_contacts(str(tmp_path), manager, workers=1)
+    assert len(fake_es.docs[CONTACT_IMPORT_STATE_INDEX]) == 3
+
+    # State is read with a scan rather than one capped search, so every file is recognized
+    report = import_all_user_contacts(str(tmp_path), manager, workers=1)
+    assert {entry["status"] for entry in report} == {"unchanged"}
+    assert fake_es.count_calls("delete_by_query") == 3
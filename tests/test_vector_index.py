@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from app.services.vector_store import HashingVectorizer, VectorIndex
+
+QUERIES = [
+    ("1", "pay my electricity bill", {"intent": "PAY_BILL"}),
+    ("2", "send 500 to rahul", {"intent": "PAY_TO_PERSON"}),
+    ("3", "show my cashback", {"intent": "CHECK_REWARDS"})
+]
+
+@pytest.fixture
+def index():
+    index = VectorIndex(dim=256)
+    index.add_many("alice", QUERIES)
+    return index
+
+def test_vectors_are_unit_length_and_deterministic():
+    vectorizer = HashingVectorizer(dim=256)
+    vector = vectorizer.transform("pay my electricity bill")
+    assert np.linalg.norm(vector) == pytest.approx(1.0, abs=1e-5)
+    assert np.array_equal(vector, HashingVectorizer(dim=256).transform("pay my electricity bill"))
+
+def test_identical_text_is_the_nearest_match(index):
+    hit = index.nearest("alice", "pay my electricity bill")
+    assert hit["id"] == "1"
+    assert hit["score"] == pytest.approx(1.0, abs=1e-5)
+    assert index.nearest("alice", "what is the weather today") is None
+
+def test_hits_are_ordered_and_limited(index):
+    hits = index.search("alice", "pay my gas bill", k=2)
+    assert len(hits) == 2
+    assert hits[0]["id"] == "1"
+    assert hits[0]["score"] >= hits[1]["score"]
+
+def test_shards_are_separate(index):
+    assert index.search("bob", "pay my electricity bill") == []
+
+def test_payloads_are_copied(index):
+    index.nearest("alice", "show my cashback")["payload"]["intent"] = "changed"
+    assert index.nearest("alice", "show my cashback")["payload"] == {"intent": "CHECK_REWARDS"}
+
+def test_adding_an_existing_id_replaces_it(index):
+    index.add("alice", "1", "pay my water bill", {"intent": "PAY_BILL"})
+    assert index.ids("alice") == ["1", "2", "3"]
+    assert index.nearest("alice", "pay my water bill")["id"] == "1"
+    assert index.nearest("alice", "pay my electricity bill") is None
+
+def test_deleted_documents_are_not_found(index):
+    assert index.delete("alice", ["1", "missing"]) == 1
+    assert sorted(index.ids("alice")) == ["2", "3"]
+    assert index.nearest("alice", "pay my electricity bill") is None
+    # The row moved into the hole is still found under its own id
+    assert index.nearest("alice", "show my cashback")["id"] == "3"
+
+def test_search_many_answers_each_text():
+    index = VectorIndex(dim=256)
+    index.add_many("alice", QUERIES)
+    results = index.search_many("alice", ["send 500 to rahul", "show my cashback"], k=1)
+    assert [hits[0]["id"] for hits in results] == ["2", "3"]
+
+def test_saved_shards_load_memory_mapped(tmp_path, index):
+    index.path = str(tmp_path)
+    assert index.save() == 1
+    assert index.save() == 0
+
+    loaded = VectorIndex(dim=256, path=str(tmp_path))
+    assert loaded.load() == 1
+    assert loaded.nearest("alice", "send 500 to rahul")["payload"] == {"intent": "PAY_TO_PERSON"}
+    # A loaded shard becomes writable on the first change
+    loaded.add("alice", "4", "pay my gas bill")
+    assert loaded.nearest("alice", "pay my gas bill")["id"] == "4"
+
+def test_shards_of_another_dimension_are_skipped(tmp_path, index):
+    index.path = str(tmp_path)
+    index.save()
+    assert VectorIndex(dim=128, path=str(tmp_path)).load() == 0
+
+def test_drop_removes_saved_files(tmp_path, index):
+    index.path = str(tmp_path)
+    index.save()
+    index.drop("alice")
+    assert index.ids("alice") == []
+    assert list(tmp_path.iterdir()) == []
+
+def test_saving_again_replaces_the_shard_in_one_step(tmp_path, index):
+    index.path = str(tmp_path)
+    index.save()
+    index.add("alice", "4", "pay my gas bill")
+    assert index.save() == 1
+    assert sorted(path.suffix for path in tmp_path.iterdir()) == [".json", ".npy"]
+    assert VectorIndex(dim=256, path=str(tmp_path)).ids("alice") == ["1", "2", "3", "4"]
+
+def test_shards_whose_vectors_do_not_match_are_skipped(tmp_path, index):
+    index.path = str(tmp_path)
+    index.save()
+    vectors_file, = tmp_path.glob("*.npy")
+    np.save(vectors_file, np.zeros((2, 256), dtype=np.float32))
+    assert VectorIndex(dim=256, path=str(tmp_path)).load() == 0
+
+def test_least_recently_used_shards_are_evicted():
+    index = VectorIndex(dim=256, max_shards=2)
+    for shard in ("alice", "bob", "carol"):
+        index.add_many(shard, QUERIES)
+    assert index.ids("alice") == []
+    assert index.stats()["shards"] == 2
+    assert index.stats()["evicted_shards"] == 1
+
+def test_evicted_shards_are_saved_and_read_back(tmp_path):
+    index = VectorIndex(dim=256, path=str(tmp_path), max_shards=1)
+    index.add_many("alice", QUERIES)
+    index.add_many("bob", QUERIES[:1])
+    assert index.nearest("alice", "show my cashback")["id"] == "3"
+    assert index.ids("bob") == ["1"]